@@ -1,58 +1,76 @@
-import os
+import asyncio
+import uuid
+from contextlib import suppress
 from datetime import datetime
-from io import BytesIO
 
-import jwt
-from fastapi import APIRouter, File, HTTPException, Query, UploadFile, status
+from asyncpg import Connection
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
 from fastapi.responses import JSONResponse, StreamingResponse
-from google.cloud import storage
-
-from ...db import close_db_connection, get_db_connection
-from ..functions.etl_sertaozinho import etl_sertaozinho
-from ..functions.utils import require_valid_token
+from google.api_core.exceptions import NotFound
+
+from ...db import get_db
+from ..functions.ingestion_jobs import (
+    create_job,
+    fail_job,
+    get_job,
+    job_to_dict,
+    mark_job_uploaded,
+    submit_ingestion_job,
+)
+from ..functions.storage import (
+    delete_blob,
+    get_blob,
+    list_all_blobs,
+    list_blobs_page,
+    stream_blob,
+    upload_blob_bytes,
+)
+from ..functions.utils import company_id_from_token, require_valid_token, user_id_from_token
 
 router = APIRouter()
 
-BUCKET_NAME = os.getenv('GCP_BUCKET_NAME', 'cross-mi4u')
-CREDENTIALS_PATH = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'mi4u-303100-66ee217229dd.json')
-
-
-def get_storage_client():
-    if os.path.exists(CREDENTIALS_PATH):
-        return storage.Client.from_service_account_json(CREDENTIALS_PATH)
-    return storage.Client()
-
 
 @router.get("/test-db")
 @require_valid_token
-async def test_db_connection(permission_token: str):
-    conn = await get_db_connection()
-    if conn:
-        await close_db_connection(conn)
+async def test_db_connection(permission_token: str, conn: Connection = Depends(get_db)):
+    try:
+        await conn.fetchval('SELECT 1')
         return {"message": "Conexão com o banco de dados bem-sucedida!"}
-    return {"message": "Falha na conexão com o banco de dados."}
+    except Exception:
+        return {"message": "Falha na conexão com o banco de dados."}
 
 
 @router.get('/files/')
 @require_valid_token
-async def get_files(permission_token: str):
-    client = get_storage_client()
-    bucket = client.get_bucket(BUCKET_NAME)
-
-    files = {
-        blob.name: blob.size
-        for blob in bucket.list_blobs()
-    }
+async def get_files(
+    permission_token: str,
+    prefix: str = Query(None),
+    page_token: str = Query(None),
+    page_size: int = Query(None, ge=1, le=1000),
+):
+    """
+    Sem page_size/page_token, devolve {nome: tamanho} com todos os arquivos,
+    como sempre. Com eles, devolve {"files": {...}, "next_page_token": ...},
+    uma página por vez; next_page_token é null na última página.
+    """
+    if page_size is None and page_token is None:
+        files = await asyncio.to_thread(list_all_blobs, prefix)
+        return JSONResponse(status_code=status.HTTP_200_OK, content=dict(files))
+
+    files, next_page_token = await asyncio.to_thread(
+        list_blobs_page, prefix, page_token, page_size or 100
+    )
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=files)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={'files': dict(files), 'next_page_token': next_page_token},
+    )
 
 
 @router.get('/file/{blob_name}')
 @require_valid_token
 async def get_file(permission_token: str, blob_name: str):
-    client = get_storage_client()
-    bucket = client.get_bucket(BUCKET_NAME)
-    blob = bucket.get_blob(blob_name)
+    blob = await asyncio.to_thread(get_blob, blob_name)
 
     if not blob:
         raise HTTPException(
@@ -74,21 +92,11 @@ async def post_file(
     mi4u_access_token: str,
     data_hora_enviar: datetime = Query(None),
     file: UploadFile = File(...),
+    conn: Connection = Depends(get_db),
 ):
     # 🔐 Token MI4U
-    try:
-        decoded_token = jwt.decode(
-            mi4u_access_token,
-            options={'verify_signature': False}
-        )
-        company_id = decoded_token['sub']['company_id']
-        user_id = decoded_token['sub']['user_id']
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f'Invalid mi4u_access_token: {e}'
-        )
+    company_id = company_id_from_token(mi4u_access_token)
+    user_id = user_id_from_token(mi4u_access_token)
 
     # 📄 Validação do arquivo
     if not file.filename.lower().endswith('.pdf'):
@@ -106,52 +114,119 @@ async def post_file(
     destination_blob_name = f'{filename}-{timestamp}.pdf'
 
     try:
-        client = get_storage_client()
-        bucket = client.get_bucket(BUCKET_NAME)
-        blob = bucket.blob(destination_blob_name)
-
-        # ☁️ Upload
-        blob.upload_from_file(
-            file.file,
+        # Lê o upload uma única vez: os mesmos bytes vão para o storage e para o ETL
+        file_bytes = await file.read()
+
+        # ☁️ Upload, em paralelo ao parsing feito pelo worker
+        upload = asyncio.create_task(asyncio.to_thread(
+            upload_blob_bytes,
+            destination_blob_name,
+            file_bytes,
             content_type='application/pdf'
-        )
+        ))
 
-        # ⬇️ Download para ETL
-        file_bytes = blob.download_as_bytes()
-        file_io = BytesIO(file_bytes)
-
-        # 🔄 ETL Sertãozinho
-        await etl_sertaozinho(
+        # 🧾 Job de ingestão: o ETL roda em background (ver ingestion_jobs)
+        job_id = await create_job(
+            conn,
             company_id=company_id,
             user_id=user_id,
+            filename=filename,
+            blob_name=destination_blob_name,
             data_hora_enviar=data_hora_enviar,
             data_hora_upload=upload_date,
-            filename=filename,
-            blob_file=file_io
+            uploading=True,
         )
+        submit_ingestion_job(job_id, file_bytes, upload)
+
+        await upload
+        await mark_job_uploaded(conn, job_id)
+
+        # O worker local pode já ter pego (ou até concluído) o job
+        job = await get_job(conn, job_id)
 
         return JSONResponse(
-            status_code=status.HTTP_201_CREATED,
+            status_code=status.HTTP_202_ACCEPTED,
             content={
-                'message': f'Arquivo {destination_blob_name} enviado com sucesso'
+                'message': f'Arquivo {destination_blob_name} recebido, processamento em andamento',
+                'job_id': str(job_id),
+                'status': job['status'],
             }
         )
 
     except Exception as e:
-        if 'blob' in locals():
-            blob.delete()
+        if 'job_id' in locals():
+            await fail_job(conn, job_id, str(e), {})
+        if 'upload' in locals():
+            await asyncio.gather(upload, return_exceptions=True)
+            with suppress(NotFound):
+                await asyncio.to_thread(delete_blob, destination_blob_name)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f'Erro durante processamento: {e}'
         )
 
 
+@router.get('/file/jobs/{job_id}')
+@require_valid_token
+async def get_file_job(
+    permission_token: str,
+    job_id: uuid.UUID,
+    conn: Connection = Depends(get_db),
+):
+    job = await get_job(conn, job_id)
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'O job {job_id} não existe!'
+        )
+
+    return job_to_dict(job)
+
+
+def _parse_range(range_header: str, size: int):
+    """
+    Interpreta um header Range de intervalo único (bytes=ini-fim, bytes=ini-
+    ou bytes=-sufixo). Retorna (ini, fim) inclusivo, ou None para servir o
+    arquivo inteiro (header ausente, malformado ou com vários intervalos).
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+
+    first, _, last = range_header[len('bytes='):].strip().partition('-')
+
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = size - int(last)
+            end = size - 1
+    except ValueError:
+        return None
+
+    start = max(start, 0)
+    end = min(end, size - 1)
+
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail='Intervalo solicitado inválido',
+            headers={'Content-Range': f'bytes */{size}'}
+        )
+
+    return start, end
+
+
 @router.get('/download/{blob_name}')
 @require_valid_token
-async def download_file(permission_token: str, blob_name: str):
-    client = get_storage_client()
-    bucket = client.get_bucket(BUCKET_NAME)
-    blob = bucket.get_blob(blob_name)
+async def download_file(
+    permission_token: str,
+    blob_name: str,
+    range: str = Header(None),
+    if_none_match: str = Header(None),
+):
+    blob = await asyncio.to_thread(get_blob, blob_name)
 
     if not blob:
         raise HTTPException(
@@ -159,12 +234,31 @@ async def download_file(permission_token: str, blob_name: str):
             detail='Arquivo não encontrado'
         )
 
-    file_io = BytesIO(blob.download_as_bytes())
+    etag = f'"{blob.generation}"'
+    headers = {
+        'Content-Disposition': f'attachment; filename={blob_name}',
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+    }
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = _parse_range(range, blob.size) if blob.size else None
+
+    if byte_range is None:
+        start, end = 0, blob.size - 1
+        status_code = status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers['Content-Range'] = f'bytes {start}-{end}/{blob.size}'
+
+    headers['Content-Length'] = str(end - start + 1)
 
     return StreamingResponse(
-        file_io,
-        media_type='application/pdf',
-        headers={
-            'Content-Disposition': f'attachment; filename={blob_name}'
-        }
+        stream_blob(blob, start, end),
+        status_code=status_code,
+        media_type=blob.content_type or 'application/pdf',
+        headers=headers
     )
@@ -1,192 +1,232 @@
+import json
 from collections import defaultdict
 from datetime import datetime
 
-import jwt
-import pandas as pd
-from fastapi import APIRouter, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
 
-from ...db import close_db_connection, get_db_connection
-from ..functions.utils import require_valid_token
+from ...db import acquire_read_connection
+from ..functions.report_cache import report_cache
+from ..functions.report_rollup import fetch_report_rows
+from ..functions.utils import company_id_from_token, decode_cursor, encode_cursor, require_valid_token
 
 router = APIRouter()
 
+# Grupos do /report/details: (chave na resposta, valor normalizado de resposta)
+DETAIL_GROUPS = (
+    ("confirmados", "CONFIRMO"),
+    ("nao_confirmados", "NÃOㅤCONFIRMO"),
+    ("nao_reconhecidos", "NÃOㅤCONHEÇO"),
+)
+NOT_ANSWERED_GROUP = "nao_respondidos"
 
-@router.get("/report", status_code=status.HTTP_200_OK)
-@require_valid_token
-async def get_report(
-    permission_token: str, mi4u_access_token: str, dt_start: str, dt_end: str
-):
-    try:
-        decoded_token = jwt.decode(
-            mi4u_access_token, options={"verify_signature": False}
-        )
-        company_id = decoded_token.get("sub", {}).get("company_id")
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid mi4u_access_token. {e}",
-        )
+# Solicitantes buscados por ida ao banco no streaming do /report/details
+DETAILS_PREFETCH = 50
 
-    dt_start = datetime.strptime(dt_start, "%d-%m-%Y").date()
-    dt_end = datetime.strptime(dt_end, "%d-%m-%Y").date()
 
-    conn = await get_db_connection()
-
-    try:
-        query = """
-            SELECT
-                solicitante,
-                date_trunc('month', data_agenda) AS periodo_ordem,
-                TO_CHAR(date_trunc('month', data_agenda), 'MM-YYYY') AS periodo,
+def details_query(with_cursor: bool, bucket_limit: int = None, page_size: int = None) -> str:
+    """
+    Uma linha por solicitante, com o item da resposta já serializado em JSON
+    (coluna `item`, em texto, para ir direto para o corpo do response).
+    """
+    keys = [key for key, _ in DETAIL_GROUPS] + [NOT_ANSWERED_GROUP]
+    grupo = "".join(f"WHEN '{value}' THEN '{key}' " for key, value in DETAIL_GROUPS)
+    in_limit = f" AND posicao <= {int(bucket_limit)}" if bucket_limit else ""
+
+    listas = ",".join(
+        f"""
+                '{key}', coalesce(
+                    json_agg(json_build_object('cliente', paciente, 'telefone', telefone) ORDER BY id)
+                        FILTER (WHERE grupo = '{key}'{in_limit}),
+                    '[]'::json
+                )"""
+        for key in keys
+    )
+    totais = ", ".join(f"'{key}', count(*) FILTER (WHERE grupo = '{key}')" for key in keys)
 
-                COUNT(*) FILTER (WHERE resposta = 'CONFIRMO')            AS confirmado,
-                COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO')       AS nao_confirmado,
-                COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO')        AS nao_conheco,
-                COUNT(*) FILTER (
-                    WHERE resposta IS NULL OR TRIM(resposta) = ''
-                ) AS nao_respondido
+    posicao = ", row_number() OVER (PARTITION BY solicitante, grupo ORDER BY id) AS posicao" if bucket_limit else ""
+    cursor_filter = " AND solicitante > $3" if with_cursor else ""
+    limit = f" LIMIT {int(page_size) + 1}" if page_size else ""
 
+    return f"""
+        WITH linhas AS (
+            SELECT
+                id, solicitante, paciente, telefone,
+                CASE upper(btrim(resposta)) {grupo}ELSE '{NOT_ANSWERED_GROUP}' END AS grupo
             FROM cross_agendamentos
             WHERE data_agenda BETWEEN $1 AND $2
-              AND solicitante IS NOT NULL
-              AND solicitante <> ''
-            GROUP BY solicitante, periodo_ordem
-            ORDER BY solicitante, periodo_ordem
-        """
-
-        rows = await conn.fetch(query, dt_start, dt_end)
-
-        if not rows:
-            return {
-                "success": True,
-                "message": "Não há registros para o período informado",
-                "data": [],
-            }
+              AND solicitante IS NOT NULL{cursor_filter}
+        ),
+        numeradas AS (
+            SELECT *{posicao} FROM linhas
+        )
+        SELECT
+            solicitante,
+            json_build_object(
+                'solicitante', solicitante,{listas},
+                'totais', json_build_object({totais})
+            )::text AS item
+        FROM numeradas
+        GROUP BY solicitante
+        ORDER BY solicitante{limit}
+    """
 
-        agrupado = defaultdict(list)
-
-        for r in rows:
-            agrupado[r["solicitante"]].append(
-                {
-                    "periodo_ordem": r["periodo_ordem"],
-                    "periodo": r["periodo"],
-                    "status": {
-                        "confirmado": r["confirmado"],
-                        "nao_confirmado": r["nao_confirmado"],
-                        "nao_conheco": r["nao_conheco"],
-                        "nao_respondido": r["nao_respondido"],
-                    },
-                }
-            )
-
-        data = []
-        for solicitante, meses in agrupado.items():
-            data.append(
-                {
-                    "solicitante": solicitante,
-                    "meses": [
-                        {
-                            "periodo": m["periodo"],
-                            "status": m["status"],
-                        }
-                        for m in meses
-                    ],
-                }
-            )
 
+async def _stream_details(query: str, params: list, page_size: int = None, company_id=None):
+    """
+    Envia {"success", "message", "data": [...]}, um solicitante por vez a
+    partir de um cursor do servidor, com next_cursor quando há page_size.
+    """
+    async with acquire_read_connection(company_id) as conn:
+        async with conn.transaction(readonly=True):
+            yield '{"success": true, "message": "Relatório gerado com sucesso", "data": ['
+
+            enviados, ultimo, next_cursor = 0, None, None
+            async for record in conn.cursor(query, *params, prefetch=DETAILS_PREFETCH):
+                if page_size and enviados == page_size:
+                    next_cursor = encode_cursor({"solicitante": ultimo})
+                    break
+                yield ("," if enviados else "") + record["item"]
+                enviados += 1
+                ultimo = record["solicitante"]
+
+            yield "]"
+            if page_size:
+                yield f', "next_cursor": {json.dumps(next_cursor)}'
+            yield "}"
+
+
+def _report_body(rows) -> dict:
+    if not rows:
         return {
             "success": True,
-            "message": "Relatório gerado com sucesso",
-            "data": data,
+            "message": "Não há registros para o período informado",
+            "data": [],
         }
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to fetch report: {str(e)}",
+    agrupado = defaultdict(list)
+
+    for r in rows:
+        agrupado[r["solicitante"]].append(
+            {
+                "periodo_ordem": r["periodo_ordem"],
+                "periodo": r["periodo"],
+                "status": {
+                    "confirmado": r["confirmado"],
+                    "nao_confirmado": r["nao_confirmado"],
+                    "nao_conheco": r["nao_conheco"],
+                    "nao_respondido": r["nao_respondido"],
+                },
+            }
+        )
+
+    data = []
+    for solicitante, meses in agrupado.items():
+        data.append(
+            {
+                "solicitante": solicitante,
+                "meses": [
+                    {
+                        "periodo": m["periodo"],
+                        "status": m["status"],
+                    }
+                    for m in meses
+                ],
+            }
         )
-    finally:
-        await close_db_connection(conn)
 
+    return {
+        "success": True,
+        "message": "Relatório gerado com sucesso",
+        "data": data,
+    }
 
-@router.get("/report/details", status_code=status.HTTP_200_OK)
+
+@router.get("/report", status_code=status.HTTP_200_OK)
 @require_valid_token
-async def get_report_details(
-    permission_token: str, mi4u_access_token: str, dt_start: str, dt_end: str
+async def get_report(
+    permission_token: str,
+    mi4u_access_token: str,
+    dt_start: str,
+    dt_end: str,
 ):
-    # Valida o token mi4u
-    try:
-        decoded_token = jwt.decode(
-            mi4u_access_token, options={"verify_signature": False}
-        )
-        company_id = decoded_token.get("sub").get("company_id")
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid mi4u_access_token. {e}",
-        )
+    """
+    Contagem de respostas por solicitante e mês. O corpo fica no
+    report_cache até expirar ou até uma escrita no período.
 
-    conn = await get_db_connection()
+    cross_agendamentos não tem empresa_id: o relatório cobre todas as
+    empresas, e o company_id do token só escolhe a conexão de leitura (ver
+    acquire_read_connection). Por isso ele não entra na chave do cache.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
 
     dt_start = datetime.strptime(dt_start, "%d-%m-%Y").date()
     dt_end = datetime.strptime(dt_end, "%d-%m-%Y").date()
 
-    query = """
-        SELECT paciente, telefone, solicitante, resposta
-        FROM cross_agendamentos
-        WHERE data_agenda BETWEEN $1 AND $2
-          AND solicitante IS NOT NULL
-    """
-
-    data = await conn.fetch(query, dt_start, dt_end)
+    async def compute() -> bytes:
+        async with acquire_read_connection(company_id) as conn:
+            rows = await fetch_report_rows(conn, dt_start, dt_end)
+        return json.dumps(_report_body(rows), ensure_ascii=False).encode()
 
-    df = pd.DataFrame(data, columns=["paciente", "telefone", "solicitante", "resposta"])
+    try:
+        body = await report_cache.get_or_compute(("report",), (dt_start, dt_end), compute)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch report: {str(e)}",
+        )
 
-    resultado = defaultdict(
-        lambda: {
-            "confirmados": [],
-            "nao_confirmados": [],
-            "nao_reconhecidos": [],
-            "nao_respondidos": [],
-        }
-    )
+    return Response(content=body, media_type="application/json")
 
-    for _, row in df.iterrows():
-        solicitante = row["solicitante"]
 
-        item = {"cliente": row["paciente"], "telefone": row["telefone"]}
+@router.get("/report/cache", status_code=status.HTTP_200_OK)
+@require_valid_token
+async def get_report_cache_stats(permission_token: str):
+    """Contadores do cache de /report e /report/details."""
+    return report_cache.stats()
 
-        resposta = (row["resposta"] or "").strip().upper()
 
-        if resposta == "CONFIRMO":
-            resultado[solicitante]["confirmados"].append(item)
+@router.get("/report/details", status_code=status.HTTP_200_OK)
+@require_valid_token
+async def get_report_details(
+    permission_token: str,
+    mi4u_access_token: str,
+    dt_start: str,
+    dt_end: str,
+    limite: int = Query(None, ge=1, description="Máximo de pacientes por grupo de resposta"),
+    page_size: int = Query(None, ge=1, le=1000, description="Solicitantes por página"),
+    cursor: str = Query(None, description="Valor de next_cursor da página anterior"),
+):
+    """
+    Pacientes de cada solicitante agrupados pela resposta, montados no banco
+    e enviados em streaming, um solicitante por vez, em ordem alfabética.
 
-        elif resposta == "NÃOㅤCONFIRMO":
-            resultado[solicitante]["nao_confirmados"].append(item)
+    `totais` traz a contagem de cada grupo mesmo quando `limite` corta a
+    lista. Com page_size, a resposta inclui next_cursor (null na última página).
 
-        elif resposta == "NÃOㅤCONHEÇO":
-            resultado[solicitante]["nao_reconhecidos"].append(item)
+    Como em /report, não há filtro por empresa: cross_agendamentos não tem
+    empresa_id, e a resposta traz os pacientes de todas as empresas.
+    """
+    # Valida o token mi4u
+    company_id = company_id_from_token(mi4u_access_token)
 
-        else:
-            resultado[solicitante]["nao_respondidos"].append(item)
+    dt_start = datetime.strptime(dt_start, "%d-%m-%Y").date()
+    dt_end = datetime.strptime(dt_end, "%d-%m-%Y").date()
 
-    data_final = [
-        {
-            "solicitante": solicitante,
-            "confirmados": dados["confirmados"],
-            "nao_confirmados": dados["nao_confirmados"],
-            "nao_reconhecidos": dados["nao_reconhecidos"],
-            "nao_respondidos": dados["nao_respondidos"],
-        }
-        for solicitante, dados in resultado.items()
-    ]
+    solicitante_cursor = decode_cursor(cursor, "solicitante", str) if cursor else None
 
-    return JSONResponse(
-        content={
-            "success": True,
-            "message": "Relatório gerado com sucesso",
-            "data": data_final,
-        },
+    query = details_query(
+        with_cursor=solicitante_cursor is not None,
+        bucket_limit=limite,
+        page_size=page_size,
+    )
+    params = [dt_start, dt_end] + ([solicitante_cursor] if solicitante_cursor is not None else [])
+
+    return StreamingResponse(
+        report_cache.stream(
+            ("details", limite, page_size, solicitante_cursor),
+            (dt_start, dt_end),
+            lambda: _stream_details(query, params, page_size, company_id),
+        ),
         media_type="application/json",
     )
@@ -1,16 +1,262 @@
-import jwt
+import asyncio
+import csv
+import io
+import json
+import os
 import unicodedata
 import re
+import uuid
+import zlib
+from collections import defaultdict
 from datetime import date, time, datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Query, status
+from asyncpg import Connection
+from dotenv import load_dotenv
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-from ...db import close_db_connection, get_db_connection
-from ..functions.utils import require_valid_token
+from ...db import acquire_read_connection, get_db, record_write
+from ..functions.dispatch import (
+    DISPATCH_LEASE_SECONDS,
+    DISPATCH_MAX_BATCH,
+    claim_due_reminders,
+    list_failed_reminders,
+    mark_sent,
+)
+from ..functions.events import get_event_broker, notify_responses, sse_stream
+from ..functions.schedule_search import SEARCH_MODES, text_condition
+from ..functions.utils import (
+    company_id_from_token,
+    decode_cursor,
+    encode_cursor,
+    get_read_db,
+    json_default,
+    require_valid_token,
+)
+
+load_dotenv()
+
+# Limite do modo legado (sem page_size/cursor) e tamanho máximo de página
+SCHEDULE_MAX_ROWS = 10000
+SCHEDULE_DEFAULT_PAGE_SIZE = int(os.getenv('SCHEDULE_DEFAULT_PAGE_SIZE', '500'))
+# Linhas buscadas por ida ao banco no modo stream
+SCHEDULE_STREAM_PREFETCH = int(os.getenv('SCHEDULE_STREAM_PREFETCH', '500'))
+# Máximo de respostas por chamada de /schedule/set_response/batch
+SET_RESPONSE_BATCH_MAX = int(os.getenv('SET_RESPONSE_BATCH_MAX', '5000'))
+
+# /schedule/export: pedaços de 64KiB em espera entre o COPY e o cliente (a
+# memória por download fica limitada a isso), nível do gzip e
+# statement_timeout do COPY (0 = sem limite; exportações podem ser longas)
+EXPORT_QUEUE_CHUNKS = int(os.getenv('EXPORT_QUEUE_CHUNKS', '4'))
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', '6'))
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.getenv('EXPORT_STATEMENT_TIMEOUT_MS', '0'))
+
+# Colunas que podem ser pedidas em `fields`
+SCHEDULE_COLUMNS = (
+    'id', 'empresa_id', 'unidade_executante', 'profissional', 'data_agenda',
+    'especialidade', 'horario', 'codigo', 'paciente', 'telefone',
+    'data_hora_enviar', 'data_hora_upload', 'customer_service_id',
+    'wa_message_id', 'resposta', 'dt_resposta', 'nome_arquivo', 'id_usuario',
+    'nome_usuario',
+)
+
+# Tipos aceitos no header Accept
+SCHEDULE_FORMATS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'text/csv': 'csv',
+    '*/*': 'json',
+}
+
+STREAM_CHUNK_SIZE = 64 * 1024
 
 router = APIRouter()
 
 
+def parse_fields(fields: str) -> list:
+    """Valida a lista de colunas de `fields` (separadas por vírgula)."""
+    columns = [field.strip() for field in fields.split(',') if field.strip()]
+    invalid = [column for column in columns if column not in SCHEDULE_COLUMNS]
+    if not columns or invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'fields inválido: {", ".join(invalid) or fields!r}. '
+                   f'Colunas permitidas: {", ".join(SCHEDULE_COLUMNS)}'
+        )
+    return list(dict.fromkeys(columns))
+
+
+def negotiate_format(accept: str) -> str:
+    """
+    Escolhe o formato de saída pelo header Accept, respeitando os pesos q.
+    Sem Accept, ou sem nenhum tipo suportado, a resposta é JSON.
+    """
+    offers = []
+    for position, item in enumerate((accept or '').split(',')):
+        media_type, *options = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for option in options:
+            if option.startswith('q='):
+                try:
+                    quality = float(option[2:])
+                except ValueError:
+                    quality = 0.0
+        offers.append((quality, position, media_type.lower()))
+
+    for quality, _, media_type in sorted(offers, key=lambda offer: (-offer[0], offer[1])):
+        if quality > 0 and media_type in SCHEDULE_FORMATS:
+            return SCHEDULE_FORMATS[media_type]
+    return 'json'
+
+
+async def _fetch_stream(query: str, params: list, chunks, company_id=None):
+    """
+    Lê as linhas de um cursor do servidor e as entrega ao encoder `chunks`,
+    juntando o texto em blocos de ~64KiB. A conexão é própria do stream: a do
+    Depends(get_read_db) já foi devolvida ao pool quando o corpo começa a ser enviado.
+    """
+    async with acquire_read_connection(company_id) as conn:
+        async with conn.transaction(readonly=True):
+            statement = await conn.prepare(query)
+            columns = [attribute.name for attribute in statement.get_attributes()]
+            records = statement.cursor(*params, prefetch=SCHEDULE_STREAM_PREFETCH)
+
+            buffer, size = [], 0
+            async for chunk in chunks(columns, records):
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= STREAM_CHUNK_SIZE:
+                    yield ''.join(buffer)
+                    buffer, size = [], 0
+            if buffer:
+                yield ''.join(buffer)
+
+
+async def _copy_stream(query: str, params: list, company_id=None, compress: bool = False):
+    """
+    Envia a saída de COPY (query) TO STDOUT em CSV, opcionalmente em gzip.
+
+    O COPY roda numa task que entrega pedaços de ~64KiB numa fila limitada:
+    se o cliente lê devagar, a fila enche, a task para de ler do socket e o
+    Postgres espera. Se o cliente desconecta, a task é cancelada e o COPY
+    interrompido.
+    """
+    queue = asyncio.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    buffer = bytearray()
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    async def flush(final=False):
+        chunk = bytes(buffer)
+        buffer.clear()
+        if compressor is not None:
+            chunk = compressor.compress(chunk) + (compressor.flush() if final else b'')
+        if chunk:
+            await queue.put(chunk)
+
+    async def sink(data):
+        buffer.extend(data)
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            await flush()
+
+    async def copy():
+        try:
+            async with acquire_read_connection(company_id) as conn:
+                async with conn.transaction(readonly=True):
+                    await conn.execute(f'SET LOCAL statement_timeout = {EXPORT_STATEMENT_TIMEOUT_MS}')
+                    await conn.copy_from_query(query, *params, output=sink, format='csv', header=True)
+            await flush(final=True)
+            await queue.put(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(copy(), name='schedule-export')
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                # O status 200 já foi enviado: interrompe a resposta para que
+                # o cliente perceba que o arquivo está incompleto
+                print(f'Erro na exportação: {chunk}')
+                raise chunk
+            yield chunk
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _json_chunks(columns, records):
+    yield '['
+    separator = ''
+    async for record in records:
+        yield separator + json.dumps(dict(record), default=json_default, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+async def _ndjson_chunks(columns, records):
+    async for record in records:
+        yield json.dumps(dict(record), default=json_default, ensure_ascii=False) + '\n'
+
+
+async def _csv_chunks(columns, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for record in records:
+        writer.writerow(record.values())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+STREAM_ENCODERS = {
+    'json': (_json_chunks, 'application/json'),
+    'ndjson': (_ndjson_chunks, 'application/x-ndjson'),
+    'csv': (_csv_chunks, 'text/csv; charset=utf-8'),
+}
+
+
+def normalize_resposta(resposta: str) -> str:
+    """
+    Normaliza as respostas conhecidas (CONFIRMO, NAOCONFIRMO, NAOCONHECO);
+    qualquer outro texto é gravado como chegou.
+    """
+    if not resposta:
+        return resposta
+
+    # Normalização da resposta: Remove TODOS os espaços (incluindo Unicode invisíveis)
+    # Normaliza acentos usando unicodedata
+    resposta_normalized = unicodedata.normalize('NFKD', resposta)
+    # Remove acentos
+    resposta_normalized = ''.join([c for c in resposta_normalized if not unicodedata.combining(c)])
+    # Converte para maiúsculas
+    resposta_normalized = resposta_normalized.upper()
+    # Remove TODOS os caracteres de espaço (incluindo invisíveis)
+    resposta_normalized = re.sub(r'\s+', '', resposta_normalized)
+
+    if resposta_normalized in ('NAOCONFIRMO', 'CONFIRMO', 'NAOCONHECO'):
+        return resposta_normalized
+    return resposta
+
+
+class RespostaItem(BaseModel):
+    wa_message_id: str
+    resposta: str
+    dt_resposta: Optional[datetime] = Field(None, description="Momento da resposta; padrão: agora")
+
+
+class RespostaLote(BaseModel):
+    respostas: List[RespostaItem] = Field(..., min_length=1, max_length=SET_RESPONSE_BATCH_MAX)
+
+
 @router.get('/schedule')
 @require_valid_token
 async def get_schedule(
@@ -34,25 +280,46 @@ async def get_schedule(
         nome_arquivo: str = Query(None),
         id_usuario: int = Query(None),
         nome_usuario: str = Query(None),
-
+        page_size: int = Query(None, ge=1, le=SCHEDULE_MAX_ROWS),
+        cursor: str = Query(None, description="Valor de next_cursor da página anterior"),
+        stream: bool = Query(False, description="Envia as linhas em streaming, sem limite de 10000"),
+        fields: str = Query(None, description="Colunas separadas por vírgula (ex: paciente,telefone,horario)"),
+        modo_busca: str = Query(
+            'contem',
+            pattern=f'^({"|".join(SEARCH_MODES)})$',
+            description="contem: trecho em qualquer posição; prefixo: início do texto (usa índice)"
+        ),
+        accept: str = Header(None),
+        conn: Connection = Depends(get_read_db),
 ):
-    try:
-        decoded_token = jwt.decode(
-            mi4u_access_token,
-            options={'verify_signature': False}
-        )
-        company_id = decoded_token.get('sub').get('company_id')
+    """
+    Sem page_size/cursor, devolve a lista (até 10000 linhas), como sempre.
+    Com page_size ou cursor, devolve {"data": [...], "next_cursor": ...},
+    paginando por id (keyset); next_cursor é null na última página.
+    Com stream=true, envia um array JSON linha a linha, sem o limite de 10000
+    (page_size, se informado, limita o total).
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f'Invalid mi4u_access_token. {e}'
-        )
+    `fields` restringe as colunas retornadas; na paginação o id é sempre
+    incluído, pois é a chave do cursor. Com Accept: text/csv ou
+    application/x-ndjson a resposta sai nesse formato, sempre em streaming.
 
-    conn = await get_db_connection()
+    wa_message_id, telefone e resposta são comparados por igualdade; os demais
+    textos seguem `modo_busca`.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
 
     try:
-        query = 'SELECT * FROM lembrete_sertaozinho'
+        output_format = negotiate_format(accept)
+        if output_format != 'json':
+            stream = True
+
+        if fields:
+            columns = parse_fields(fields)
+            if not stream and (page_size is not None or cursor is not None) and 'id' not in columns:
+                columns.insert(0, 'id')
+            query = f'SELECT {", ".join(columns)} FROM lembrete_sertaozinho'
+        else:
+            query = 'SELECT * FROM lembrete_sertaozinho'
         conditions = []
         params = {}
 
@@ -114,29 +381,94 @@ async def get_schedule(
                     print(data_hora_enviar)
                     print(data_envio)
                 elif isinstance(value, str):
-                    conditions.append(f'{field} ILIKE ${param_index}')
-                    params[field] = f'%{value}%'
+                    condition, params[field] = text_condition(field, value, modo_busca, param_index)
+                    conditions.append(condition)
                     param_index += 1
                 else:
                     conditions.append(f'{field} = ${param_index}')
                     params[field] = value
                     param_index += 1
 
+        if cursor is not None:
+            conditions.append(f'id > ${param_index}')
+            params['cursor'] = decode_cursor(cursor, 'id')
+            param_index += 1
+
         if conditions:
             query += ' WHERE ' + ' AND '.join(conditions)
 
-        query += ' LIMIT 10000'
+        query += ' ORDER BY id'
+
+        if stream:
+            if page_size is not None:
+                query += f' LIMIT {page_size}'
+            chunks, media_type = STREAM_ENCODERS[output_format]
+            return StreamingResponse(
+                _fetch_stream(query, list(params.values()), chunks, company_id),
+                media_type=media_type
+            )
 
-        data = await conn.fetch(query, *params.values())
-        return data
+        if page_size is None and cursor is None:
+            query += f' LIMIT {SCHEDULE_MAX_ROWS}'
+            return await conn.fetch(query, *params.values())
+
+        page_size = page_size or SCHEDULE_DEFAULT_PAGE_SIZE
+        # Uma linha a mais só para saber se existe próxima página
+        query += f' LIMIT {page_size + 1}'
+        rows = await conn.fetch(query, *params.values())
+
+        next_cursor = encode_cursor({'id': rows[page_size - 1]['id']}) if len(rows) > page_size else None
+        return {'data': rows[:page_size], 'next_cursor': next_cursor}
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f'Failed to fetch schedule: {str(e)}'
         )
-    finally:
-        await close_db_connection(conn)
+
+
+@router.get('/schedule/export')
+@require_valid_token
+async def export_schedule(
+        permission_token: str,
+        mi4u_access_token: str,
+        dt_start: date = Query(..., description="Primeiro dia de data_agenda (AAAA-MM-DD)"),
+        dt_end: date = Query(..., description="Último dia de data_agenda (AAAA-MM-DD)"),
+        fields: str = Query(None, description="Colunas separadas por vírgula (padrão: todas)"),
+        gzip: bool = Query(False, description="Envia o CSV compactado (.csv.gz)"),
+):
+    """
+    Todos os lembretes da empresa com data_agenda no período, em CSV com
+    cabeçalho, gerado pelo Postgres (COPY ... TO STDOUT) e enviado conforme
+    é lido, sem limite de linhas e com memória constante.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
+
+    if dt_end < dt_start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='dt_end deve ser igual ou posterior a dt_start'
+        )
+
+    columns = parse_fields(fields) if fields else list(SCHEDULE_COLUMNS)
+    query = f"""
+        SELECT {", ".join(columns)}
+        FROM lembrete_sertaozinho
+        WHERE empresa_id = $1
+          AND data_agenda BETWEEN $2 AND $3
+        ORDER BY data_agenda, horario, id
+    """
+
+    filename = f'lembretes_{dt_start:%Y%m%d}_{dt_end:%Y%m%d}.csv' + ('.gz' if gzip else '')
+
+    return StreamingResponse(
+        _copy_stream(query, [company_id, dt_start, dt_end], company_id, compress=gzip),
+        media_type='application/gzip' if gzip else 'text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post('/schedule/set_response')
@@ -145,27 +477,11 @@ async def update_response(
         permission_token: str,
         wa_message_id: str,
         resposta: str,
+        conn: Connection = Depends(get_db),
 ):
     try:
-        if resposta:
-            # Normalização da resposta: Remove TODOS os espaços (incluindo Unicode invisíveis)
-            # Normaliza acentos usando unicodedata
-            resposta_normalized = unicodedata.normalize('NFKD', resposta)
-            # Remove acentos
-            resposta_normalized = ''.join([c for c in resposta_normalized if not unicodedata.combining(c)])
-            # Converte para maiúsculas
-            resposta_normalized = resposta_normalized.upper()
-            # Remove TODOS os caracteres de espaço (incluindo invisíveis)
-            resposta_normalized = re.sub(r'\s+', '', resposta_normalized)
-            
-            if resposta_normalized == 'NAOCONFIRMO':
-                resposta = 'NAOCONFIRMO'
-            elif resposta_normalized == 'CONFIRMO':
-                resposta = 'CONFIRMO'
-            elif resposta_normalized == 'NAOCONHECO':
-                resposta = 'NAOCONHECO'
-
-        conn = await get_db_connection()
+        resposta = normalize_resposta(resposta)
+
         dt_resposta = datetime.now().replace(microsecond=0)
 
         query = '''
@@ -173,20 +489,222 @@ async def update_response(
                 SET resposta    = $1, \
                     dt_resposta = $2
                 WHERE wa_message_id = $3 \
+                RETURNING empresa_id, wa_message_id
                 '''
 
-        data = await conn.execute(
+        rows = await conn.fetch(
             query,
             resposta,
             dt_resposta,
             wa_message_id
         )
-        return data
+
+        await notify_responses(conn, rows)
+        await record_write((row['empresa_id'] for row in rows), conn)
+
+        return f'UPDATE {len(rows)}'
 
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f'Falha ao fazer o update: {str(e)}'
         )
-    finally:
-        await close_db_connection(conn)
\ No newline at end of file
+
+
+@router.post('/schedule/set_response/batch')
+@require_valid_token
+async def update_response_batch(
+        permission_token: str,
+        lote: RespostaLote,
+        conn: Connection = Depends(get_db),
+):
+    """
+    Grava um lote de respostas num único UPDATE. Se o mesmo wa_message_id
+    aparece mais de uma vez, vale a última ocorrência e as anteriores voltam
+    com status 'duplicado'.
+
+    Cada item volta com status 'atualizado' ou 'nao_encontrado' e o número
+    de linhas alteradas.
+    """
+    agora = datetime.now().replace(microsecond=0)
+
+    ultimos = {}
+    for posicao, item in enumerate(lote.respostas):
+        ultimos[item.wa_message_id] = posicao
+
+    ids, respostas, datas = [], [], []
+    for wa_message_id, posicao in ultimos.items():
+        item = lote.respostas[posicao]
+        ids.append(wa_message_id)
+        respostas.append(normalize_resposta(item.resposta))
+        dt_resposta = item.dt_resposta or agora
+        if dt_resposta.tzinfo is not None:
+            # A coluna é timestamp sem fuso, no horário local, como em datetime.now()
+            dt_resposta = dt_resposta.astimezone().replace(tzinfo=None)
+        datas.append(dt_resposta)
+
+    try:
+        rows = await conn.fetch(
+            """
+            UPDATE lembrete_sertaozinho l
+            SET resposta    = d.resposta,
+                dt_resposta = d.dt_resposta
+            FROM unnest($1::text[], $2::text[], $3::timestamp[]) AS d(wa_message_id, resposta, dt_resposta)
+            WHERE l.wa_message_id = d.wa_message_id
+            RETURNING l.empresa_id, l.wa_message_id
+            """,
+            ids,
+            respostas,
+            datas,
+        )
+        await notify_responses(conn, rows)
+        await record_write((row['empresa_id'] for row in rows), conn)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'Falha ao fazer o update: {str(e)}'
+        )
+
+    linhas = defaultdict(int)
+    for row in rows:
+        linhas[row['wa_message_id']] += 1
+
+    resultados = []
+    for posicao, item in enumerate(lote.respostas):
+        if ultimos[item.wa_message_id] != posicao:
+            situacao, alteradas = 'duplicado', 0
+        else:
+            alteradas = linhas.get(item.wa_message_id, 0)
+            situacao = 'atualizado' if alteradas else 'nao_encontrado'
+        resultados.append({
+            'wa_message_id': item.wa_message_id,
+            'matched': alteradas > 0,
+            'status': situacao,
+            'linhas': alteradas,
+        })
+
+    return {
+        'atualizados': sum(1 for r in resultados if r['status'] == 'atualizado'),
+        'nao_encontrados': sum(1 for r in resultados if r['status'] == 'nao_encontrado'),
+        'linhas': len(rows),
+        'resultados': resultados,
+    }
+
+
+@router.post('/schedule/due/claim')
+@require_valid_token
+async def claim_due(
+        permission_token: str,
+        mi4u_access_token: str,
+        limit: int = Query(100, ge=1, le=DISPATCH_MAX_BATCH),
+        lease_seconds: int = Query(DISPATCH_LEASE_SECONDS, ge=10, le=3600),
+        conn: Connection = Depends(get_db),
+):
+    """
+    Reserva um lote de lembretes vencidos e ainda não enviados da empresa
+    para o worker que chamou. Cada lembrete enviado deve ser confirmado em
+    /schedule/{id}/sent com o claim_id antes do lease expirar; os que não
+    forem voltam a ficar disponíveis depois disso.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
+
+    try:
+        claim, rows = await claim_due_reminders(conn, company_id, limit, lease_seconds)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'Falha ao reservar lembretes: {str(e)}'
+        )
+
+    return {
+        'claim_id': str(claim),
+        'lease_seconds': lease_seconds,
+        'lembretes': rows,
+    }
+
+
+@router.get('/schedule/due/failed')
+@require_valid_token
+async def list_failed_due(
+        permission_token: str,
+        mi4u_access_token: str,
+        limit: int = Query(100, ge=1, le=DISPATCH_MAX_BATCH),
+        conn: Connection = Depends(get_db),
+):
+    """
+    Lembretes que foram reservados DISPATCH_MAX_ATTEMPTS vezes sem
+    confirmação de envio e saíram da fila de /schedule/due/claim.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
+
+    try:
+        rows = await list_failed_reminders(conn, company_id, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'Falha ao listar lembretes: {str(e)}'
+        )
+
+    return {'lembretes': rows}
+
+
+@router.post('/schedule/{id}/sent')
+@require_valid_token
+async def mark_reminder_sent(
+        permission_token: str,
+        mi4u_access_token: str,
+        id: int,
+        claim_id: uuid.UUID,
+        wa_message_id: str,
+        customer_service_id: int = Query(None),
+        conn: Connection = Depends(get_db),
+):
+    company_id = company_id_from_token(mi4u_access_token)
+
+    try:
+        motivo = await mark_sent(conn, company_id, id, claim_id, wa_message_id, customer_service_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'Falha ao registrar envio: {str(e)}'
+        )
+
+    if motivo == 'nao_encontrado':
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Lembrete não encontrado'
+        )
+    if motivo is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Lembrete já enviado' if motivo == 'ja_enviado' else 'Reserva expirada ou de outro worker'
+        )
+
+    return {'id': id, 'wa_message_id': wa_message_id, 'status': 'enviado'}
+
+
+@router.get('/schedule/events')
+@require_valid_token
+async def schedule_events(
+        permission_token: str,
+        mi4u_access_token: str,
+):
+    """
+    Server-Sent Events com as mudanças nos lembretes da empresa: 'resposta'
+    (set_response) e 'ingestao' (agenda importada). Substitui o polling de
+    /schedule; o cliente reconecta sozinho se o stream cair.
+    """
+    company_id = company_id_from_token(mi4u_access_token)
+
+    broker = get_event_broker()
+    if broker is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Eventos desabilitados'
+        )
+
+    return StreamingResponse(
+        sse_stream(broker, company_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
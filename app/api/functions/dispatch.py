@@ -0,0 +1,152 @@
+import os
+import uuid
+from typing import List, Optional, Tuple
+
+from asyncpg import Connection, Record
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DISPATCH_LEASE_SECONDS = int(os.getenv('DISPATCH_LEASE_SECONDS', '300'))
+DISPATCH_MAX_BATCH = int(os.getenv('DISPATCH_MAX_BATCH', '1000'))
+# Reservas sem /sent antes de o lembrete ser dado como falho
+DISPATCH_MAX_ATTEMPTS = int(os.getenv('DISPATCH_MAX_ATTEMPTS', '5'))
+
+# Colunas que o worker de envio precisa para montar a mensagem
+DISPATCH_COLUMNS = (
+    'id', 'empresa_id', 'unidade_executante', 'profissional', 'data_agenda',
+    'especialidade', 'horario', 'codigo', 'paciente', 'telefone',
+    'data_hora_enviar', 'envio_tentativas',
+)
+
+
+async def claim_due_reminders(
+    conn: Connection,
+    company_id: int,
+    limit: int,
+    lease_seconds: int = DISPATCH_LEASE_SECONDS,
+    max_attempts: int = DISPATCH_MAX_ATTEMPTS,
+) -> Tuple[uuid.UUID, List[Record]]:
+    """
+    Reserva até `limit` lembretes da empresa com envio vencido e ainda sem
+    wa_message_id, para um worker de envio.
+
+    O SKIP LOCKED faz workers concorrentes pegarem lotes disjuntos sem
+    esperar um pelo outro; o lease impede que o lote seja pego de novo até
+    expirar (worker que morreu no meio). Devolve o claim, que /sent confere.
+
+    Lembretes cujo lease expirou depois de max_attempts reservas são
+    marcados em envio_falhou_em e não são mais reservados.
+    """
+    claim = uuid.uuid4()
+    columns = ', '.join(f'l.{column}' for column in DISPATCH_COLUMNS)
+    async with conn.transaction():
+        await conn.execute(
+            """
+            UPDATE lembrete_sertaozinho
+            SET envio_falhou_em = now(),
+                envio_lease_ate = NULL
+            WHERE empresa_id = $1
+              AND wa_message_id IS NULL
+              AND envio_falhou_em IS NULL
+              AND envio_tentativas >= $2
+              AND (envio_lease_ate IS NULL OR envio_lease_ate < now())
+            """,
+            company_id,
+            max_attempts,
+        )
+
+        rows = await conn.fetch(
+            f"""
+            UPDATE lembrete_sertaozinho l
+            SET envio_claim = $4,
+                envio_lease_ate = now() + make_interval(secs => $3),
+                envio_tentativas = l.envio_tentativas + 1
+            FROM (
+                SELECT id
+                FROM lembrete_sertaozinho
+                WHERE empresa_id = $1
+                  AND wa_message_id IS NULL
+                  AND envio_falhou_em IS NULL
+                  AND envio_tentativas < $5
+                  AND data_hora_enviar <= localtimestamp
+                  AND (envio_lease_ate IS NULL OR envio_lease_ate < now())
+                ORDER BY data_hora_enviar, id
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            ) vencidos
+            WHERE l.id = vencidos.id
+            RETURNING {columns}
+            """,
+            company_id,
+            limit,
+            lease_seconds,
+            claim,
+            max_attempts,
+        )
+    return claim, sorted(rows, key=lambda row: (row['data_hora_enviar'], row['id']))
+
+
+async def mark_sent(
+    conn: Connection,
+    company_id: int,
+    reminder_id: int,
+    claim: uuid.UUID,
+    wa_message_id: str,
+    customer_service_id: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Registra o envio de um lembrete reservado por `claim`. Devolve None em
+    caso de sucesso, ou o motivo da recusa: 'nao_encontrado', 'ja_enviado'
+    ou 'claim_invalido' (o lease expirou e outro worker reservou a linha).
+    """
+    updated = await conn.fetchval(
+        """
+        UPDATE lembrete_sertaozinho
+        SET wa_message_id = $4,
+            customer_service_id = coalesce($5, customer_service_id),
+            envio_lease_ate = NULL,
+            envio_falhou_em = NULL
+        WHERE id = $1
+          AND empresa_id = $2
+          AND envio_claim = $3
+          AND wa_message_id IS NULL
+        RETURNING id
+        """,
+        reminder_id,
+        company_id,
+        claim,
+        wa_message_id,
+        customer_service_id,
+    )
+    if updated is not None:
+        return None
+
+    row = await conn.fetchrow(
+        'SELECT wa_message_id FROM lembrete_sertaozinho WHERE id = $1 AND empresa_id = $2',
+        reminder_id,
+        company_id,
+    )
+    if row is None:
+        return 'nao_encontrado'
+    if row['wa_message_id'] is not None:
+        return 'ja_enviado'
+    return 'claim_invalido'
+
+
+async def list_failed_reminders(conn: Connection, company_id: int, limit: int) -> List[Record]:
+    """Lembretes da empresa que esgotaram as tentativas de envio, mais recentes primeiro."""
+    columns = ', '.join(DISPATCH_COLUMNS)
+    return await conn.fetch(
+        f"""
+        SELECT {columns}, envio_falhou_em
+        FROM lembrete_sertaozinho
+        WHERE empresa_id = $1
+          AND wa_message_id IS NULL
+          AND envio_falhou_em IS NOT NULL
+        ORDER BY envio_falhou_em DESC, id
+        LIMIT $2
+        """,
+        company_id,
+        limit,
+    )
@@ -1,24 +1,29 @@
+from contextlib import aclosing
 from datetime import datetime
 from io import BytesIO
-from typing import List, Dict
+from typing import Awaitable, Iterator, List, Dict, Optional, Tuple
+import os
 import re
+import tempfile
+import time
 
+import numpy as np
 import pdfplumber
 import pandas as pd
 from asyncpg import Connection
+from dotenv import load_dotenv
 
-from ...db import get_db_connection, close_db_connection
+from ...db import acquire_connection, record_write
+from .events import notify_event
+from .parser_pool import stream_in_parser_pool
 
+load_dotenv()
 
-def pdf_to_text(pdf_file: BytesIO) -> str:
-    pdf_file.seek(0)
-    text = ""
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
+# Páginas por lote devolvido pelo pool de parsing e linhas por COPY
+ETL_PAGES_PER_TASK = int(os.getenv('ETL_PAGES_PER_TASK', '10'))
+ETL_BATCH_SIZE = int(os.getenv('ETL_BATCH_SIZE', '5000'))
+
+HEADER_FIELDS = ("unidade_saude", "data_atendimento", "profissional", "especialidade")
 
 
 def parse_header(text: str) -> Dict:
@@ -46,22 +51,84 @@ def parse_header(text: str) -> Dict:
     return header
 
 
-def parse_patients_tables(pdf_file: BytesIO) -> List[Dict]:
-    pdf_file.seek(0)
+def extract_page_rows(page) -> List[List[str]]:
     dados_extraidos = []
 
+    for table in page.extract_tables():
+        for row in table:
+            clean_row = [
+                str(cell).replace('\n', ' ').strip() if cell else ''
+                for cell in row
+            ]
+            if any(clean_row):
+                dados_extraidos.append(clean_row)
+
+    return dados_extraidos
+
+
+def parse_page(page, header: Dict) -> List[Dict]:
+    """
+    Extrai os pacientes de uma página e, enquanto faltar algum campo do
+    cabeçalho, completa header com o texto dela. Libera os caches da página
+    ao final, para que a memória não cresça com o número de páginas.
+    """
+    try:
+        if not all(field in header for field in HEADER_FIELDS):
+            page_text = page.extract_text()
+            if page_text:
+                for field, value in parse_header(page_text).items():
+                    header.setdefault(field, value)
+
+        return parse_patients_rows(extract_page_rows(page))
+    finally:
+        page.close()
+
+
+def parse_pdf(pdf_file: BytesIO) -> Tuple[Dict, List[Dict]]:
+    """
+    Abre o PDF uma única vez e, na mesma passada pelas páginas, extrai o
+    cabeçalho e as tabelas de pacientes.
+
+    O texto da página só é extraído enquanto faltar algum campo do
+    cabeçalho (normalmente apenas a primeira página).
+    """
+    pdf_file.seek(0)
+    header = {}
+    pacientes = []
+
     with pdfplumber.open(pdf_file) as pdf:
         for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                for row in table:
-                    clean_row = [
-                        str(cell).replace('\n', ' ').strip() if cell else ''
-                        for cell in row
-                    ]
-                    if any(clean_row):
-                        dados_extraidos.append(clean_row)
+            pacientes.extend(parse_page(page, header))
+
+    return header, pacientes
+
+
+def iter_pdf_pages(pdf_path: str, pages_per_batch: int) -> Iterator[Tuple[Dict, List[Dict]]]:
+    """
+    Abre o PDF uma vez e entrega os pacientes em lotes de pages_per_batch
+    páginas. É o ponto de entrada do parsing nos processos do pool (ver
+    parser_pool.stream_in_parser_pool): o ETL grava cada lote enquanto o
+    worker segue para as próximas páginas.
+
+    Cada lote vem com o cabeçalho encontrado até ali.
+    """
+    header = {}
+    pacientes = []
+    processadas = 0
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            pacientes.extend(parse_page(page, header))
+            processadas += 1
+            if processadas == pages_per_batch:
+                yield dict(header), pacientes
+                pacientes, processadas = [], 0
 
+    if processadas:
+        yield dict(header), pacientes
+
+
+def parse_patients_rows(dados_extraidos: List[List[str]]) -> List[Dict]:
     df = pd.DataFrame(dados_extraidos)
 
     colunas_sugeridas = [
@@ -77,60 +144,221 @@ def parse_patients_tables(pdf_file: BytesIO) -> List[Dict]:
 
         if not df.empty and df.iloc[0]["Nome Paciente"] == "Nome Paciente":
             df = df.iloc[1:]
+    else:
+        # Sem as 11 colunas esperadas não há como localizar nome e data
+        return []
+
+    if df.empty:
+        return []
+
+    nome = df["Nome Paciente"].astype(str).str.strip()
+
+    # Linha inteira como texto: CNS, telefone e data/hora de fallback são
+    # procurados nela, como quando o PDF quebra as células de forma irregular
+    texto = df.astype(str)
+    linha_completa = texto.iloc[:, 0]
+    for coluna in texto.columns[1:]:
+        linha_completa = linha_completa + " " + texto[coluna]
+
+    # CNS: primeiro par de números consecutivos que, juntos, somam 15 dígitos
+    # (o número costuma vir quebrado em duas partes na célula)
+    numeros = linha_completa.str.findall(r"\b\d+\b").explode().dropna()
+    valores = numeros.to_numpy(dtype=object)
+    tamanhos = numeros.str.len().to_numpy()
+    linhas = numeros.index.to_numpy()
+
+    pares = np.flatnonzero(
+        (linhas[:-1] == linhas[1:]) & (tamanhos[:-1] + tamanhos[1:] == 15)
+    )
+    cns = pd.Series(valores[pares] + valores[pares + 1], index=linhas[pares], dtype=object)
+    cns = cns[~cns.index.duplicated()].reindex(df.index)
 
-    pacientes = []
-
-    for _, row in df.iterrows():
-        try:
-            nome = str(row["Nome Paciente"]).strip()
-            linha_completa = " ".join(str(v) for v in row.values)
+    telefone = linha_completa.str.extract(r"\b(\d{10,11})\b")[0]
 
-            numeros = re.findall(r"\b\d+\b", linha_completa)
-            cns = None
-            for i in range(len(numeros) - 1):
-                combinado = numeros[i] + numeros[i + 1]
-                if len(combinado) == 15:
-                    cns = combinado
-                    break
+    data_hora = pd.to_datetime(
+        df["Data/Hora Atendimento"].astype(str).str.strip(),
+        format="%d/%m/%Y %H:%M",
+        errors="coerce",
+    )
 
-            tel_match = re.search(r"\b\d{10,11}\b", linha_completa)
+    # Fallback: primeira data e primeiro horário encontrados na linha
+    sem_data = linha_completa[data_hora.isna()]
+    if not sem_data.empty:
+        data_fallback = sem_data.str.extract(r"(\d{2}/\d{2}/\d{4})")[0]
+        hora_fallback = sem_data.str.extract(r"\b(\d{2}:\d{2})\b")[0]
+        data_hora = data_hora.fillna(pd.to_datetime(
+            data_fallback + " " + hora_fallback,
+            format="%d/%m/%Y %H:%M",
+            errors="coerce",
+        ))
+
+    validos = (nome != "") & cns.notna() & data_hora.notna()
+
+    return [
+        {
+            "paciente": p_nome,
+            "cns": p_cns,
+            "telefone": p_telefone if isinstance(p_telefone, str) else None,
+            "data_hora_agendamento": p_data_hora,
+            "classificacao": "CONSULTA",
+            "status": "AGENDADO",
+        }
+        for p_nome, p_cns, p_telefone, p_data_hora in zip(
+            nome[validos].str.title(),
+            cns[validos],
+            telefone[validos],
+            data_hora[validos].to_numpy().astype("datetime64[us]").tolist(),
+        )
+    ]
 
-            data_hora = None
-            campo_data_hora = str(row["Data/Hora Atendimento"]).strip()
 
-            if campo_data_hora:
-                try:
-                    data_hora = datetime.strptime(
-                        campo_data_hora, "%d/%m/%Y %H:%M"
-                    )
-                except ValueError:
-                    data_hora = None
-
-            if not data_hora:
-                data_match = re.search(r"\d{2}/\d{2}/\d{4}", linha_completa)
-                hora_match = re.search(r"\b\d{2}:\d{2}\b", linha_completa)
-                if data_match and hora_match:
-                    data_hora = datetime.strptime(
-                        f"{data_match.group()} {hora_match.group()}",
-                        "%d/%m/%Y %H:%M"
-                    )
+STAGING_COLUMNS = ["data_agenda", "horario", "paciente", "codigo", "telefone"]
+
+# Serializa merges da mesma empresa e data_agenda: o índice da chave natural
+# não é UNIQUE, então duas ingestões simultâneas da mesma agenda passariam
+# pelo NOT EXISTS e inseririam as mesmas linhas. Travas em ordem de data,
+# para que dois merges com várias datas não se bloqueiem mutuamente.
+MERGE_LOCK_QUERY = """
+    SELECT pg_advisory_xact_lock($1, hashtext(data_agenda::text))
+    FROM (
+        SELECT DISTINCT data_agenda
+        FROM lembrete_staging
+        WHERE data_agenda IS NOT NULL
+        ORDER BY data_agenda
+    ) datas
+"""
+
+MERGE_STAGING_QUERY = """
+    WITH dados AS (
+        SELECT DISTINCT ON (codigo, data_agenda, horario) *
+        FROM lembrete_staging
+        ORDER BY codigo, data_agenda, horario
+    ),
+    usuario AS (
+        SELECT nomecompleto FROM usuarios WHERE id = $2
+    ),
+    atualizados AS (
+        UPDATE lembrete_sertaozinho l
+        SET unidade_executante = $6,
+            profissional       = $7,
+            especialidade      = $8,
+            paciente           = d.paciente,
+            telefone           = d.telefone,
+            data_hora_enviar   = $3,
+            data_hora_upload   = $4,
+            nome_arquivo       = $5,
+            id_usuario         = $2,
+            nome_usuario       = (SELECT nomecompleto FROM usuario)
+        FROM dados d
+        WHERE l.empresa_id = $1
+          AND l.codigo = d.codigo
+          AND l.data_agenda = d.data_agenda
+          AND l.horario = d.horario
+        RETURNING l.id
+    ),
+    inseridos AS (
+        INSERT INTO lembrete_sertaozinho (
+            empresa_id, unidade_executante, profissional,
+            especialidade, data_agenda,
+            paciente, codigo, telefone,
+            data_hora_enviar, data_hora_upload, nome_arquivo,
+            id_usuario, nome_usuario, horario
+        )
+        SELECT
+            $1, $6, $7,
+            $8, d.data_agenda,
+            d.paciente, d.codigo, d.telefone,
+            $3, $4, $5,
+            $2, (SELECT nomecompleto FROM usuario), d.horario
+        FROM dados d
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM lembrete_sertaozinho l
+            WHERE l.empresa_id = $1
+              AND l.codigo = d.codigo
+              AND l.data_agenda = d.data_agenda
+              AND l.horario = d.horario
+        )
+        RETURNING id
+    )
+    SELECT
+        (SELECT count(*) FROM inseridos)   AS inseridas,
+        (SELECT count(*) FROM atualizados) AS atualizadas
+"""
+
+
+async def create_staging(conn: Connection, on_commit_drop: bool = True) -> None:
+    """
+    Tabela temporária que recebe os lotes do COPY. Com on_commit_drop ela
+    some no fim da transação; sem, vale para a sessão e deve ser removida
+    com drop_staging antes de a conexão voltar para o pool. Herda os tipos
+    das colunas da tabela real, como o COPY binário exige.
+    """
+    await conn.execute(
+        f"""
+        CREATE TEMP TABLE lembrete_staging {"ON COMMIT DROP" if on_commit_drop else ""} AS
+        SELECT {", ".join(STAGING_COLUMNS)}
+        FROM lembrete_sertaozinho
+        WITH NO DATA
+        """
+    )
 
-            if not nome or not cns or not data_hora:
-                continue
 
-            pacientes.append({
-                "paciente": nome.title(),
-                "cns": cns,
-                "telefone": tel_match.group() if tel_match else None,
-                "data_hora_agendamento": data_hora,
-                "classificacao": "CONSULTA",
-                "status": "AGENDADO",
-            })
+async def drop_staging(conn: Connection) -> None:
+    await conn.execute("DROP TABLE IF EXISTS pg_temp.lembrete_staging")
+
+
+async def copy_to_staging(conn: Connection, pacientes: List[Dict]) -> None:
+    await conn.copy_records_to_table(
+        "lembrete_staging",
+        records=(
+            (
+                p["data_hora_agendamento"].date(),
+                p["data_hora_agendamento"].time(),
+                p["paciente"],
+                int(p["cns"]),
+                p["telefone"],
+            )
+            for p in pacientes
+        ),
+        columns=STAGING_COLUMNS,
+    )
 
-        except Exception:
-            continue
 
-    return pacientes
+async def merge_staging(
+    conn: Connection,
+    company_id: int,
+    filename: str,
+    user_id: int,
+    data_hora_enviar: datetime,
+    data_hora_upload: datetime,
+    header: Dict,
+) -> Tuple[int, int]:
+    """
+    Move o conteúdo de lembrete_staging para lembrete_sertaozinho em um
+    único statement.
+
+    A chave natural é (empresa_id, codigo, data_agenda, horario): reenviar a
+    mesma agenda (ou uma versão corrigida) atualiza os lembretes existentes,
+    preservando resposta e wa_message_id, em vez de duplicá-los. Precisa
+    rodar dentro de uma transação: as travas de MERGE_LOCK_QUERY valem até
+    o commit.
+
+    Retorna (linhas inseridas, linhas atualizadas).
+    """
+    await conn.execute(MERGE_LOCK_QUERY, company_id)
+    resultado = await conn.fetchrow(
+        MERGE_STAGING_QUERY,
+        company_id,
+        user_id,
+        data_hora_enviar,
+        data_hora_upload,
+        filename,
+        header.get("unidade_saude"),
+        header.get("profissional"),
+        header.get("especialidade"),
+    )
+    return resultado["inseridas"], resultado["atualizadas"]
 
 
 async def insert_data(
@@ -142,49 +370,23 @@ async def insert_data(
     data_hora_upload: datetime,
     header: Dict,
     pacientes: List[Dict],
-) -> None:
-
-    nome_usuario = await conn.fetchval(
-        "SELECT nomecompleto FROM usuarios WHERE id = $1",
-        user_id
-    )
-
-    valores = [
-        (
+) -> Tuple[int, int]:
+    """
+    Grava uma lista de pacientes já extraída: COPY binário para a staging e
+    merge, na mesma transação. Retorna (linhas inseridas, linhas atualizadas).
+    """
+    async with conn.transaction():
+        await create_staging(conn)
+        await copy_to_staging(conn, pacientes)
+        return await merge_staging(
+            conn,
             company_id,
-            header.get("unidade_saude"),
-            header.get("profissional"),
-            header.get("especialidade"),
-            p["data_hora_agendamento"].date(),
-            p["paciente"],
-            int(p["cns"]),
-            p["telefone"],
-            data_hora_enviar,
-            data_hora_upload,
             filename,
             user_id,
-            nome_usuario,
-            p["data_hora_agendamento"].time(),
-        )
-        for p in pacientes
-    ]
-
-    await conn.executemany(
-        """
-        INSERT INTO lembrete_sertaozinho (
-            empresa_id, unidade_executante, profissional,
-            especialidade, data_agenda,
-            paciente, codigo, telefone,
-            data_hora_enviar, data_hora_upload, nome_arquivo,
-            id_usuario, nome_usuario, horario
-        )
-        VALUES (
-            $1,$2,$3,$4,$5,$6,$7,$8,$9,$10,
-            $11,$12,$13,$14
+            data_hora_enviar,
+            data_hora_upload,
+            header,
         )
-        """,
-        valores
-    )
 
 
 async def etl_sertaozinho(
@@ -193,25 +395,101 @@ async def etl_sertaozinho(
     user_id: int,
     data_hora_enviar: datetime,
     data_hora_upload: datetime,
-    blob_file: BytesIO
-) -> None:
-
-    header_text = pdf_to_text(blob_file)
-    header = parse_header(header_text)
+    file_bytes: bytes,
+    persisted: Optional[Awaitable] = None,
+) -> Dict:
+    """
+    Extrai os pacientes do PDF e grava em lembrete_sertaozinho.
+
+    O PDF é aberto uma vez por um processo do pool de parsing, que devolve
+    os pacientes em lotes de ETL_PAGES_PER_TASK páginas; cada lote vai para
+    a staging (em COPYs de ETL_BATCH_SIZE linhas) enquanto o worker segue
+    para as próximas páginas, no máximo ETL_STREAM_BUFFER lotes à frente:
+    a memória usada depende do tamanho do lote, não do número de páginas do
+    arquivo. O job ocupa uma vaga do pool do início ao fim.
+
+    A staging é uma tabela temporária da sessão: os COPYs rodam fora de
+    transação, e só o merge (travas, MERGE e NOTIFY) acontece numa
+    transação curta, depois do parsing e do upload. A agenda entra inteira
+    ou não entra, sem deixar a conexão ociosa numa transação aberta.
+
+    Se persisted for informado (upload para o storage em andamento), o
+    parsing roda em paralelo a ele e o merge só acontece depois que o
+    arquivo foi gravado.
+
+    Retorna a contagem de linhas e o tempo (em segundos) de cada etapa,
+    que os jobs de ingestão registram em ingestao_jobs.
+    """
+    etapas = {"parse": 0.0, "insert": 0.0}
+    header = {}
+    linhas_extraidas = 0
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        # O processo do pool lê o PDF do disco, em vez de receber uma cópia
+        # dos bytes
+        pdf_file.write(file_bytes)
+        pdf_file.flush()
+
+        async with acquire_connection() as conn:
+            await create_staging(conn, on_commit_drop=False)
+            try:
+                lotes = stream_in_parser_pool(iter_pdf_pages, pdf_file.name, ETL_PAGES_PER_TASK)
+                async with aclosing(lotes):
+                    inicio = time.perf_counter()
+                    async for header, pacientes in lotes:
+                        etapas["parse"] += time.perf_counter() - inicio
+
+                        inicio = time.perf_counter()
+                        for i in range(0, len(pacientes), ETL_BATCH_SIZE):
+                            await copy_to_staging(conn, pacientes[i:i + ETL_BATCH_SIZE])
+                        etapas["insert"] += time.perf_counter() - inicio
+
+                        linhas_extraidas += len(pacientes)
+                        inicio = time.perf_counter()
+                    etapas["parse"] += time.perf_counter() - inicio
+
+                if persisted is not None:
+                    inicio = time.perf_counter()
+                    await persisted
+                    etapas["upload"] = time.perf_counter() - inicio
+
+                inicio = time.perf_counter()
+                async with conn.transaction():
+                    linhas_inseridas, linhas_atualizadas = await merge_staging(
+                        conn,
+                        company_id,
+                        filename,
+                        user_id,
+                        data_hora_enviar,
+                        data_hora_upload,
+                        header,
+                    )
 
-    pacientes = parse_patients_tables(blob_file)
+                    periodo = await conn.fetchrow(
+                        "SELECT min(data_agenda) AS inicio, max(data_agenda) AS fim FROM lembrete_staging"
+                    )
 
-    conn = await get_db_connection()
-    try:
-        await insert_data(
-            conn,
-            company_id,
-            filename,
-            user_id,
-            data_hora_enviar,
-            data_hora_upload,
-            header,
-            pacientes
-        )
-    finally:
-        await close_db_connection(conn)
+                    # Dentro da transação: o evento só é entregue se o merge for commitado
+                    await notify_event(
+                        conn,
+                        company_id,
+                        "ingestao",
+                        nome_arquivo=filename,
+                        linhas_inseridas=linhas_inseridas,
+                        linhas_atualizadas=linhas_atualizadas,
+                        inicio=periodo["inicio"],
+                        fim=periodo["fim"],
+                    )
+                etapas["insert"] += time.perf_counter() - inicio
+
+                # Depois do commit, ainda com a conexão da escrita
+                await record_write([company_id], conn)
+            finally:
+                await drop_staging(conn)
+
+    return {
+        "linhas_extraidas": linhas_extraidas,
+        "linhas_inseridas": linhas_inseridas,
+        "linhas_atualizadas": linhas_atualizadas,
+        "etapas": {etapa: round(segundos, 3) for etapa, segundos in etapas.items()},
+    }
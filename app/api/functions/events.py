@@ -0,0 +1,214 @@
+"""
+Eventos de lembretes via LISTEN/NOTIFY do Postgres.
+
+Quem grava (set_response, ingestão) chama notify_event() na própria conexão:
+dentro de uma transação, o evento só sai no commit. Cada processo da API
+mantém uma única conexão dedicada escutando o canal e repassa os eventos
+para as filas dos clientes inscritos na empresa (/schedule/events).
+
+A mesma conexão escuta o canal cross_relatorio, em que os triggers de
+cross_agendamentos (migration 0008) avisam o intervalo de data_agenda
+alterado, e invalida esse intervalo no report_cache.
+"""
+import asyncio
+import json
+import os
+from datetime import date
+from typing import Dict, Optional, Set
+
+from asyncpg import Connection
+from dotenv import load_dotenv
+
+from ...db import connect_dedicated
+from .report_cache import report_cache
+
+load_dotenv()
+
+EVENTS_CHANNEL = 'lembrete_eventos'
+REPORT_CHANNEL = 'cross_relatorio'
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv('EVENTS_KEEPALIVE_SECONDS', '15'))
+EVENTS_RECONNECT_SECONDS = float(os.getenv('EVENTS_RECONNECT_SECONDS', '5'))
+
+# O payload do NOTIFY é limitado a 8000 bytes
+MAX_IDS_PER_EVENT = 100
+
+# Colocado na fila de um cliente lento demais, para encerrar o stream dele
+CLOSED = object()
+
+
+async def notify_event(conn: Connection, company_id: int, tipo: str, **dados) -> None:
+    payload = json.dumps({'empresa_id': company_id, 'tipo': tipo, **dados}, ensure_ascii=False, default=str)
+    await conn.execute('SELECT pg_notify($1, $2)', EVENTS_CHANNEL, payload)
+
+
+async def notify_report_change(conn: Connection, inicio: Optional[date] = None, fim: Optional[date] = None) -> None:
+    """Para mudanças no /report que não passam pelos triggers (ex.: arquivamento)."""
+    payload = json.dumps({'inicio': inicio, 'fim': fim}, default=str)
+    await conn.execute('SELECT pg_notify($1, $2)', REPORT_CHANNEL, payload)
+
+
+async def notify_responses(conn: Connection, rows) -> None:
+    """Um evento 'resposta' por empresa, com os wa_message_id respondidos."""
+    por_empresa: Dict[int, list] = {}
+    for row in rows:
+        por_empresa.setdefault(row['empresa_id'], []).append(row['wa_message_id'])
+
+    for company_id, ids in por_empresa.items():
+        await notify_event(
+            conn,
+            company_id,
+            'resposta',
+            quantidade=len(ids),
+            wa_message_ids=ids[:MAX_IDS_PER_EVENT],
+        )
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, reconnect_seconds: float = EVENTS_RECONNECT_SECONDS):
+        self.queue_size = queue_size
+        self.reconnect_seconds = reconnect_seconds
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name='event-listener')
+        # Não segura o startup se o banco demorar: o loop segue tentando
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            print('Listener de eventos ainda não conectado; tentando em segundo plano')
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._close(queue)
+        self._subscribers.clear()
+
+    async def _run(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await connect_dedicated()
+                terminated = asyncio.Event()
+                conn.add_termination_listener(lambda _: terminated.set())
+                await conn.add_listener(EVENTS_CHANNEL, self._on_notification)
+                await conn.add_listener(REPORT_CHANNEL, self._on_report_change)
+                # Avisos perdidos enquanto a conexão estava fora
+                report_cache.invalidate(None, None)
+                self._connected.set()
+                print(f'Escutando eventos em {EVENTS_CHANNEL} e {REPORT_CHANNEL}')
+                await terminated.wait()
+                print('Conexão de eventos perdida; reconectando')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'Erro no listener de eventos: {e}')
+            finally:
+                self._connected.clear()
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    def _on_notification(self, conn, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        self.publish(event)
+
+    def _on_report_change(self, conn, pid, channel, payload: str) -> None:
+        try:
+            periodo = json.loads(payload)
+            inicio = date.fromisoformat(periodo['inicio']) if periodo.get('inicio') else None
+            fim = date.fromisoformat(periodo['fim']) if periodo.get('fim') else None
+        except (ValueError, TypeError, AttributeError):
+            inicio = fim = None
+        report_cache.invalidate(inicio, fim)
+
+    def publish(self, event: dict) -> None:
+        for queue in list(self._subscribers.get(event.get('empresa_id'), ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cliente não está consumindo: encerra o stream, ele reconecta
+                self.unsubscribe(event.get('empresa_id'), queue)
+                self._close(queue)
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        while True:
+            try:
+                queue.put_nowait(CLOSED)
+                return
+            except asyncio.QueueFull:
+                queue.get_nowait()
+
+    def subscribe(self, company_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(company_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, company_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(company_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[company_id]
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event.get('tipo', 'message')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(broker: EventBroker, company_id: int, keepalive: float = EVENTS_KEEPALIVE_SECONDS):
+    """Eventos da empresa em formato text/event-stream, até o cliente sair."""
+    queue = broker.subscribe(company_id)
+    try:
+        yield ': conectado\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém a conexão viva em proxies
+                yield ': ping\n\n'
+                continue
+            if event is CLOSED:
+                return
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(company_id, queue)
+
+
+_broker: Optional[EventBroker] = None
+
+
+async def start_event_listener() -> Optional[EventBroker]:
+    global _broker
+
+    if EVENTS_ENABLED and _broker is None:
+        _broker = EventBroker()
+        await _broker.start()
+
+    return _broker
+
+
+async def stop_event_listener() -> None:
+    global _broker
+
+    if _broker is not None:
+        await _broker.stop()
+        _broker = None
+
+
+def get_event_broker() -> Optional[EventBroker]:
+    return _broker
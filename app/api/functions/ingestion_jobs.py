@@ -0,0 +1,516 @@
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from asyncpg import Connection, Record
+from dotenv import load_dotenv
+
+from ...db import acquire_connection
+from .parser_pool import ParserPoolFull, parser_pool_full
+
+load_dotenv()
+
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '2'))
+INGESTION_POLL_INTERVAL = float(os.getenv('INGESTION_POLL_INTERVAL', '5'))
+INGESTION_LEASE_SECONDS = int(os.getenv('INGESTION_LEASE_SECONDS', '900'))
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', '3'))
+# Quantas vezes o lease é renovado dentro de INGESTION_LEASE_SECONDS
+INGESTION_HEARTBEATS_PER_LEASE = 3
+
+
+async def create_job(
+    conn: Connection,
+    company_id: int,
+    user_id: int,
+    filename: str,
+    blob_name: str,
+    data_hora_enviar: datetime,
+    data_hora_upload: datetime,
+    uploading: bool = False,
+    lease_seconds: int = INGESTION_LEASE_SECONDS,
+) -> uuid.UUID:
+    """
+    Registra um job de ingestão.
+
+    Com uploading=True o job nasce em 'uploading': enquanto o arquivo é
+    gravado no storage só o worker local (que já tem os bytes em memória)
+    pode executá-lo. Ele passa a 'queued' em mark_job_uploaded; se o
+    processo cair antes disso, o lease expira e o job é retomado.
+    """
+    return await conn.fetchval(
+        """
+        INSERT INTO ingestao_jobs (
+            id, empresa_id, id_usuario, nome_arquivo, blob_name,
+            data_hora_enviar, data_hora_upload, status, lease_ate
+        )
+        VALUES (
+            $1, $2, $3, $4, $5, $6, $7,
+            CASE WHEN $8 THEN 'uploading' ELSE 'queued' END,
+            CASE WHEN $8 THEN now() + make_interval(secs => $9) END
+        )
+        RETURNING id
+        """,
+        uuid.uuid4(),
+        company_id,
+        user_id,
+        filename,
+        blob_name,
+        data_hora_enviar,
+        data_hora_upload,
+        uploading,
+        lease_seconds,
+    )
+
+
+async def mark_job_uploaded(conn: Connection, job_id: uuid.UUID) -> None:
+    await conn.execute(
+        """
+        UPDATE ingestao_jobs
+        SET status = 'queued', lease_ate = NULL
+        WHERE id = $1 AND status = 'uploading'
+        """,
+        job_id,
+    )
+
+
+async def get_job(conn: Connection, job_id: uuid.UUID) -> Optional[Record]:
+    return await conn.fetchrow('SELECT * FROM ingestao_jobs WHERE id = $1', job_id)
+
+
+async def claim_next_job(
+    conn: Connection,
+    lease_seconds: int = INGESTION_LEASE_SECONDS,
+    max_attempts: int = INGESTION_MAX_ATTEMPTS,
+) -> Optional[Record]:
+    """
+    Reserva o job pendente mais antigo para este worker.
+
+    Jobs em 'running' cujo lease expirou (o processo que os executava morreu)
+    voltam a ser elegíveis, até max_attempts tentativas. O SKIP LOCKED
+    garante que dois workers nunca peguem o mesmo job. O lease_id devolvido
+    identifica esta reserva (ver finish_job).
+    """
+    async with conn.transaction():
+        await conn.execute(
+            """
+            UPDATE ingestao_jobs
+            SET status = 'failed',
+                erro = 'Número máximo de tentativas excedido',
+                finalizado_em = now()
+            WHERE status IN ('uploading', 'running')
+              AND lease_ate < now()
+              AND tentativas >= $1
+            """,
+            max_attempts,
+        )
+
+        return await conn.fetchrow(
+            """
+            UPDATE ingestao_jobs
+            SET status = 'running',
+                tentativas = tentativas + 1,
+                iniciado_em = now(),
+                lease_ate = now() + make_interval(secs => $1),
+                lease_id = $2
+            WHERE id = (
+                SELECT id
+                FROM ingestao_jobs
+                WHERE status = 'queued'
+                   OR (status IN ('uploading', 'running') AND lease_ate < now())
+                ORDER BY criado_em
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+            """,
+            lease_seconds,
+            uuid.uuid4(),
+        )
+
+
+async def claim_job(
+    conn: Connection,
+    job_id: uuid.UUID,
+    lease_seconds: int = INGESTION_LEASE_SECONDS,
+) -> Optional[Record]:
+    """Reserva um job específico, se ele ainda não foi pego por outro worker."""
+    return await conn.fetchrow(
+        """
+        UPDATE ingestao_jobs
+        SET status = 'running',
+            tentativas = tentativas + 1,
+            iniciado_em = now(),
+            lease_ate = now() + make_interval(secs => $2),
+            lease_id = $3
+        WHERE id = $1
+          AND status IN ('uploading', 'queued')
+        RETURNING *
+        """,
+        job_id,
+        lease_seconds,
+        uuid.uuid4(),
+    )
+
+
+async def renew_lease(
+    conn: Connection,
+    job_id: uuid.UUID,
+    lease_id: uuid.UUID,
+    lease_seconds: int = INGESTION_LEASE_SECONDS,
+) -> bool:
+    """Estende o lease da reserva. False se o job já não é dela."""
+    renewed = await conn.fetchval(
+        """
+        UPDATE ingestao_jobs
+        SET lease_ate = now() + make_interval(secs => $3)
+        WHERE id = $1 AND lease_id = $2 AND status = 'running'
+        RETURNING id
+        """,
+        job_id,
+        lease_id,
+        lease_seconds,
+    )
+    return renewed is not None
+
+
+async def finish_job(conn: Connection, job_id: uuid.UUID, lease_id: uuid.UUID, result: Dict) -> bool:
+    """
+    Registra o resultado do job. False se a reserva lease_id já não vale (o
+    lease expirou e o job foi pego de novo); nesse caso nada é gravado.
+    """
+    finished = await conn.fetchval(
+        """
+        UPDATE ingestao_jobs
+        SET status = 'done',
+            linhas_extraidas = $3,
+            linhas_inseridas = $4,
+            linhas_atualizadas = $5,
+            etapas = $6,
+            erro = NULL,
+            lease_ate = NULL,
+            finalizado_em = now()
+        WHERE id = $1 AND lease_id = $2 AND status = 'running'
+        RETURNING id
+        """,
+        job_id,
+        lease_id,
+        result.get('linhas_extraidas'),
+        result.get('linhas_inseridas'),
+        result.get('linhas_atualizadas'),
+        result.get('etapas', {}),
+    )
+    return finished is not None
+
+
+async def fail_job(
+    conn: Connection,
+    job_id: uuid.UUID,
+    erro: str,
+    etapas: Dict,
+    lease_id: Optional[uuid.UUID] = None,
+) -> bool:
+    """
+    Marca o job como falho. Com lease_id, só se a reserva ainda valer (como
+    em finish_job); sem ele (ex.: upload que falhou no endpoint), em qualquer
+    estado que não 'done'.
+    """
+    failed = await conn.fetchval(
+        """
+        UPDATE ingestao_jobs
+        SET status = 'failed',
+            erro = $2,
+            etapas = $3,
+            lease_ate = NULL,
+            finalizado_em = now()
+        WHERE id = $1
+          AND status <> 'done'
+          AND ($4::uuid IS NULL OR (lease_id = $4 AND status = 'running'))
+        RETURNING id
+        """,
+        job_id,
+        erro,
+        etapas,
+        lease_id,
+    )
+    return failed is not None
+
+
+async def requeue_job(
+    conn: Connection,
+    job_id: uuid.UUID,
+    lease_id: uuid.UUID,
+    uploading: bool = False,
+    lease_seconds: int = INGESTION_LEASE_SECONDS,
+) -> None:
+    """
+    Devolve um job reservado que não chegou ao fim, sem contar a tentativa.
+
+    Com uploading=True (o arquivo ainda está indo para o storage) ele volta
+    para 'uploading', como em create_job, em vez de 'queued': outro processo
+    só pode pegá-lo quando o arquivo existir ou o lease expirar.
+    """
+    await conn.execute(
+        """
+        UPDATE ingestao_jobs
+        SET status = CASE WHEN $3 THEN 'uploading' ELSE 'queued' END,
+            tentativas = GREATEST(tentativas - 1, 0),
+            lease_ate = CASE WHEN $3 THEN now() + make_interval(secs => $4) END
+        WHERE id = $1 AND lease_id = $2 AND status = 'running'
+        """,
+        job_id,
+        lease_id,
+        uploading,
+        lease_seconds,
+    )
+
+
+def job_to_dict(job: Record) -> Dict:
+    def iso(value):
+        return value.isoformat() if value else None
+
+    return {
+        'id': str(job['id']),
+        'status': job['status'],
+        'nome_arquivo': job['nome_arquivo'],
+        'blob_name': job['blob_name'],
+        'tentativas': job['tentativas'],
+        'linhas_extraidas': job['linhas_extraidas'],
+        'linhas_inseridas': job['linhas_inseridas'],
+        'linhas_atualizadas': job['linhas_atualizadas'],
+        'etapas': job['etapas'],
+        'erro': job['erro'],
+        'criado_em': iso(job['criado_em']),
+        'iniciado_em': iso(job['iniciado_em']),
+        'finalizado_em': iso(job['finalizado_em']),
+    }
+
+
+class IngestionWorker:
+    """
+    Executa os jobs de ingestão em background, dentro do processo da API.
+
+    O estado de cada job vive na tabela ingestao_jobs, então um job que
+    estava em execução quando o processo caiu é retomado (por este ou outro
+    processo) assim que o lease expira. Enquanto o job roda, o lease é
+    renovado a cada lease_seconds / INGESTION_HEARTBEATS_PER_LEASE.
+
+    Jobs enviados por submit() já trazem os bytes do upload e são executados
+    sem baixar o arquivo do storage; o parsing começa enquanto o upload
+    ainda está em andamento e o insert espera o upload terminar.
+    """
+
+    def __init__(
+        self,
+        fetch_blob: Callable[[str], bytes],
+        delete_blob: Callable[[str], None],
+        etl: Callable[..., Awaitable[Dict]],
+        concurrency: int = INGESTION_WORKERS,
+        poll_interval: float = INGESTION_POLL_INTERVAL,
+        lease_seconds: int = INGESTION_LEASE_SECONDS,
+        max_attempts: int = INGESTION_MAX_ATTEMPTS,
+    ):
+        self.fetch_blob = fetch_blob
+        self.delete_blob = delete_blob
+        self.etl = etl
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._local: asyncio.Queue = asyncio.Queue()
+
+    async def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._loop(), name=f'ingestion-worker-{i}')
+            for i in range(self.concurrency)
+        ]
+        print(f'Workers de ingestão iniciados ({self.concurrency})')
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        print('Workers de ingestão encerrados.')
+
+    def notify(self) -> None:
+        """Acorda os workers ociosos (chamado logo após enfileirar um job)."""
+        self._wakeup.set()
+
+    def submit(self, job_id: uuid.UUID, file_bytes: bytes, persisted: Awaitable) -> None:
+        """
+        Entrega ao worker um job cujo arquivo já está em memória.
+
+        persisted é o upload para o storage; o job só grava no banco depois
+        que ele conclui com sucesso.
+        """
+        self._local.put_nowait((job_id, file_bytes, asyncio.ensure_future(persisted)))
+        self.notify()
+
+    async def run_pending(self) -> int:
+        """Processa jobs até a fila esvaziar. Retorna quantos foram executados."""
+        executados = 0
+        while await self._run_next():
+            executados += 1
+        return executados
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                ran = await self._run_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'Erro no worker de ingestão: {e}')
+                ran = False
+
+            if not ran:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _run_next(self) -> bool:
+        """
+        Executa um job. False se não havia job ou se o pool de parsing está
+        cheio: nos dois casos _loop espera poll_interval (ou um notify)
+        antes de tentar de novo.
+        """
+        if parser_pool_full():
+            return False
+
+        while not self._local.empty():
+            local = self._local.get_nowait()
+            job_id, file_bytes, persisted = local
+            async with acquire_connection() as conn:
+                job = await claim_job(conn, job_id, self.lease_seconds)
+
+            # Outro processo pode ter pego o job depois do upload
+            if job is not None:
+                if await self._run(job, file_bytes, persisted):
+                    return True
+                # Os bytes continuam em memória: o job volta para a fila local
+                self._local.put_nowait(local)
+                return False
+
+        async with acquire_connection() as conn:
+            job = await claim_next_job(conn, self.lease_seconds, self.max_attempts)
+
+        if job is None:
+            return False
+
+        return await self._run(job)
+
+    async def _release(self, job: Record, persisted: Optional[asyncio.Future]) -> None:
+        uploading = persisted is not None and not persisted.done()
+        async with acquire_connection() as conn:
+            await requeue_job(conn, job['id'], job['lease_id'], uploading, self.lease_seconds)
+
+    async def _heartbeat(self, job: Record) -> None:
+        """Renova o lease do job em execução até ser cancelado."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / INGESTION_HEARTBEATS_PER_LEASE)
+            try:
+                async with acquire_connection() as conn:
+                    renewed = await renew_lease(conn, job['id'], job['lease_id'], self.lease_seconds)
+            except Exception as e:
+                print(f'Erro ao renovar o lease do job {job["id"]}: {e}')
+                continue
+            if not renewed:
+                print(f'Job {job["id"]}: lease perdido, o resultado desta execução será descartado')
+                return
+
+    async def _run(
+        self,
+        job: Record,
+        file_bytes: Optional[bytes] = None,
+        persisted: Optional[asyncio.Future] = None,
+    ) -> bool:
+        """
+        Executa o job reservado. False se o pool de parsing estava cheio e o
+        job foi devolvido sem rodar.
+        """
+        etapas = {}
+        heartbeat = asyncio.create_task(self._heartbeat(job), name=f'ingestion-heartbeat-{job["id"]}')
+        try:
+            if file_bytes is None:
+                inicio = time.perf_counter()
+                file_bytes = await asyncio.to_thread(self.fetch_blob, job['blob_name'])
+                etapas['download'] = round(time.perf_counter() - inicio, 3)
+
+            result = await self.etl(
+                company_id=job['empresa_id'],
+                user_id=job['id_usuario'],
+                data_hora_enviar=job['data_hora_enviar'],
+                data_hora_upload=job['data_hora_upload'],
+                filename=job['nome_arquivo'],
+                file_bytes=file_bytes,
+                persisted=persisted,
+            )
+            result['etapas'] = {**etapas, **result.get('etapas', {})}
+
+            async with acquire_connection() as conn:
+                if not await finish_job(conn, job['id'], job['lease_id'], result):
+                    print(f'Job {job["id"]}: lease perdido, resultado descartado')
+            return True
+
+        except asyncio.CancelledError:
+            # Processo encerrando: devolve o job para a fila em vez de
+            # esperar o lease expirar.
+            await asyncio.shield(self._release(job, persisted))
+            raise
+
+        except ParserPoolFull:
+            # Fila de parsing cheia: o job é devolvido e tentado de novo
+            # depois de poll_interval
+            await self._release(job, persisted)
+            return False
+
+        except Exception as e:
+            traceback.print_exc()
+            async with acquire_connection() as conn:
+                if not await fail_job(conn, job['id'], str(e), etapas, job['lease_id']):
+                    # Outra execução tem o job agora e usa o mesmo blob
+                    print(f'Job {job["id"]}: lease perdido, erro descartado')
+                    return True
+            try:
+                await asyncio.to_thread(self.delete_blob, job['blob_name'])
+            except Exception as delete_error:
+                print(f'Erro ao remover o blob {job["blob_name"]}: {delete_error}')
+            return True
+
+        finally:
+            heartbeat.cancel()
+
+
+_worker: Optional[IngestionWorker] = None
+
+
+async def start_ingestion_worker(**kwargs) -> IngestionWorker:
+    global _worker
+
+    if _worker is None:
+        _worker = IngestionWorker(**kwargs)
+        await _worker.start()
+
+    return _worker
+
+
+async def stop_ingestion_worker() -> None:
+    global _worker
+
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
+
+
+def submit_ingestion_job(job_id: uuid.UUID, file_bytes: bytes, persisted: Awaitable) -> None:
+    if _worker is not None:
+        _worker.submit(job_id, file_bytes, persisted)
@@ -0,0 +1,148 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ETL_WORKERS = int(os.getenv('ETL_WORKERS', '2'))
+ETL_MAX_QUEUED_JOBS = int(os.getenv('ETL_MAX_QUEUED_JOBS', '8'))
+# Lotes já prontos que um worker pode deixar esperando na fila de um stream
+ETL_STREAM_BUFFER = int(os.getenv('ETL_STREAM_BUFFER', '2'))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_manager: Optional[SyncManager] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+class ParserPoolFull(Exception):
+    """Todos os workers estão ocupados e a fila de parsing está cheia."""
+
+
+def _warm_worker() -> None:
+    # Importa as bibliotecas pesadas uma vez por processo, no startup,
+    # para que o primeiro upload não pague esse custo.
+    import pandas  # noqa: F401
+    import pdfplumber  # noqa: F401
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _put(saida, parar, item) -> bool:
+    """Coloca item na fila, desistindo se o consumidor mandar parar."""
+    while not parar.is_set():
+        try:
+            saida.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stream_worker(func: Callable[..., Iterator], saida, parar, *args) -> None:
+    # Roda no processo do pool: cada item do gerador vai para a fila assim que
+    # fica pronto; None marca o fim (também em caso de erro, que chega ao
+    # consumidor pelo resultado da tarefa).
+    try:
+        for item in func(*args):
+            if not _put(saida, parar, item):
+                return
+    finally:
+        _put(saida, parar, None)
+
+
+def _get(saida, tarefa: Future):
+    while True:
+        try:
+            return saida.get(timeout=0.5)
+        except queue.Empty:
+            # Processo do pool morreu sem colocar o fim na fila
+            if tarefa.done():
+                return None
+
+
+async def init_parser_pool() -> ProcessPoolExecutor:
+    global _executor, _manager, _slots
+
+    if _executor is None:
+        context = multiprocessing.get_context('spawn')
+        _executor = ProcessPoolExecutor(
+            max_workers=ETL_WORKERS,
+            mp_context=context,
+            initializer=_warm_worker,
+        )
+        # Dono das filas de stream_in_parser_pool, que passam entre processos
+        _manager = SyncManager(ctx=context)
+        _manager.start()
+        _slots = asyncio.Semaphore(ETL_WORKERS + ETL_MAX_QUEUED_JOBS)
+
+        # O ProcessPoolExecutor sobe os processos sob demanda; uma tarefa por
+        # worker força todos a subirem (e importarem pdfplumber/pandas) agora.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(_executor, _worker_pid)
+            for _ in range(ETL_WORKERS)
+        ))
+        print(f'Pool de parsing criado ({ETL_WORKERS} processos)')
+
+    return _executor
+
+
+async def shutdown_parser_pool() -> None:
+    global _executor, _manager, _slots
+
+    if _executor is not None:
+        executor, manager = _executor, _manager
+        _executor = None
+        _manager = None
+        _slots = None
+        # Esperar os processos terminarem bloqueia: fica numa thread, para o
+        # event loop seguir atendendo o resto do shutdown
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+        await asyncio.to_thread(manager.shutdown)
+        print('Pool de parsing encerrado.')
+
+
+def parser_pool_full() -> bool:
+    """True se um novo job agora levaria ParserPoolFull."""
+    return _slots is not None and _slots.locked()
+
+
+async def stream_in_parser_pool(func: Callable[..., Iterator], *args) -> AsyncIterator:
+    """
+    Executa o gerador func(*args) em um processo do pool e entrega seus
+    itens à medida que ficam prontos. O job ocupa uma vaga do pool do
+    primeiro ao último item, então não pode receber ParserPoolFull no meio.
+
+    O worker fica no máximo ETL_STREAM_BUFFER itens à frente do consumidor;
+    se o consumidor sair antes do fim, o worker para no próximo item. Use com
+    contextlib.aclosing para que isso aconteça também em caso de erro.
+    """
+    if _executor is None:
+        raise RuntimeError('Pool de parsing não inicializado. Chame init_parser_pool() no startup.')
+
+    if _slots.locked():
+        raise ParserPoolFull('Fila de processamento de PDFs cheia, tente novamente mais tarde')
+
+    async with _slots:
+        saida = _manager.Queue(maxsize=ETL_STREAM_BUFFER)
+        parar = _manager.Event()
+        tarefa = _executor.submit(_stream_worker, func, saida, parar, *args)
+        try:
+            while True:
+                item = await asyncio.to_thread(_get, saida, tarefa)
+                if item is None:
+                    break
+                yield item
+            # Repassa o erro do worker, se houve
+            await asyncio.wrap_future(tarefa)
+        finally:
+            parar.set()
+            await asyncio.gather(asyncio.wrap_future(tarefa), return_exceptions=True)
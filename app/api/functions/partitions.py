@@ -0,0 +1,212 @@
+"""
+Particionamento mensal de lembrete_sertaozinho e cross_agendamentos por
+data_agenda (funções SQL da migration 0007).
+
+A conversão reescreve a tabela com ACCESS EXCLUSIVE e é feita à mão, fora do
+horário de uso. Depois dela, a API cria as partições dos próximos meses e,
+com PARTITION_RETENTION_MONTHS > 0, arquiva as antigas (ver
+start_partition_maintenance).
+
+    python -m app.api.functions.partitions --status
+    python -m app.api.functions.partitions --converter [--tabela cross_agendamentos]
+    python -m app.api.functions.partitions --manter
+    python -m app.api.functions.partitions --arquivar --retencao-meses 24
+"""
+import argparse
+import asyncio
+import os
+from datetime import date
+from typing import Dict, List, Optional
+
+from asyncpg import Connection
+from dotenv import load_dotenv
+
+from ...db import acquire_connection
+from .events import notify_report_change
+from .report_cache import report_cache
+
+load_dotenv()
+
+PARTITIONED_TABLES = ('lembrete_sertaozinho', 'cross_agendamentos')
+
+# Partições criadas à frente do mês corrente
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+# Meses mantidos nas tabelas; 0 desliga o arquivamento automático
+PARTITION_RETENTION_MONTHS = int(os.getenv('PARTITION_RETENTION_MONTHS', '0'))
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600'))
+
+# Evita que dois processos da API façam a manutenção ao mesmo tempo
+PARTITION_LOCK_KEY = 7_212_024
+
+
+def add_months(day: date, months: int) -> date:
+    total = day.year * 12 + day.month - 1 + months
+    return date(total // 12, total % 12 + 1, 1)
+
+
+async def is_partitioned(conn: Connection, table: str) -> bool:
+    return await conn.fetchval(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass($1)", table
+    ) or False
+
+
+async def convert_table(conn: Connection, table: str, months_ahead: int = PARTITION_MONTHS_AHEAD) -> bool:
+    """Converte a tabela em particionada. False se ela já era."""
+    async with conn.transaction():
+        await conn.execute('SET LOCAL statement_timeout = 0')
+        return await conn.fetchval('SELECT particionar_por_mes($1, $2)', table, months_ahead)
+
+
+async def create_future_partitions(
+    conn: Connection,
+    table: str,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    today: Optional[date] = None,
+) -> List[str]:
+    today = today or date.today()
+    async with conn.transaction():
+        return await conn.fetchval(
+            'SELECT coalesce(array_agg(p), ARRAY[]::text[]) FROM particoes_mensais_criar($1, $2, $3) p',
+            table,
+            today.replace(day=1),
+            add_months(today, months_ahead),
+        )
+
+
+async def archive_partitions(
+    conn: Connection,
+    table: str,
+    retention_months: int,
+    today: Optional[date] = None,
+) -> List[str]:
+    """
+    Arquiva as partições anteriores aos últimos retention_months meses
+    (contando o corrente). Em cross_agendamentos, as contagens desses meses
+    saem também de cross_report_mensal, para o /report continuar batendo
+    com as linhas.
+    """
+    corte = add_months(today or date.today(), -(retention_months - 1))
+    async with conn.transaction():
+        arquivadas = await conn.fetchval(
+            'SELECT coalesce(array_agg(p), ARRAY[]::text[]) FROM particoes_mensais_arquivar($1, $2) p',
+            table,
+            corte,
+        )
+        if arquivadas and table == 'cross_agendamentos':
+            meses = [date(int(nome[-6:-2]), int(nome[-2:]), 1) for nome in arquivadas]
+            await conn.execute('DELETE FROM cross_report_mensal WHERE mes = ANY($1::date[])', meses)
+            # Desanexar não dispara os triggers: avisa os outros processos
+            await notify_report_change(conn)
+
+    if arquivadas:
+        report_cache.invalidate(None, None)
+    return arquivadas
+
+
+async def maintain_partitions(
+    conn: Connection,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    retention_months: int = PARTITION_RETENTION_MONTHS,
+) -> Dict[str, Dict[str, List[str]]]:
+    """Partições futuras e arquivamento das tabelas já particionadas."""
+    resultado = {}
+    for table in PARTITIONED_TABLES:
+        if not await is_partitioned(conn, table):
+            continue
+        resultado[table] = {'criadas': await create_future_partitions(conn, table, months_ahead)}
+        if retention_months > 0:
+            resultado[table]['arquivadas'] = await archive_partitions(conn, table, retention_months)
+    return resultado
+
+
+async def partition_status(conn: Connection, table: str):
+    return await conn.fetch(
+        """
+        SELECT c.relname AS particao,
+               pg_get_expr(c.relpartbound, c.oid) AS limites,
+               c.reltuples::bigint AS linhas_estimadas
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass($1)
+        ORDER BY c.relname
+        """,
+        table,
+    )
+
+
+async def _maintenance_loop(interval: float) -> None:
+    while True:
+        try:
+            async with acquire_connection() as conn:
+                if await conn.fetchval('SELECT pg_try_advisory_lock($1)', PARTITION_LOCK_KEY):
+                    try:
+                        for table, feitas in (await maintain_partitions(conn)).items():
+                            for acao, particoes in feitas.items():
+                                if particoes:
+                                    print(f'Partições {acao} em {table}: {", ".join(particoes)}')
+                    finally:
+                        await conn.execute('SELECT pg_advisory_unlock($1)', PARTITION_LOCK_KEY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f'Erro na manutenção das partições: {e}')
+        await asyncio.sleep(interval)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def start_partition_maintenance(interval: float = PARTITION_MAINTENANCE_INTERVAL) -> None:
+    global _task
+
+    if _task is None:
+        _task = asyncio.create_task(_maintenance_loop(interval), name='partition-maintenance')
+
+
+async def stop_partition_maintenance() -> None:
+    global _task
+
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+async def _main(args) -> None:
+    from ...db import close_db_connection, get_db_connection
+
+    tables = [args.tabela] if args.tabela else list(PARTITIONED_TABLES)
+
+    conn = await get_db_connection()
+    try:
+        for table in tables:
+            if args.converter:
+                convertida = await convert_table(conn, table, args.meses_futuros)
+                print(f'{table}: {"convertida" if convertida else "já era particionada"}')
+            if args.manter or args.converter:
+                criadas = await create_future_partitions(conn, table, args.meses_futuros)
+                print(f'{table}: {len(criadas)} partições criadas {criadas}')
+            if args.arquivar:
+                arquivadas = await archive_partitions(conn, table, args.retencao_meses)
+                print(f'{table}: {len(arquivadas)} partições arquivadas {arquivadas}')
+            if args.status:
+                for row in await partition_status(conn, table):
+                    print(f'{row["particao"]:40} {row["limites"]:60} ~{row["linhas_estimadas"]}')
+    finally:
+        await close_db_connection(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Particionamento mensal por data_agenda')
+    acao = parser.add_mutually_exclusive_group(required=True)
+    acao.add_argument('--converter', action='store_true', help='Converte as tabelas em particionadas')
+    acao.add_argument('--manter', action='store_true', help='Cria as partições dos próximos meses')
+    acao.add_argument('--arquivar', action='store_true', help='Arquiva partições fora da retenção')
+    acao.add_argument('--status', action='store_true', help='Lista as partições')
+    parser.add_argument('--tabela', choices=PARTITIONED_TABLES)
+    parser.add_argument('--meses-futuros', type=int, default=PARTITION_MONTHS_AHEAD)
+    parser.add_argument('--retencao-meses', type=int, default=PARTITION_RETENTION_MONTHS)
+    args = parser.parse_args()
+    if args.arquivar and args.retencao_meses < 1:
+        parser.error('--arquivar precisa de --retencao-meses >= 1')
+    asyncio.run(_main(args))
@@ -0,0 +1,199 @@
+import asyncio
+import os
+from datetime import date
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache dos corpos de /report e /report/details (TTL 0 desliga o cache)
+REPORT_CACHE_TTL = float(os.getenv('REPORT_CACHE_TTL', '60'))
+REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Respostas maiores que isso são entregues, mas não guardadas
+REPORT_CACHE_MAX_ITEM_BYTES = int(os.getenv('REPORT_CACHE_MAX_ITEM_BYTES', str(8 * 1024 * 1024)))
+
+Period = Tuple[date, date]
+
+
+class _InFlight:
+    def __init__(self, period: Period):
+        self.period = period
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Marcado quando uma escrita no período chega durante a consulta:
+        # o resultado ainda é entregue, mas não vai para o cache
+        self.stale = False
+
+
+class ReportCache:
+    """
+    Cache em memória dos relatórios, com TTL e descarte LRU limitado pelo
+    total de bytes guardados.
+
+    As chaves começam pelo período (dt_start, dt_end) consultado, para que
+    invalidate() remova só os relatórios cujo período cruza o das linhas
+    alteradas. Requests idênticos que chegam enquanto a consulta ainda está
+    rodando esperam por ela, em vez de repetir a consulta.
+
+    O cache é por processo. As escritas em cross_agendamentos, de qualquer
+    origem, chegam pelo NOTIFY dos triggers da migration 0008 (ver
+    events.EventBroker); com EVENTS_ENABLED=false, só o TTL vale.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, max_item_bytes: int):
+        self.max_item_bytes = max_item_bytes
+        self._cache = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=len) if ttl > 0 else None
+        self._inflight: Dict[Hashable, _InFlight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache is not None
+
+    def _get(self, key) -> Optional[bytes]:
+        if self._cache is None:
+            return None
+        body = self._cache.get(key)
+        if body is not None:
+            self.hits += 1
+        return body
+
+    def _store(self, key, entry: _InFlight, body: Optional[bytes]) -> None:
+        if self._cache is None or body is None or entry.stale:
+            return
+        if len(body) <= min(self.max_item_bytes, self._cache.maxsize):
+            self._cache[key] = body
+
+    def _begin(self, key, period: Period) -> _InFlight:
+        self.misses += 1
+        entry = self._inflight[key] = _InFlight(period)
+        return entry
+
+    def _finish(self, key, entry: _InFlight, body: Optional[bytes], error: Optional[BaseException]) -> None:
+        self._inflight.pop(key, None)
+        if error is None:
+            self._store(key, entry, body)
+            entry.future.set_result(body)
+        else:
+            if not isinstance(error, Exception):
+                # Cancelamento ou desconexão do cliente de quem fazia a consulta
+                error = RuntimeError('Consulta do relatório interrompida')
+            entry.future.set_exception(error)
+            # Evita o aviso de exceção não lida quando ninguém estava esperando
+            entry.future.exception()
+
+    async def get_or_compute(self, key: Hashable, period: Period, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        key = (period, key)
+        body = self._get(key)
+        if body is not None:
+            return body
+
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.coalesced += 1
+            return await asyncio.shield(entry.future)
+
+        entry = self._begin(key, period)
+        try:
+            body = await compute()
+        except BaseException as e:
+            self._finish(key, entry, None, e)
+            raise
+        self._finish(key, entry, body, None)
+        return body
+
+    async def stream(
+        self,
+        key: Hashable,
+        period: Period,
+        chunks: Callable[[], AsyncIterator[str]],
+    ) -> AsyncIterator[bytes]:
+        """
+        Como get_or_compute, para respostas em streaming: numa falta os pedaços
+        vão para o cliente à medida que chegam e o corpo completo é guardado
+        no final.
+        """
+        key = (period, key)
+        body = self._get(key)
+        if body is not None:
+            yield body
+            return
+
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.coalesced += 1
+            try:
+                body = await asyncio.shield(entry.future)
+            except Exception:
+                body = None
+            if body is not None:
+                yield body
+                return
+            # A consulta original falhou ou foi interrompida: faz a própria, sem cache
+            async for chunk in chunks():
+                yield chunk.encode()
+            return
+
+        entry = self._begin(key, period)
+        parts, size = [], 0
+        try:
+            async for chunk in chunks():
+                data = chunk.encode()
+                if parts is not None:
+                    parts.append(data)
+                    size += len(data)
+                    if size > self.max_item_bytes:
+                        # Grande demais para o cache: quem espera faz a própria consulta
+                        parts = None
+                yield data
+        except BaseException as e:
+            self._finish(key, entry, None, e)
+            raise
+        self._finish(key, entry, b''.join(parts) if parts is not None else None, None)
+
+    def invalidate(self, start: Optional[date], end: Optional[date]) -> int:
+        """
+        Remove os relatórios cujo período cruza [start, end]. Sem datas
+        (None), limpa tudo.
+        """
+        self.invalidations += 1
+
+        def overlaps(period: Period) -> bool:
+            if start is None or end is None:
+                return True
+            return period[0] <= end and start <= period[1]
+
+        for entry in self._inflight.values():
+            if overlaps(entry.period):
+                entry.stale = True
+
+        if self._cache is None:
+            return 0
+        keys = [key for key in list(self._cache.keys()) if overlaps(key[0])]
+        for key in keys:
+            self._cache.pop(key, None)
+        return len(keys)
+
+    def clear(self) -> None:
+        if self._cache is not None:
+            self._cache.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'invalidations': self.invalidations,
+            'entries': len(self._cache) if self._cache is not None else 0,
+            'bytes': int(self._cache.currsize) if self._cache is not None else 0,
+            'max_bytes': int(self._cache.maxsize) if self._cache is not None else 0,
+            'in_flight': len(self._inflight),
+        }
+
+
+report_cache = ReportCache(REPORT_CACHE_TTL, REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_ITEM_BYTES)
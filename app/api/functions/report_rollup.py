@@ -0,0 +1,128 @@
+"""
+Leitura do /report a partir de cross_report_mensal (migration 0005).
+
+Meses inteiramente dentro do período vêm da tabela de contagens; só os
+trechos de mês nas pontas do período (por exemplo, o mês corrente até hoje)
+são contados nas linhas de cross_agendamentos.
+
+Reconstrução manual das contagens (todas ou de um intervalo de meses):
+
+    python -m app.api.functions.report_rollup --rebuild
+    python -m app.api.functions.report_rollup --rebuild --inicio 2025-01-01 --fim 2025-03-31
+"""
+import argparse
+import asyncio
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from asyncpg import Connection, Record
+
+DateRange = Tuple[Optional[date], Optional[date]]
+
+REPORT_QUERY = """
+    WITH parcial AS (
+        SELECT
+            solicitante,
+            date_trunc('month', data_agenda)::date AS mes,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE resposta = 'CONFIRMO')            AS confirmado,
+            COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO')       AS nao_confirmado,
+            COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO')        AS nao_conheco,
+            COUNT(*) FILTER (
+                WHERE resposta IS NULL OR TRIM(resposta) = ''
+            ) AS nao_respondido
+        FROM cross_agendamentos
+        WHERE (data_agenda BETWEEN $1 AND $2 OR data_agenda BETWEEN $3 AND $4)
+          AND solicitante IS NOT NULL
+          AND solicitante <> ''
+        GROUP BY 1, 2
+    ),
+    completo AS (
+        SELECT solicitante, mes, total, confirmado, nao_confirmado, nao_conheco, nao_respondido
+        FROM cross_report_mensal
+        WHERE mes BETWEEN $5 AND $6
+          AND total > 0
+    )
+    SELECT
+        solicitante,
+        mes AS periodo_ordem,
+        TO_CHAR(mes, 'MM-YYYY') AS periodo,
+        SUM(confirmado)::bigint     AS confirmado,
+        SUM(nao_confirmado)::bigint AS nao_confirmado,
+        SUM(nao_conheco)::bigint    AS nao_conheco,
+        SUM(nao_respondido)::bigint AS nao_respondido
+    FROM (
+        SELECT * FROM parcial
+        UNION ALL
+        SELECT * FROM completo
+    ) contagens
+    GROUP BY solicitante, mes
+    ORDER BY solicitante, mes
+"""
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def split_period(dt_start: date, dt_end: date) -> Tuple[DateRange, DateRange, DateRange]:
+    """
+    Divide [dt_start, dt_end] em (ponta inicial, meses completos, ponta final).
+    Os meses completos vão de um primeiro dia de mês a outro; intervalos vazios
+    são (None, None), que não casam com nada no BETWEEN.
+    """
+    vazio = (None, None)
+    if dt_start > dt_end:
+        return vazio, vazio, vazio
+
+    primeiro_completo = dt_start if dt_start.day == 1 else _next_month(dt_start)
+    # Último dia do último mês completo
+    ultimo_dia = _next_month(dt_end) - timedelta(days=1)
+    fim_completo = dt_end if dt_end == ultimo_dia else _month_start(dt_end) - timedelta(days=1)
+
+    if primeiro_completo > fim_completo:
+        return (dt_start, dt_end), vazio, vazio
+
+    inicio = (dt_start, primeiro_completo - timedelta(days=1)) if dt_start < primeiro_completo else vazio
+    fim = (fim_completo + timedelta(days=1), dt_end) if fim_completo < dt_end else vazio
+    return inicio, (primeiro_completo, _month_start(fim_completo)), fim
+
+
+async def fetch_report_rows(conn: Connection, dt_start: date, dt_end: date) -> List[Record]:
+    """Mesmas colunas e ordem da consulta original do /report."""
+    inicio, meses, fim = split_period(dt_start, dt_end)
+    return await conn.fetch(REPORT_QUERY, *inicio, *fim, *meses)
+
+
+async def rebuild_report_rollup(
+    conn: Connection,
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+) -> int:
+    """Recalcula as contagens dos meses entre inicio e fim (None = todos)."""
+    async with conn.transaction():
+        return await conn.fetchval('SELECT cross_report_mensal_reconstruir($1, $2)', inicio, fim)
+
+
+async def _main(inicio: Optional[date], fim: Optional[date]) -> None:
+    from ...db import close_db_connection, get_db_connection
+
+    conn = await get_db_connection()
+    try:
+        linhas = await rebuild_report_rollup(conn, inicio, fim)
+        print(f'Contagens do relatório reconstruídas ({linhas} linhas)')
+    finally:
+        await close_db_connection(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconstrói cross_report_mensal')
+    parser.add_argument('--rebuild', action='store_true', required=True)
+    parser.add_argument('--inicio', type=date.fromisoformat, help='Primeiro mês (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=date.fromisoformat, help='Último mês (AAAA-MM-DD)')
+    args = parser.parse_args()
+    asyncio.run(_main(args.inicio, args.fim))
@@ -0,0 +1,30 @@
+from typing import Tuple
+
+# Campos de identificação: comparados por igualdade, para usar os índices btree
+EXACT_FIELDS = ('wa_message_id', 'telefone', 'resposta')
+
+SEARCH_MODES = ('contem', 'prefixo')
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def text_condition(field: str, value: str, mode: str, param_index: int) -> Tuple[str, str]:
+    """
+    Condição SQL e parâmetro para um filtro de texto de /schedule.
+
+    - campos de EXACT_FIELDS: igualdade;
+    - modo 'prefixo': lower(campo) LIKE 'valor%', atendido pelos índices
+      text_pattern_ops;
+    - modo 'contem' (padrão, comportamento original): ILIKE '%valor%',
+      atendido pelos índices de trigramas quando o pg_trgm está instalado.
+
+    Os índices estão em migrations/sql/0003_indices_busca.sql e, os de
+    trigramas, em 0011_indices_trigramas.sql.
+    """
+    if field in EXACT_FIELDS:
+        return f'{field} = ${param_index}', value
+    if mode == 'prefixo':
+        return f'lower({field}) LIKE ${param_index}', escape_like(value.lower()) + '%'
+    return f'{field} ILIKE ${param_index}', f'%{escape_like(value)}%'
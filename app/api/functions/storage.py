@@ -0,0 +1,140 @@
+import asyncio
+import os
+import threading
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from google.cloud import storage
+
+load_dotenv()
+
+BUCKET_NAME = os.getenv('GCP_BUCKET_NAME', 'cross-mi4u')
+CREDENTIALS_PATH = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'mi4u-303100-66ee217229dd.json')
+
+# Cache das páginas de listagem do bucket (TTL 0 desliga o cache)
+LIST_CACHE_TTL = float(os.getenv('STORAGE_LIST_CACHE_TTL', '30'))
+LIST_CACHE_SIZE = int(os.getenv('STORAGE_LIST_CACHE_SIZE', '256'))
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('STORAGE_DOWNLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+_list_cache = TTLCache(maxsize=LIST_CACHE_SIZE, ttl=LIST_CACHE_TTL) if LIST_CACHE_TTL > 0 else None
+_list_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def get_storage_client() -> storage.Client:
+    """
+    Um client por processo: as credenciais são lidas uma vez e a sessão HTTP
+    (e seu pool de conexões) é reaproveitada entre os requests.
+    """
+    if os.path.exists(CREDENTIALS_PATH):
+        return storage.Client.from_service_account_json(CREDENTIALS_PATH)
+    return storage.Client()
+
+
+@lru_cache(maxsize=1)
+def get_bucket() -> storage.Bucket:
+    # client.bucket() não faz request; client.get_bucket() faria um GET de
+    # metadados antes de cada operação.
+    return get_storage_client().bucket(BUCKET_NAME)
+
+
+def list_blobs_page(
+    prefix: Optional[str] = None,
+    page_token: Optional[str] = None,
+    page_size: int = 100,
+) -> Tuple[List[Tuple[str, int]], Optional[str]]:
+    """
+    Uma página da listagem do bucket: [(nome, tamanho)] e o token da próxima
+    página (None na última). Páginas recentes são servidas do cache, que é
+    invalidado a cada escrita ou remoção feita por este processo.
+    """
+    key = (prefix, page_token, page_size)
+
+    if _list_cache is not None:
+        with _list_cache_lock:
+            cached = _list_cache.get(key)
+        if cached is not None:
+            return cached
+
+    iterator = get_bucket().list_blobs(
+        prefix=prefix,
+        page_token=page_token,
+        max_results=page_size,
+        fields='items(name,size),nextPageToken',
+    )
+    page = next(iterator.pages, None)
+    files = [(blob.name, blob.size) for blob in page] if page is not None else []
+    result = (files, iterator.next_page_token)
+
+    if _list_cache is not None:
+        with _list_cache_lock:
+            _list_cache[key] = result
+
+    return result
+
+
+def list_all_blobs(prefix: Optional[str] = None, page_size: int = 1000) -> List[Tuple[str, int]]:
+    """Listagem completa, página a página (pelo cache de list_blobs_page)."""
+    files, page_token = list_blobs_page(prefix, None, page_size)
+    while page_token is not None:
+        page, page_token = list_blobs_page(prefix, page_token, page_size)
+        files.extend(page)
+    return files
+
+
+def invalidate_list_cache() -> None:
+    if _list_cache is not None:
+        with _list_cache_lock:
+            _list_cache.clear()
+
+
+def upload_blob_bytes(blob_name: str, data: bytes, content_type: str) -> None:
+    try:
+        get_bucket().blob(blob_name).upload_from_string(data, content_type=content_type)
+    finally:
+        invalidate_list_cache()
+
+
+def get_blob(blob_name: str) -> Optional[storage.Blob]:
+    """Metadados do blob (um GET), ou None se ele não existir."""
+    return get_bucket().get_blob(blob_name)
+
+
+def download_blob_bytes(blob_name: str) -> bytes:
+    return get_bucket().blob(blob_name).download_as_bytes()
+
+
+async def stream_blob(
+    blob: storage.Blob,
+    start: int,
+    end: int,
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Baixa os bytes [start, end] do blob em pedaços de chunk_size, entregando
+    cada pedaço assim que chega. A memória usada é de um pedaço por download,
+    independente do tamanho do arquivo.
+
+    O blob deve vir de get_blob() (com generation preenchida), para que todos
+    os pedaços sejam lidos da mesma versão do objeto.
+    """
+    chunk_size = chunk_size or DOWNLOAD_CHUNK_SIZE
+    versioned = get_bucket().blob(blob.name, generation=blob.generation)
+
+    for offset in range(start, end + 1, chunk_size):
+        yield await asyncio.to_thread(
+            versioned.download_as_bytes,
+            start=offset,
+            end=min(offset + chunk_size - 1, end),
+            checksum=None,
+        )
+
+
+def delete_blob(blob_name: str) -> None:
+    try:
+        get_bucket().blob(blob_name).delete()
+    finally:
+        invalidate_list_cache()
@@ -1,8 +1,18 @@
+import base64
+import json
 import os
+from datetime import date, time
+from decimal import Decimal
 from functools import wraps
+from typing import AsyncIterator
+from uuid import UUID
 
+import jwt
+from asyncpg import Connection
 from dotenv import load_dotenv
-from fastapi import HTTPException
+from fastapi import HTTPException, Query, status
+
+from ...db import acquire_read_connection
 
 load_dotenv()
 
@@ -28,3 +38,79 @@ def require_valid_token(func):
         return await func(*args, **kwargs)
 
     return wrapper
+
+
+def company_id_from_token(mi4u_access_token: str) -> int:
+    """company_id do token mi4u (a assinatura não é verificada aqui)."""
+    try:
+        decoded_token = jwt.decode(
+            mi4u_access_token,
+            options={'verify_signature': False}
+        )
+        return decoded_token['sub']['company_id']
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Invalid mi4u_access_token. {e}'
+        )
+
+
+def user_id_from_token(mi4u_access_token: str) -> int:
+    """user_id do token mi4u (a assinatura não é verificada aqui)."""
+    try:
+        decoded_token = jwt.decode(
+            mi4u_access_token,
+            options={'verify_signature': False}
+        )
+        return decoded_token['sub']['user_id']
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Invalid mi4u_access_token. {e}'
+        )
+
+
+async def get_read_db(mi4u_access_token: str = Query(None)) -> AsyncIterator[Connection]:
+    """
+    Dependência do FastAPI para endpoints de leitura: conexão da réplica,
+    se disponível, considerando as escritas recentes da empresa do token.
+    Token inválido não é erro aqui; o endpoint o valida.
+    """
+    try:
+        company_id = company_id_from_token(mi4u_access_token)
+    except HTTPException:
+        company_id = None
+
+    async with acquire_read_connection(company_id) as conn:
+        yield conn
+
+
+def json_default(value):
+    """
+    `default` para json.dumps nas respostas em streaming, com a mesma saída
+    do encoder do FastAPI para os tipos que vêm do banco.
+    """
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f'Tipo não serializável: {type(value).__name__}')
+
+
+def encode_cursor(payload: dict) -> str:
+    """Cursor opaco de paginação (JSON em base64 url-safe)."""
+    data = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, key: str, type_=int):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return type_(json.loads(base64.urlsafe_b64decode(padded))[key])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Cursor inválido'
+        )
@@ -0,0 +1,93 @@
+"""
+Fixtures compartilhadas pelos testes. Todos usam o banco do .env, com as
+migrations aplicadas, e removem no fim as linhas que criam (empresa_id
+negativo ou nome_arquivo próprio de cada teste).
+"""
+import asyncio
+
+import pytest
+from dotenv import load_dotenv
+from fastapi.testclient import TestClient
+
+from ...db import acquire_connection, close_db_connection, close_db_pool, get_db_connection, init_db_pool
+from ...main import app
+from ...migrations import run_migrations
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+
+
+@pytest.fixture(scope='session')
+def run_with_conn():
+    """run_with_conn(coro_fn): executa coro_fn(conn) numa conexão avulsa."""
+    def run(coro_fn):
+        async def runner():
+            conn = await get_db_connection()
+            try:
+                await run_migrations(conn)
+                return await coro_fn(conn)
+            finally:
+                await close_db_connection(conn)
+
+        return asyncio.run(runner())
+
+    return run
+
+
+@pytest.fixture(scope='session')
+def run_with_pool():
+    """
+    run_with_pool(coro_fn): executa coro_fn() com o pool de conexões da API
+    criado (acquire_connection funciona como nos endpoints) e o fecha no fim.
+    """
+    def run(coro_fn):
+        async def runner():
+            await init_db_pool()
+            try:
+                async with acquire_connection() as conn:
+                    await run_migrations(conn)
+                return await coro_fn()
+            finally:
+                await close_db_pool()
+
+        return asyncio.run(runner())
+
+    return run
+
+
+@pytest.fixture(scope='session')
+def run_sql(run_with_conn):
+    """run_sql(query, *args): executa a query e devolve as linhas."""
+    def run(query, *args):
+        async def fetch(conn):
+            return await conn.fetch(query, *args)
+
+        return run_with_conn(fetch)
+
+    return run
+
+
+@pytest.fixture(scope='module')
+def client(run_with_conn):
+    # O startup não aplica as migrations (DB_RUN_MIGRATIONS desligado)
+    run_with_conn(run_migrations)
+    # O context manager dispara o lifespan, que cria o pool de conexões
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def agenda_teste(run_sql):
+    """Sete lembretes de EMPRESA_TESTE em 10/03/2025, removidos no fim."""
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
+    run_sql(
+        """
+        INSERT INTO lembrete_sertaozinho (empresa_id, paciente, codigo, data_agenda, horario, nome_arquivo)
+        SELECT $1, 'PACIENTE ' || i, i, DATE '2025-03-10', TIME '08:00' + i * interval '1 minute', 'teste-paginacao'
+        FROM generate_series(1, 7) AS i
+        """,
+        EMPRESA_TESTE,
+    )
+    yield
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+import pytest
+from dotenv import load_dotenv
+
+from ... import db
+from ...db import (
+    ReplicaRouter,
+    acquire_connection,
+    acquire_read_connection,
+    close_db_pool,
+    init_db_pool,
+    record_write,
+)
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+OUTRA_EMPRESA = -2
+
+
+def primary_as_replica(**kwargs):
+    """A própria instância de teste faz o papel de réplica (sem recovery)."""
+    return ReplicaRouter(
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DATABASE'),
+        port=os.getenv('DB_PORT'),
+        **kwargs,
+    )
+
+
+def run_with_replica(replica, coro_fn, monkeypatch):
+    async def runner():
+        await init_db_pool()
+        await replica.start()
+        monkeypatch.setattr(db, '_replica', replica)
+        try:
+            return await coro_fn()
+        finally:
+            monkeypatch.setattr(db, '_replica', None)
+            await replica.stop()
+            await close_db_pool()
+
+    return asyncio.run(runner())
+
+
+async def read_only_setting(company_id=None):
+    async with acquire_read_connection(company_id) as conn:
+        return await conn.fetchval('SHOW default_transaction_read_only')
+
+
+def test_reads_go_to_replica_and_stay_on_primary_after_write(monkeypatch):
+    replica = primary_as_replica(max_lag_seconds=0.1, check_interval=0.1)
+
+    async def scenario():
+        antes = await read_only_setting(EMPRESA_TESTE)
+        async with acquire_connection() as conn:
+            await record_write([EMPRESA_TESTE], conn)
+        depois = await read_only_setting(EMPRESA_TESTE)
+        outra = await read_only_setting(OUTRA_EMPRESA)
+        await asyncio.sleep(0.3)
+        expirado = await read_only_setting(EMPRESA_TESTE)
+        return antes, depois, outra, expirado
+
+    antes, depois, outra, expirado = run_with_replica(replica, scenario, monkeypatch)
+
+    assert replica.lag == 0
+    # Conexões da réplica são abertas com default_transaction_read_only
+    assert antes == 'on'
+    assert depois == 'off'
+    assert outra == 'on'
+    assert expirado == 'on'
+
+
+def test_record_write_uses_callers_connection(monkeypatch):
+    replica = primary_as_replica(max_lag_seconds=10, check_interval=60)
+
+    async def scenario():
+        # Pool inteiro ocupado: pedir outra conexão travaria até o timeout
+        segurando = [await db.get_db_pool().acquire() for _ in range(db.get_db_pool().get_max_size())]
+        conn = segurando[0]
+        try:
+            await asyncio.wait_for(record_write([EMPRESA_TESTE], conn), timeout=5)
+            async with conn.transaction():
+                with pytest.raises(RuntimeError):
+                    await record_write([OUTRA_EMPRESA], conn)
+        finally:
+            for held in segurando:
+                await db.get_db_pool().release(held)
+        return replica.usable(EMPRESA_TESTE), replica.usable(OUTRA_EMPRESA)
+
+    empresa, outra = run_with_replica(replica, scenario, monkeypatch)
+
+    # Escrita registrada: a empresa lê do primário; a escrita dentro da
+    # transação foi recusada e não conta
+    assert not empresa
+    assert outra
+
+
+def test_write_is_released_once_replica_replays_its_lsn():
+    replica = ReplicaRouter(max_lag_seconds=10, check_interval=60)
+    replica.healthy, replica.pool, replica.lag = True, object(), 0.5
+
+    replica.record_write(EMPRESA_TESTE, lsn=0x100)
+    replica.replay_lsn = 0xFF
+    assert not replica.usable(EMPRESA_TESTE)
+
+    replica.replay_lsn = 0x100
+    assert replica.usable(EMPRESA_TESTE)
+
+    replica.lag = 11
+    assert not replica.usable(EMPRESA_TESTE)
+
+
+def test_unreachable_replica_falls_back_to_primary(monkeypatch):
+    replica = ReplicaRouter(
+        host='/tmp/replica-inexistente',
+        port=os.getenv('DB_PORT'),
+        user=os.getenv('DB_USER'),
+        database=os.getenv('DATABASE'),
+        check_interval=60,
+    )
+
+    async def scenario():
+        return await read_only_setting()
+
+    setting = run_with_replica(replica, scenario, monkeypatch)
+
+    assert not replica.healthy
+    assert setting == 'off'
+
+
+def test_parse_lsn():
+    assert db._parse_lsn('0/0') == 0
+    assert db._parse_lsn('16/B374D848') == (0x16 << 32) | 0xB374D848
+    assert db._parse_lsn(None) is None
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from dotenv import load_dotenv
+
+from ...db import acquire_connection
+from ..functions.dispatch import claim_due_reminders, list_failed_reminders, mark_sent
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+
+
+@pytest.fixture(autouse=True)
+def lembretes_envio(run_sql):
+    """45 lembretes de EMPRESA_TESTE: 40 vencidos e 5 para amanhã."""
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
+    run_sql(
+        """
+        INSERT INTO lembrete_sertaozinho (empresa_id, paciente, codigo, data_hora_enviar, nome_arquivo)
+        SELECT $1, 'PACIENTE ' || i, i,
+               localtimestamp - interval '1 hour' + CASE WHEN i > 40 THEN interval '1 day' ELSE interval '0' END,
+               'teste-envio'
+        FROM generate_series(1, 45) AS i
+        """,
+        EMPRESA_TESTE,
+    )
+    yield
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
+
+
+async def claim(limit, lease_seconds=300):
+    async with acquire_connection() as conn:
+        return await claim_due_reminders(conn, EMPRESA_TESTE, limit, lease_seconds)
+
+
+def test_concurrent_claims_are_disjoint_and_skip_future_reminders(run_with_pool):
+    async def scenario():
+        lotes = await asyncio.gather(*[claim(7) for _ in range(8)])
+        return lotes, await claim(7)
+
+    lotes, depois = run_with_pool(scenario)
+
+    ids = [row['id'] for _, rows in lotes for row in rows]
+    assert len(ids) == len(set(ids)) == 40
+    assert depois[1] == []
+
+
+def test_sent_requires_current_claim_and_expired_lease_is_reclaimed(run_with_pool):
+    async def scenario():
+        primeiro, rows = await claim(2, lease_seconds=300)
+        async with acquire_connection() as conn:
+            # Simula o lease do primeiro worker expirado
+            await conn.execute(
+                "UPDATE lembrete_sertaozinho SET envio_lease_ate = now() - interval '1 second' WHERE envio_claim = $1",
+                primeiro,
+            )
+        segundo, retomados = await claim(2)
+
+        async with acquire_connection() as conn:
+            alvo = rows[0]['id']
+            recusado = await mark_sent(conn, EMPRESA_TESTE, alvo, primeiro, 'wamid.envio.1')
+            aceito = await mark_sent(conn, EMPRESA_TESTE, alvo, segundo, 'wamid.envio.1', 77)
+            repetido = await mark_sent(conn, EMPRESA_TESTE, alvo, segundo, 'wamid.envio.1')
+            inexistente = await mark_sent(conn, EMPRESA_TESTE, -1, segundo, 'wamid.envio.2')
+            tentativas = await conn.fetchval('SELECT envio_tentativas FROM lembrete_sertaozinho WHERE id = $1', alvo)
+
+        proximos = [row['id'] for row in (await claim(50))[1]]
+        return rows, retomados, (recusado, aceito, repetido, inexistente), tentativas, proximos
+
+    rows, retomados, motivos, tentativas, proximos = run_with_pool(scenario)
+
+    assert [row['id'] for row in retomados] == [row['id'] for row in rows]
+    assert motivos == ('claim_invalido', None, 'ja_enviado', 'nao_encontrado')
+    assert tentativas == 2
+    assert rows[0]['id'] not in proximos
+    assert rows[1]['id'] not in proximos
+
+
+def test_reminder_fails_after_max_attempts(run_with_pool):
+    async def expire(claim_id):
+        async with acquire_connection() as conn:
+            await conn.execute(
+                "UPDATE lembrete_sertaozinho SET envio_lease_ate = now() - interval '1 second' WHERE envio_claim = $1",
+                claim_id,
+            )
+
+    async def scenario():
+        reservas = []
+        for _ in range(3):
+            async with acquire_connection() as conn:
+                claim_id, rows = await claim_due_reminders(conn, EMPRESA_TESTE, 1, max_attempts=2)
+            reservas.append([row['id'] for row in rows])
+            await expire(claim_id)
+
+        async with acquire_connection() as conn:
+            falhos = await list_failed_reminders(conn, EMPRESA_TESTE, 10)
+        return reservas, falhos
+
+    reservas, falhos = run_with_pool(scenario)
+
+    # Duas reservas do mesmo lembrete; na terceira ele já foi dado como falho
+    assert reservas[0] == reservas[1]
+    assert reservas[2] != reservas[0]
+    assert [row['id'] for row in falhos] == reservas[0]
+    assert falhos[0]['envio_tentativas'] == 2
+    assert falhos[0]['envio_falhou_em'] is not None
@@ -0,0 +1,270 @@
+import asyncio
+import tempfile
+from contextlib import aclosing
+from datetime import date, datetime
+from io import BytesIO
+
+import pytest
+from dotenv import load_dotenv
+
+from ...db import acquire_connection
+from ..functions.etl_sertaozinho import (
+    etl_sertaozinho,
+    insert_data,
+    iter_pdf_pages,
+    parse_patients_rows,
+    parse_pdf,
+)
+from ..functions.parser_pool import init_parser_pool, shutdown_parser_pool, stream_in_parser_pool
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+
+HEADER = {
+    'unidade_saude': 'UBS CENTRO',
+    'profissional': 'JOAO DA SILVA',
+    'especialidade': 'CARDIOLOGIA',
+}
+
+
+def paciente(nome, cns, hora, telefone='16999990000'):
+    return {
+        'paciente': nome,
+        'cns': cns,
+        'telefone': telefone,
+        'data_hora_agendamento': datetime(2025, 3, 10, hora, 0),
+    }
+
+
+@pytest.fixture
+def agenda_limpa(run_sql):
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
+    yield
+    run_sql('DELETE FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE)
+
+
+async def upload(conn, pacientes, filename='agenda'):
+    return await insert_data(
+        conn,
+        company_id=EMPRESA_TESTE,
+        filename=filename,
+        user_id=1,
+        data_hora_enviar=datetime(2025, 3, 9, 8, 0),
+        data_hora_upload=datetime(2025, 3, 8, 10, 0),
+        header=HEADER,
+        pacientes=pacientes,
+    )
+
+
+def test_insert_data_reupload_does_not_duplicate(agenda_limpa, run_with_pool):
+    pacientes = [
+        paciente('Maria', '700000000000001', 8),
+        paciente('Jose', '700000000000002', 9),
+    ]
+
+    async def scenario():
+        async with acquire_connection() as conn:
+            primeiro = await upload(conn, pacientes)
+
+            # Paciente já respondeu antes da agenda corrigida ser reenviada
+            await conn.execute(
+                "UPDATE lembrete_sertaozinho SET resposta = 'CONFIRMO' WHERE empresa_id = $1 AND codigo = $2",
+                EMPRESA_TESTE, 700000000000001,
+            )
+
+            corrigida = pacientes + [paciente('Ana', '700000000000003', 10)]
+            corrigida[1] = paciente('Jose', '700000000000002', 9, telefone='16988887777')
+            segundo = await upload(conn, corrigida, filename='agenda-corrigida')
+
+            rows = await conn.fetch(
+                'SELECT codigo, telefone, resposta, nome_arquivo FROM lembrete_sertaozinho '
+                'WHERE empresa_id = $1 ORDER BY codigo',
+                EMPRESA_TESTE,
+            )
+            return primeiro, segundo, rows
+
+    primeiro, segundo, rows = run_with_pool(scenario)
+
+    assert primeiro == (2, 0)
+    assert segundo == (1, 2)
+    assert [r['codigo'] for r in rows] == [700000000000001, 700000000000002, 700000000000003]
+    assert rows[0]['resposta'] == 'CONFIRMO'
+    assert rows[1]['telefone'] == '16988887777'
+    assert {r['nome_arquivo'] for r in rows} == {'agenda-corrigida'}
+
+
+def test_insert_data_ignores_duplicated_rows_in_same_upload(agenda_limpa, run_with_pool):
+    async def scenario():
+        async with acquire_connection() as conn:
+            return await upload(conn, [
+                paciente('Maria', '700000000000001', 8),
+                paciente('Maria', '700000000000001', 8),
+            ])
+
+    assert run_with_pool(scenario) == (1, 0)
+
+
+def test_concurrent_uploads_of_same_agenda_do_not_duplicate(agenda_limpa, run_with_pool):
+    pacientes = [paciente(f'Paciente {i}', f'7000000000{i:05d}', 8 + i % 10) for i in range(200)]
+
+    async def scenario():
+        async with acquire_connection() as conn:
+            async with acquire_connection() as outra:
+                resultados = await asyncio.gather(
+                    upload(conn, pacientes, filename='agenda-a'),
+                    upload(outra, pacientes, filename='agenda-b'),
+                )
+            total = await conn.fetchval(
+                'SELECT count(*) FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE
+            )
+            return sorted(resultados), total
+
+    resultados, total = run_with_pool(scenario)
+
+    # Um merge insere; o outro espera a trava e só atualiza
+    assert resultados == [(0, 200), (200, 0)]
+    assert total == 200
+
+
+COLUNAS = [
+    'Prontuario', 'Nome Paciente', 'Idade', 'CNS', 'Tel.Cell',
+    'Data/Hora Agendamento', 'Data/Hora Recepção',
+    'Data/Hora Atendimento', 'Data/Hora Encerramento',
+    'Status', 'Assinatura',
+]
+
+
+def linha(nome, cns, telefone, atendimento, agendamento='01/03/2025 08:00'):
+    return ['1', nome, '40', cns, telefone, agendamento, '', atendimento, '', 'AGENDADO', '']
+
+
+def test_parse_patients_rows_normalizes_rows():
+    pacientes = parse_patients_rows([
+        COLUNAS,
+        linha('MARIA DA SILVA', '70000000 0000001', '16999990000', '10/03/2025 08:30'),
+        # Atendimento ilegível: data e hora vêm do resto da linha
+        linha('JOSE SOUZA', '70000000 0000002', '', '', agendamento='11/03/2025 09:15'),
+        # Sem CNS reconhecível: descartado
+        linha('SEM CNS', '123', '16999990000', '10/03/2025 08:30'),
+        # Sem nome: descartado
+        linha('', '70000000 0000003', '16999990000', '10/03/2025 08:30'),
+    ])
+
+    assert pacientes == [
+        {
+            'paciente': 'Maria Da Silva',
+            'cns': '700000000000001',
+            'telefone': '16999990000',
+            'data_hora_agendamento': datetime(2025, 3, 10, 8, 30),
+            'classificacao': 'CONSULTA',
+            'status': 'AGENDADO',
+        },
+        {
+            'paciente': 'Jose Souza',
+            'cns': '700000000000002',
+            'telefone': None,
+            'data_hora_agendamento': datetime(2025, 3, 11, 9, 15),
+            'classificacao': 'CONSULTA',
+            'status': 'AGENDADO',
+        },
+    ]
+
+
+def test_parse_patients_rows_without_expected_columns():
+    assert parse_patients_rows([]) == []
+    assert parse_patients_rows([['MARIA', '70000000 0000001', '10/03/2025 08:30']]) == []
+
+
+def test_parse_pdf_synthetic_agenda():
+    pytest.importorskip('reportlab')
+    from benchmarks.agenda_pdf import generate_agenda_pdf
+
+    header, pacientes = parse_pdf(BytesIO(generate_agenda_pdf(pages=3, rows_per_page=20)))
+
+    assert header == {
+        'unidade_saude': 'UBS CENTRO SERTAOZINHO',
+        'data_atendimento': date(2025, 3, 10),
+        'profissional': 'JOAO DA SILVA',
+        'crm_profissional': '123456',
+        'especialidade': 'CARDIOLOGIA',
+    }
+    assert len(pacientes) == 60
+    assert all(len(p['cns']) == 15 for p in pacientes)
+    assert all(p['data_hora_agendamento'].date() == date(2025, 3, 10) for p in pacientes)
+
+
+def test_pdf_pages_streamed_from_parser_pool():
+    pytest.importorskip('reportlab')
+    from benchmarks.agenda_pdf import generate_agenda_pdf
+
+    async def scenario(pdf_path):
+        await init_parser_pool()
+        try:
+            lotes = []
+            async with aclosing(stream_in_parser_pool(iter_pdf_pages, pdf_path, 2)) as stream:
+                async for lote in stream:
+                    lotes.append(lote)
+
+            # Consumidor que sai no primeiro lote libera o worker
+            async with aclosing(stream_in_parser_pool(iter_pdf_pages, pdf_path, 1)) as stream:
+                async for _ in stream:
+                    break
+            return lotes
+        finally:
+            await shutdown_parser_pool()
+
+    pdf = generate_agenda_pdf(pages=5, rows_per_page=10)
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file:
+        pdf_file.write(pdf)
+        pdf_file.flush()
+        lotes = asyncio.run(scenario(pdf_file.name))
+
+    header, pacientes = parse_pdf(BytesIO(pdf))
+    assert [len(p) for _, p in lotes] == [20, 20, 10]
+    assert lotes[-1][0] == header
+    assert [p for _, lote in lotes for p in lote] == pacientes
+
+
+def test_etl_keeps_no_transaction_open_while_parsing_and_uploading(agenda_limpa, run_with_pool):
+    pytest.importorskip('reportlab')
+    from benchmarks.agenda_pdf import generate_agenda_pdf
+
+    abertas = []
+
+    async def upload_em_andamento():
+        async with acquire_connection() as conn:
+            abertas.append(await conn.fetchval(
+                """
+                SELECT count(*) FROM pg_stat_activity
+                WHERE datname = current_database() AND state LIKE 'idle in transaction%'
+                """
+            ))
+
+    async def scenario():
+        await init_parser_pool()
+        try:
+            result = await etl_sertaozinho(
+                company_id=EMPRESA_TESTE,
+                filename='agenda',
+                user_id=1,
+                data_hora_enviar=datetime(2025, 3, 9, 8, 0),
+                data_hora_upload=datetime(2025, 3, 8, 10, 0),
+                file_bytes=generate_agenda_pdf(pages=3, rows_per_page=20),
+                persisted=upload_em_andamento(),
+            )
+        finally:
+            await shutdown_parser_pool()
+        async with acquire_connection() as conn:
+            linhas = await conn.fetchval(
+                'SELECT count(*) FROM lembrete_sertaozinho WHERE empresa_id = $1', EMPRESA_TESTE
+            )
+            # A staging da sessão não fica para trás na conexão devolvida ao pool
+            staging = await conn.fetchval("SELECT count(*) FROM pg_class WHERE relname = 'lembrete_staging'")
+        return result, linhas, staging
+
+    result, linhas, staging = run_with_pool(scenario)
+
+    assert abertas == [0]
+    assert result['linhas_inseridas'] == linhas == 60
+    assert staging == 0
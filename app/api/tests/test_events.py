@@ -0,0 +1,143 @@
+import asyncio
+import json
+from datetime import date
+
+from dotenv import load_dotenv
+
+from ...db import acquire_connection, close_db_pool, init_db_pool
+from ...migrations import run_migrations
+from ..functions.events import EventBroker, format_sse, notify_event, notify_responses, sse_stream
+from ..functions.report_cache import report_cache
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+OUTRA_EMPRESA = -2
+MARCADOR = 'teste_events.pdf'
+
+
+def run_with_broker(coro_fn, **kwargs):
+    async def runner():
+        await init_db_pool()
+        broker = EventBroker(**kwargs)
+        await broker.start()
+        try:
+            return await coro_fn(broker)
+        finally:
+            await broker.stop()
+            await close_db_pool()
+
+    return asyncio.run(runner())
+
+
+def test_notify_reaches_only_subscribers_of_the_company():
+    async def scenario(broker):
+        minha = broker.subscribe(EMPRESA_TESTE)
+        outra = broker.subscribe(OUTRA_EMPRESA)
+
+        async with acquire_connection() as conn:
+            await notify_responses(conn, [
+                {'empresa_id': EMPRESA_TESTE, 'wa_message_id': 'wamid.a'},
+                {'empresa_id': EMPRESA_TESTE, 'wa_message_id': 'wamid.b'},
+            ])
+
+        event = await asyncio.wait_for(minha.get(), timeout=5)
+        return event, outra.empty()
+
+    event, outra_vazia = run_with_broker(scenario)
+
+    assert event == {
+        'empresa_id': EMPRESA_TESTE,
+        'tipo': 'resposta',
+        'quantidade': 2,
+        'wa_message_ids': ['wamid.a', 'wamid.b'],
+    }
+    assert outra_vazia
+
+
+def test_notify_inside_rolled_back_transaction_is_not_delivered():
+    async def scenario(broker):
+        queue = broker.subscribe(EMPRESA_TESTE)
+
+        async with acquire_connection() as conn:
+            try:
+                async with conn.transaction():
+                    await notify_event(conn, EMPRESA_TESTE, 'ingestao', nome_arquivo='desfeito')
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+            await notify_event(conn, EMPRESA_TESTE, 'ingestao', nome_arquivo='commitado')
+
+        return await asyncio.wait_for(queue.get(), timeout=5)
+
+    event = run_with_broker(scenario)
+
+    assert event['nome_arquivo'] == 'commitado'
+
+
+def test_slow_subscriber_is_dropped_and_stream_ends():
+    async def scenario(broker):
+        stream = sse_stream(broker, EMPRESA_TESTE, keepalive=0.05)
+        assert await stream.__anext__() == ': conectado\n\n'
+        assert await stream.__anext__() == ': ping\n\n'
+
+        for i in range(3):
+            broker.publish({'empresa_id': EMPRESA_TESTE, 'tipo': 'resposta', 'i': i})
+        assert broker.subscribers == 0
+
+        # O que estava na fila é descartado e o stream termina
+        chunks = [chunk async for chunk in stream]
+        return chunks
+
+    chunks = run_with_broker(scenario, queue_size=2)
+
+    assert all(chunk.startswith('event: resposta') for chunk in chunks)
+    assert len(chunks) < 3
+
+
+def test_cross_agendamentos_write_invalidates_report_cache():
+    async def scenario(broker):
+        async with acquire_connection() as conn:
+            await run_migrations(conn)
+
+        calculos = []
+
+        async def compute(nome):
+            async def inner():
+                calculos.append(nome)
+                return b'{}'
+            return await report_cache.get_or_compute(('teste_events', nome), periodos[nome], inner)
+
+        periodos = {'marco': (date(2032, 3, 1), date(2032, 3, 31)), 'maio': (date(2032, 5, 1), date(2032, 5, 31))}
+        for nome in periodos:
+            await compute(nome)
+
+        # Escrita direto no banco, como as cargas feitas fora da API
+        async with acquire_connection() as conn:
+            await conn.execute(
+                "INSERT INTO cross_agendamentos (solicitante, data_agenda, nome_arquivo) VALUES ('S', '2032-03-10', $1)",
+                MARCADOR,
+            )
+            await conn.execute('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', MARCADOR)
+
+        for _ in range(100):
+            calculos.clear()
+            for nome in periodos:
+                await compute(nome)
+            if calculos:
+                return calculos
+            await asyncio.sleep(0.05)
+        return calculos
+
+    calculos = run_with_broker(scenario)
+
+    # Só o período que cruza a data alterada é recalculado
+    assert calculos == ['marco']
+
+
+def test_format_sse():
+    texto = format_sse({'empresa_id': 1, 'tipo': 'resposta', 'paciente': 'JOÃO'})
+
+    assert texto.startswith('event: resposta\ndata: ')
+    assert texto.endswith('\n\n')
+    assert json.loads(texto.split('data: ', 1)[1]) == {'empresa_id': 1, 'tipo': 'resposta', 'paciente': 'JOÃO'}
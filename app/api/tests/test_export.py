@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+import os
+
+import jwt
+from dotenv import load_dotenv
+
+from ...db import acquire_connection, get_db_pool
+from ..endpoints.schedules import SCHEDULE_COLUMNS, STREAM_CHUNK_SIZE, _copy_stream
+
+load_dotenv()
+
+PERMISSION_TOKEN = os.getenv('PERMISSION_TOKEN')
+MI4U_TESTE = jwt.encode({'sub': {'company_id': -1, 'user_id': 1}}, 'teste', algorithm='HS256')
+
+SERIE = 'SELECT i, md5(i::text) AS h FROM generate_series(1, $1) AS i'
+
+
+def test_copy_stream_is_chunked_and_complete(run_with_pool):
+    async def scenario():
+        return [chunk async for chunk in _copy_stream(SERIE, [20000])]
+
+    chunks = run_with_pool(scenario)
+
+    body = b''.join(chunks)
+    lines = body.decode().splitlines()
+    assert lines[0] == 'i,h'
+    assert len(lines) == 20001
+    assert lines[-1].startswith('20000,')
+    # Re-agrupado em pedaços de ~64KiB, não uma mensagem por linha
+    assert len(chunks) < 20
+    assert all(len(chunk) >= STREAM_CHUNK_SIZE for chunk in chunks[:-1])
+
+
+def test_copy_stream_gzip_is_a_single_valid_member(run_with_pool):
+    async def scenario():
+        return b''.join([chunk async for chunk in _copy_stream(SERIE, [5000], compress=True)])
+
+    body = gzip.decompress(run_with_pool(scenario)).decode()
+
+    assert body.count('\n') == 5001
+
+
+async def active_copies():
+    async with acquire_connection() as conn:
+        return await conn.fetchval(
+            "SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'COPY%generate_series%' AND state = 'active'"
+        )
+
+
+def test_disconnect_cancels_copy_and_releases_connection(run_with_pool):
+    async def scenario():
+        stream = _copy_stream(SERIE, [3_000_000])
+        await stream.__anext__()
+        # Cliente parado: o COPY continua aberto, esperando a fila esvaziar
+        await asyncio.sleep(0.2)
+        antes = await active_copies()
+
+        await stream.aclose()
+        task = [t for t in asyncio.all_tasks() if t.get_name() == 'schedule-export']
+        pool = get_db_pool()
+        return antes, task, await active_copies(), pool.get_size() - pool.get_idle_size()
+
+    antes, task, depois, em_uso = run_with_pool(scenario)
+
+    assert antes == 1
+    assert task == []
+    assert depois == 0
+    assert em_uso == 0
+
+
+def _export(client, **params):
+    return client.get(
+        '/schedule/export',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE, **params}
+    )
+
+
+def test_export_csv(client, agenda_teste):
+    response = _export(client, dt_start='2025-03-10', dt_end='2025-03-10', fields='codigo,paciente,horario')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    assert response.headers['content-disposition'] == 'attachment; filename="lembretes_20250310_20250310.csv"'
+    lines = response.text.splitlines()
+    assert lines[0] == 'codigo,paciente,horario'
+    assert lines[1:] == [f'{i},PACIENTE {i},08:{i:02d}:00' for i in range(1, 8)]
+
+    vazio = _export(client, dt_start='2025-03-11', dt_end='2025-03-31')
+    assert vazio.text.splitlines() == [','.join(SCHEDULE_COLUMNS)]
+
+
+def test_export_gzip(client, agenda_teste):
+    plain = _export(client, dt_start='2025-03-01', dt_end='2025-03-31')
+    compressed = _export(client, dt_start='2025-03-01', dt_end='2025-03-31', gzip='true')
+
+    assert compressed.headers['content-type'] == 'application/gzip'
+    assert gzip.decompress(compressed.content) == plain.content
+    assert len(plain.text.splitlines()) == 8
+
+
+def test_export_rejects_inverted_period(client):
+    assert _export(client, dt_start='2025-03-31', dt_end='2025-03-01').status_code == 400
@@ -0,0 +1,238 @@
+import asyncio
+import functools
+import os
+import threading
+
+import jwt
+import pytest
+from dotenv import load_dotenv
+from fastapi.testclient import TestClient
+
+from ...db import acquire_connection
+from ...main import app
+from ..endpoints import files
+from ..functions import storage
+from ..functions.ingestion_jobs import claim_job
+
+load_dotenv()
+
+PERMISSION_TOKEN = os.getenv('PERMISSION_TOKEN')
+
+
+PDF_BYTES = b'%PDF-1.4 ' + bytes(range(256)) * 40
+
+
+class FakeBlob:
+    def __init__(self, name, size, bucket=None, generation=None):
+        self.name = name
+        self.size = size
+        self.bucket = bucket
+        self.generation = generation
+        self.content_type = 'application/pdf'
+
+    def upload_from_string(self, data, content_type=None):
+        self.bucket.names.append(self.name)
+
+    def download_as_bytes(self, start=None, end=None, checksum=None):
+        self.bucket.download_calls += 1
+        return PDF_BYTES[start:end + 1]
+
+
+class FakeIterator:
+    def __init__(self, blobs, next_page_token):
+        self.pages = iter([blobs])
+        self.next_page_token = next_page_token
+
+
+class FakeBucket:
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.list_calls = 0
+        self.download_calls = 0
+        self.get_blob_on_loop = []
+
+    def list_blobs(self, prefix=None, page_token=None, max_results=None, fields=None):
+        self.list_calls += 1
+        names = [n for n in self.names if not prefix or n.startswith(prefix)]
+        start = int(page_token or 0)
+        end = start + max_results
+        blobs = [FakeBlob(n, len(n)) for n in names[start:end]]
+        return FakeIterator(blobs, str(end) if end < len(names) else None)
+
+    def blob(self, name, generation=None):
+        return FakeBlob(name, 0, bucket=self, generation=generation)
+
+    def get_blob(self, name):
+        try:
+            asyncio.get_running_loop()
+            self.get_blob_on_loop.append(True)
+        except RuntimeError:
+            self.get_blob_on_loop.append(False)
+        if name not in self.names:
+            return None
+        return FakeBlob(name, len(PDF_BYTES), bucket=self, generation=1700000000)
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = FakeBucket(['a-1.pdf', 'a-2.pdf', 'a-3.pdf', 'b-1.pdf'])
+    monkeypatch.setattr(storage, 'get_bucket', lambda: bucket)
+    storage.invalidate_list_cache()
+    yield bucket
+    storage.invalidate_list_cache()
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(storage, 'DOWNLOAD_CHUNK_SIZE', 4096)
+
+
+def download(blob_name, headers=None):
+    client = TestClient(app)
+    return client.get(
+        f'/download/{blob_name}',
+        params={'permission_token': PERMISSION_TOKEN},
+        headers=headers or {},
+    )
+
+
+def get_files(**params):
+    client = TestClient(app)
+    return client.get('/files/', params={'permission_token': PERMISSION_TOKEN, **params})
+
+
+def test_get_files_paginates_with_prefix(bucket):
+    first = get_files(prefix='a-', page_size=2)
+    assert first.status_code == 200
+    assert first.json() == {'files': {'a-1.pdf': 7, 'a-2.pdf': 7}, 'next_page_token': '2'}
+
+    second = get_files(prefix='a-', page_size=2, page_token='2')
+    assert second.json() == {'files': {'a-3.pdf': 7}, 'next_page_token': None}
+
+
+def test_get_files_without_pagination_keeps_the_flat_listing(bucket, monkeypatch):
+    # Páginas menores que a listagem: todas são lidas, nada é cortado
+    monkeypatch.setattr(files, 'list_all_blobs', functools.partial(storage.list_all_blobs, page_size=3))
+    bucket.names += [f'c-{i}.pdf' for i in range(5)]
+
+    response = get_files()
+
+    assert response.status_code == 200
+    assert response.json() == {name: len(name) for name in bucket.names}
+    assert bucket.list_calls == 3
+    assert get_files(prefix='b-').json() == {'b-1.pdf': 7}
+
+
+def test_get_files_cache_is_invalidated_by_writes(bucket):
+    get_files(page_size=10)
+    get_files(page_size=10)
+    assert bucket.list_calls == 1
+
+    storage.upload_blob_bytes('c-1.pdf', b'%PDF', content_type='application/pdf')
+    response = get_files(page_size=10)
+    assert bucket.list_calls == 2
+    assert 'c-1.pdf' in response.json()['files']
+
+
+def test_download_streams_whole_file_in_chunks(bucket, small_chunks):
+    response = download('a-1.pdf')
+
+    assert response.status_code == 200
+    assert response.content == PDF_BYTES
+    assert response.headers['content-length'] == str(len(PDF_BYTES))
+    assert response.headers['etag'] == '"1700000000"'
+    assert bucket.download_calls == -(-len(PDF_BYTES) // 4096)
+
+
+def test_download_range_returns_partial_content(bucket):
+    response = download('a-1.pdf', headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.content == PDF_BYTES[100:200]
+    assert response.headers['content-range'] == f'bytes 100-199/{len(PDF_BYTES)}'
+    assert response.headers['content-length'] == '100'
+
+    suffix = download('a-1.pdf', headers={'Range': 'bytes=-10'})
+    assert suffix.status_code == 206
+    assert suffix.content == PDF_BYTES[-10:]
+
+
+def test_download_unsatisfiable_range(bucket):
+    response = download('a-1.pdf', headers={'Range': f'bytes={len(PDF_BYTES)}-'})
+
+    assert response.status_code == 416
+    assert response.headers['content-range'] == f'bytes */{len(PDF_BYTES)}'
+
+
+def test_download_if_none_match_returns_304(bucket):
+    response = download('a-1.pdf', headers={'If-None-Match': '"1700000000"'})
+
+    assert response.status_code == 304
+    assert bucket.download_calls == 0
+
+
+def test_download_missing_blob(bucket):
+    assert download('nao-existe.pdf').status_code == 404
+
+
+def test_get_file_reads_metadata_off_the_event_loop(bucket):
+    client = TestClient(app)
+    found = client.get('/file/a-1.pdf', params={'permission_token': PERMISSION_TOKEN})
+    missing = client.get('/file/nao-existe.pdf', params={'permission_token': PERMISSION_TOKEN})
+
+    assert found.status_code == 200
+    assert found.json() == {'filename': 'a-1.pdf', 'size': len(PDF_BYTES), 'content_type': 'application/pdf'}
+    assert missing.status_code == 404
+    # A chamada bloqueante ao storage roda numa thread, não no event loop
+    assert bucket.get_blob_on_loop == [False, False]
+
+
+def test_post_file_rejects_token_without_company_id(bucket, client):
+    token = jwt.encode({'sub': {'user_id': 1}}, 'teste', algorithm='HS256')
+    response = client.post(
+        '/file/post/',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': token},
+        files={'file': ('agenda.pdf', PDF_BYTES, 'application/pdf')},
+    )
+
+    assert response.status_code == 400
+    assert bucket.names == ['a-1.pdf', 'a-2.pdf', 'a-3.pdf', 'b-1.pdf']
+
+
+def test_post_file_returns_the_job_status_after_the_upload(bucket, client, monkeypatch):
+    claimed = threading.Event()
+    jobs = []
+
+    async def claim(job_id):
+        async with acquire_connection() as conn:
+            await claim_job(conn, job_id)
+        claimed.set()
+
+    def fake_submit(job_id, file_bytes, persisted):
+        # O worker local pega o job enquanto o arquivo ainda está subindo
+        jobs.append(job_id)
+        asyncio.get_running_loop().create_task(claim(job_id))
+
+    def slow_upload(blob_name, data, content_type):
+        assert claimed.wait(5)
+
+    monkeypatch.setattr(files, 'submit_ingestion_job', fake_submit)
+    monkeypatch.setattr(files, 'upload_blob_bytes', slow_upload)
+
+    token = jwt.encode({'sub': {'company_id': -1, 'user_id': 1}}, 'teste', algorithm='HS256')
+    try:
+        response = client.post(
+            '/file/post/',
+            params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': token},
+            files={'file': ('agenda.pdf', PDF_BYTES, 'application/pdf')},
+        )
+    finally:
+        client.portal.call(_delete_jobs, jobs)
+
+    assert response.status_code == 202
+    assert response.json()['status'] == 'running'
+
+
+async def _delete_jobs(job_ids):
+    async with acquire_connection() as conn:
+        await conn.execute('DELETE FROM ingestao_jobs WHERE id = ANY($1::uuid[])', job_ids)
@@ -0,0 +1,259 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from dotenv import load_dotenv
+
+from ...db import acquire_connection
+from ..functions.ingestion_jobs import IngestionWorker, claim_job, claim_next_job, create_job, finish_job, get_job
+from ..functions.parser_pool import ParserPoolFull
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+
+
+@pytest.fixture(autouse=True)
+def limpa_jobs(run_sql):
+    run_sql('DELETE FROM ingestao_jobs WHERE empresa_id = $1', EMPRESA_TESTE)
+    yield
+    run_sql('DELETE FROM ingestao_jobs WHERE empresa_id = $1', EMPRESA_TESTE)
+
+
+async def enqueue(blob_name='agenda-teste.pdf', uploading=False):
+    async with acquire_connection() as conn:
+        return await create_job(
+            conn,
+            company_id=EMPRESA_TESTE,
+            user_id=1,
+            filename='agenda-teste',
+            blob_name=blob_name,
+            data_hora_enviar=datetime(2025, 3, 9, 8, 0),
+            data_hora_upload=datetime(2025, 3, 8, 10, 0),
+            uploading=uploading,
+        )
+
+
+async def fetch_job(job_id):
+    async with acquire_connection() as conn:
+        return await get_job(conn, job_id)
+
+
+def fail_download(blob_name):
+    raise AssertionError('o arquivo não deveria ser baixado do storage')
+
+
+def make_worker(etl, deleted=None, fetch_blob=lambda blob_name: b'%PDF-fake', **kwargs):
+    deleted = [] if deleted is None else deleted
+    return IngestionWorker(
+        fetch_blob=fetch_blob,
+        delete_blob=deleted.append,
+        etl=etl,
+        concurrency=1,
+        **kwargs,
+    )
+
+
+def test_job_done_records_counts_and_stage_timings(run_with_pool):
+    received = {}
+
+    async def fake_etl(**kwargs):
+        received.update(kwargs)
+        return {'linhas_extraidas': 3, 'linhas_inseridas': 3, 'etapas': {'parse': 0.1, 'insert': 0.2}}
+
+    async def scenario():
+        job_id = await enqueue()
+        assert (await fetch_job(job_id))['status'] == 'queued'
+
+        await make_worker(fake_etl).run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert job['status'] == 'done'
+    assert job['tentativas'] == 1
+    assert job['linhas_extraidas'] == 3
+    assert job['linhas_inseridas'] == 3
+    assert set(job['etapas']) == {'download', 'parse', 'insert'}
+    assert received['company_id'] == EMPRESA_TESTE
+    assert received['file_bytes'] == b'%PDF-fake'
+
+
+def test_job_failed_keeps_error_and_deletes_blob(run_with_pool):
+    deleted = []
+
+    async def broken_etl(**kwargs):
+        raise ValueError('PDF inválido')
+
+    async def scenario():
+        job_id = await enqueue(blob_name='quebrado.pdf')
+        await make_worker(broken_etl, deleted).run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert job['status'] == 'failed'
+    assert job['erro'] == 'PDF inválido'
+    assert deleted == ['quebrado.pdf']
+
+
+def test_running_job_with_expired_lease_is_resumed(run_with_pool):
+    async def fake_etl(**kwargs):
+        return {'linhas_extraidas': 1, 'linhas_inseridas': 1, 'etapas': {}}
+
+    async def scenario():
+        job_id = await enqueue()
+        # Simula um processo que pegou o job e morreu no meio
+        async with acquire_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE ingestao_jobs
+                SET status = 'running', tentativas = 1, lease_ate = now() - interval '1 minute'
+                WHERE id = $1
+                """,
+                job_id,
+            )
+
+        await make_worker(fake_etl).run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert job['status'] == 'done'
+    assert job['tentativas'] == 2
+
+
+def test_lease_is_renewed_while_the_job_runs(run_with_pool):
+    roubados = []
+
+    async def slow_etl(**kwargs):
+        # Dura vários leases; sem a renovação outro worker pegaria o job
+        for _ in range(8):
+            await asyncio.sleep(0.1)
+            async with acquire_connection() as conn:
+                job = await claim_next_job(conn, lease_seconds=0.3)
+            if job is not None:
+                roubados.append(job['id'])
+        return {'linhas_extraidas': 1, 'linhas_inseridas': 1, 'etapas': {}}
+
+    async def scenario():
+        job_id = await enqueue()
+        await make_worker(slow_etl, lease_seconds=0.3).run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert roubados == []
+    assert job['status'] == 'done'
+    assert job['tentativas'] == 1
+
+
+def test_stale_run_does_not_overwrite_the_current_one(run_with_pool):
+    async def scenario():
+        job_id = await enqueue()
+        async with acquire_connection() as conn:
+            antiga = await claim_job(conn, job_id)
+            # O lease da primeira reserva expira e outro worker pega o job
+            await conn.execute(
+                "UPDATE ingestao_jobs SET lease_ate = now() - interval '1 minute' WHERE id = $1", job_id
+            )
+            atual = await claim_next_job(conn)
+
+            gravou_antiga = await finish_job(conn, job_id, antiga['lease_id'], {'linhas_extraidas': 99})
+            depois_da_antiga = await get_job(conn, job_id)
+            gravou_atual = await finish_job(conn, job_id, atual['lease_id'], {'linhas_extraidas': 1})
+        return gravou_antiga, depois_da_antiga, gravou_atual, await fetch_job(job_id)
+
+    gravou_antiga, depois_da_antiga, gravou_atual, job = run_with_pool(scenario)
+
+    assert not gravou_antiga
+    assert depois_da_antiga['status'] == 'running'
+    assert gravou_atual
+    assert job['status'] == 'done'
+    assert job['linhas_extraidas'] == 1
+    assert job['tentativas'] == 2
+
+
+def test_submitted_job_uses_upload_bytes_and_waits_for_storage(run_with_pool):
+    order = []
+
+    async def fake_etl(file_bytes, persisted, **kwargs):
+        order.append(('parse', file_bytes))
+        await persisted
+        order.append('insert')
+        return {'linhas_extraidas': 1, 'linhas_inseridas': 1, 'etapas': {}}
+
+    async def slow_upload():
+        await asyncio.sleep(0.05)
+        order.append('upload')
+
+    async def scenario():
+        job_id = await enqueue(uploading=True)
+        worker = make_worker(fake_etl, fetch_blob=fail_download)
+        worker.submit(job_id, b'%PDF-memoria', slow_upload())
+        await worker.run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert job['status'] == 'done'
+    assert order == [('parse', b'%PDF-memoria'), 'upload', 'insert']
+
+
+def test_submitted_job_fails_when_upload_fails(run_with_pool):
+    deleted = []
+
+    async def fake_etl(persisted, **kwargs):
+        await persisted
+        raise AssertionError('não deveria inserir sem o arquivo no storage')
+
+    async def broken_upload():
+        raise ConnectionError('storage indisponível')
+
+    async def scenario():
+        job_id = await enqueue(blob_name='sem-upload.pdf', uploading=True)
+        worker = make_worker(fake_etl, deleted, fetch_blob=fail_download)
+        worker.submit(job_id, b'%PDF-memoria', broken_upload())
+        await worker.run_pending()
+        return await fetch_job(job_id)
+
+    job = run_with_pool(scenario)
+
+    assert job['status'] == 'failed'
+    assert job['erro'] == 'storage indisponível'
+    assert deleted == ['sem-upload.pdf']
+
+
+def test_submitted_job_stays_local_when_parser_pool_is_full(run_with_pool):
+    tentativas = []
+
+    async def busy_etl(persisted, **kwargs):
+        tentativas.append(persisted.done())
+        if len(tentativas) == 1:
+            raise ParserPoolFull('cheio')
+        await persisted
+        return {'linhas_extraidas': 1, 'linhas_inseridas': 1, 'etapas': {}}
+
+    async def slow_upload():
+        await asyncio.sleep(0.2)
+
+    async def scenario():
+        job_id = await enqueue(uploading=True)
+        worker = make_worker(busy_etl, fetch_blob=fail_download)
+        worker.submit(job_id, b'%PDF-memoria', slow_upload())
+
+        # Pool cheio: o worker para (e espera poll_interval) em vez de insistir
+        assert not await worker._run_next()
+        devolvido = await fetch_job(job_id)
+
+        assert await worker.run_pending() == 1
+        return devolvido, await fetch_job(job_id)
+
+    devolvido, job = run_with_pool(scenario)
+
+    # Upload ainda em andamento: o job não pode ir para 'queued'
+    assert devolvido['status'] == 'uploading'
+    assert devolvido['tentativas'] == 0
+    assert job['status'] == 'done'
+    assert job['tentativas'] == 1
+    assert tentativas == [False, False]
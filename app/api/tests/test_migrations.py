@@ -0,0 +1,82 @@
+import pytest
+from dotenv import load_dotenv
+
+from ...migrations import applied_migrations, load_migrations, missing_extensions, run_migrations
+
+load_dotenv()
+
+
+def test_migrations_are_ordered_and_idempotent(run_with_conn):
+    versoes = [migration.versao for migration in load_migrations()]
+    assert versoes == sorted(versoes)
+
+    async def scenario(conn):
+        await run_migrations(conn)
+        segunda = await run_migrations(conn)
+        # Migrations que aguardam uma extensão ausente neste servidor
+        aguardando = {
+            migration.versao for migration in load_migrations()
+            if await missing_extensions(conn, migration.requires)
+        }
+        return segunda, await applied_migrations(conn), aguardando
+
+    segunda, applied, aguardando = run_with_conn(scenario)
+
+    assert segunda == []
+    assert set(versoes) - aguardando <= set(applied)
+
+
+def test_failed_migration_is_rolled_back(run_with_conn, tmp_path):
+    for migration in load_migrations():
+        (tmp_path / migration.path.name).write_bytes(migration.path.read_bytes())
+    (tmp_path / '9001_teste_ok.sql').write_text('CREATE TABLE migration_teste (id int);')
+    (tmp_path / '9002_teste_quebrada.sql').write_text('CREATE TABLE migration_teste_2 (id int); SELECT 1/0;')
+
+    async def scenario(conn):
+        try:
+            with pytest.raises(Exception):
+                await run_migrations(conn, tmp_path)
+            applied = await applied_migrations(conn)
+            tabela_2 = await conn.fetchval("SELECT to_regclass('migration_teste_2')")
+            return applied, tabela_2
+        finally:
+            await conn.execute('DROP TABLE IF EXISTS migration_teste')
+            await conn.execute("DELETE FROM schema_migrations WHERE versao LIKE '900%'")
+
+    applied, tabela_2 = run_with_conn(scenario)
+
+    assert '9001' in applied
+    assert '9002' not in applied
+    assert tabela_2 is None
+
+
+def test_migration_waiting_for_extension_is_retried(run_with_conn, tmp_path):
+    for migration in load_migrations():
+        (tmp_path / migration.path.name).write_bytes(migration.path.read_bytes())
+    (tmp_path / '9001_teste_extensao.sql').write_text(
+        '-- requer: extensao_inexistente\nCREATE EXTENSION extensao_inexistente;'
+    )
+    (tmp_path / '9002_teste_depois.sql').write_text('CREATE TABLE migration_teste (id int);')
+
+    async def scenario(conn):
+        try:
+            primeira = await run_migrations(conn, tmp_path)
+            segunda = await run_migrations(conn, tmp_path)
+            return primeira, segunda
+        finally:
+            await conn.execute('DROP TABLE IF EXISTS migration_teste')
+            await conn.execute("DELETE FROM schema_migrations WHERE versao LIKE '900%'")
+
+    primeira, segunda = run_with_conn(scenario)
+
+    # Pulada sem registro, enquanto as seguintes seguem normalmente
+    assert '9001' not in primeira
+    assert '9002' in primeira
+    assert segunda == []
+
+
+def test_rejects_badly_named_files(tmp_path):
+    (tmp_path / 'sem_versao.sql').write_text('SELECT 1;')
+
+    with pytest.raises(ValueError):
+        load_migrations(tmp_path)
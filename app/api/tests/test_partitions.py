@@ -0,0 +1,209 @@
+import json
+from datetime import date
+
+import pytest
+from dotenv import load_dotenv
+
+from ..functions.partitions import (
+    add_months,
+    archive_partitions,
+    convert_table,
+    create_future_partitions,
+    is_partitioned,
+)
+
+load_dotenv()
+
+# Tabela descartável com o formato relevante das tabelas reais: id bigserial
+# como chave primária, data_agenda anulável, índices e um trigger de
+# statement com transition table (como os de cross_report_mensal).
+TABELA = 'particao_teste'
+
+SETUP = f"""
+    DROP TABLE IF EXISTS {TABELA} CASCADE;
+    DROP TABLE IF EXISTS arquivo.{TABELA}_p202401, arquivo.{TABELA}_p202402;
+    DROP TABLE IF EXISTS {TABELA}_contagem;
+
+    CREATE TABLE {TABELA} (
+        id          bigserial PRIMARY KEY,
+        empresa_id  integer,
+        data_agenda date,
+        paciente    text
+    );
+    CREATE INDEX {TABELA}_empresa_data_idx ON {TABELA} (empresa_id, data_agenda);
+    CREATE INDEX {TABELA}_empresa_id_id_idx ON {TABELA} (empresa_id, id);
+
+    CREATE TABLE {TABELA}_contagem (linhas bigint NOT NULL);
+    INSERT INTO {TABELA}_contagem VALUES (0);
+
+    CREATE OR REPLACE FUNCTION {TABELA}_contar() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE {TABELA}_contagem SET linhas = linhas + (SELECT count(*) FROM novas);
+        RETURN NULL;
+    END
+    $$;
+    CREATE TRIGGER {TABELA}_contar AFTER INSERT ON {TABELA}
+        REFERENCING NEW TABLE AS novas
+        FOR EACH STATEMENT EXECUTE FUNCTION {TABELA}_contar();
+
+    INSERT INTO {TABELA} (empresa_id, data_agenda, paciente)
+    SELECT i % 3, DATE '2024-01-01' + (i % 90), 'PACIENTE ' || i
+    FROM generate_series(1, 900) AS i;
+    INSERT INTO {TABELA} (empresa_id, data_agenda, paciente) VALUES (1, NULL, 'SEM DATA');
+"""
+
+TEARDOWN = f"""
+    DROP TABLE IF EXISTS {TABELA} CASCADE;
+    DROP TABLE IF EXISTS arquivo.{TABELA}_p202401, arquivo.{TABELA}_p202402;
+    DROP TABLE IF EXISTS {TABELA}_contagem;
+    DROP FUNCTION IF EXISTS {TABELA}_contar();
+"""
+
+
+@pytest.fixture
+def tabela_teste(run_with_conn):
+    run_with_conn(lambda conn: conn.execute(SETUP))
+    yield
+    run_with_conn(lambda conn: conn.execute(TEARDOWN))
+
+
+async def partitions(conn):
+    return [
+        row['relname']
+        for row in await conn.fetch(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = $1::regclass ORDER BY c.relname
+            """,
+            TABELA,
+        )
+    ]
+
+
+async def scanned_partitions(conn, query, *params):
+    """Partições lidas pelo plano da consulta (após o pruning)."""
+    plan = await conn.fetchval(f'EXPLAIN (FORMAT JSON) {query}', *params)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    found = set()
+
+    def walk(node):
+        if 'Relation Name' in node:
+            found.add(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return found
+
+
+def test_convert_keeps_rows_indexes_and_triggers(tabela_teste, run_with_conn):
+    async def scenario(conn):
+        assert await convert_table(conn, TABELA, months_ahead=0)
+        # Uma segunda conversão não faz nada
+        assert not await convert_table(conn, TABELA, months_ahead=0)
+
+        await conn.execute(
+            f"INSERT INTO {TABELA} (empresa_id, data_agenda, paciente) VALUES (1, '2024-02-10', 'NOVO')"
+        )
+        novo_id = await conn.fetchval(f"SELECT id FROM {TABELA} WHERE paciente = 'NOVO'")
+        indices = await conn.fetch('SELECT indexname FROM pg_indexes WHERE tablename = $1', TABELA)
+        return {
+            'particionada': await is_partitioned(conn, TABELA),
+            'particoes': await partitions(conn),
+            'linhas': await conn.fetchval(f'SELECT count(*) FROM {TABELA}'),
+            'sem_data': await conn.fetchval(f'SELECT count(*) FROM {TABELA}_default'),
+            'contagem': await conn.fetchval(f'SELECT linhas FROM {TABELA}_contagem'),
+            'novo_id': novo_id,
+            'indices': {row['indexname'] for row in indices},
+        }
+
+    resultado = run_with_conn(scenario)
+
+    assert resultado['particionada']
+    assert {f'{TABELA}_p202401', f'{TABELA}_p202402', f'{TABELA}_p202403', f'{TABELA}_default'} <= set(
+        resultado['particoes']
+    )
+    assert resultado['linhas'] == 902
+    assert resultado['sem_data'] == 1
+    # A cópia não dispara o trigger; a inserção depois da conversão, sim
+    assert resultado['contagem'] == 902
+    # A sequence continua de onde parou
+    assert resultado['novo_id'] == 902
+    assert {f'{TABELA}_id_idx', f'{TABELA}_empresa_data_idx', f'{TABELA}_empresa_id_id_idx'} <= resultado['indices']
+
+
+def test_new_partition_takes_rows_from_default(tabela_teste, run_with_conn):
+    async def scenario(conn):
+        await convert_table(conn, TABELA, months_ahead=0)
+        await conn.execute(
+            f"INSERT INTO {TABELA} (empresa_id, data_agenda, paciente) VALUES (1, '2030-05-10', 'FUTURO')"
+        )
+        antes = await conn.fetchval(f'SELECT count(*) FROM {TABELA}_default')
+        criadas = await create_future_partitions(conn, TABELA, months_ahead=1, today=date(2030, 5, 1))
+        depois = await conn.fetchval(f'SELECT count(*) FROM ONLY {TABELA}_p203005')
+        return antes, criadas, depois, await conn.fetchval(f'SELECT count(*) FROM {TABELA}_default')
+
+    antes, criadas, depois, no_default = run_with_conn(scenario)
+
+    assert antes == 2
+    assert criadas == [f'{TABELA}_p203005', f'{TABELA}_p203006']
+    assert depois == 1
+    assert no_default == 1
+
+
+def test_queries_by_data_agenda_prune_partitions(tabela_teste, run_with_conn):
+    async def scenario(conn):
+        await convert_table(conn, TABELA, months_ahead=0)
+        # Parâmetros, como nas consultas da API, e plano genérico
+        await conn.execute('SET plan_cache_mode = force_generic_plan')
+        try:
+            entre = await scanned_partitions(
+                conn,
+                f'SELECT * FROM {TABELA} WHERE data_agenda BETWEEN $1 AND $2',
+                date(2024, 2, 1), date(2024, 2, 29),
+            )
+            igual = await scanned_partitions(
+                conn,
+                f'SELECT * FROM {TABELA} WHERE empresa_id = $1 AND data_agenda = $2',
+                1, date(2024, 3, 5),
+            )
+        finally:
+            await conn.execute('RESET plan_cache_mode')
+        return entre, igual
+
+    entre, igual = run_with_conn(scenario)
+
+    # No plano genérico o pruning acontece na inicialização do executor:
+    # o EXPLAIN mostra só as partições do intervalo.
+    assert entre == {f'{TABELA}_p202402'}
+    assert igual == {f'{TABELA}_p202403'}
+
+
+def test_archive_detaches_old_partitions(tabela_teste, run_with_conn):
+    async def scenario(conn):
+        await convert_table(conn, TABELA, months_ahead=0)
+        arquivadas = await archive_partitions(conn, TABELA, retention_months=1, today=date(2024, 3, 15))
+        arquivadas_de_novo = await archive_partitions(conn, TABELA, retention_months=1, today=date(2024, 3, 15))
+        return {
+            'arquivadas': arquivadas,
+            'de_novo': arquivadas_de_novo,
+            'particoes': await partitions(conn),
+            'linhas': await conn.fetchval(f'SELECT count(*) FROM {TABELA}'),
+            'no_arquivo': await conn.fetchval(f'SELECT count(*) FROM arquivo.{TABELA}_p202401'),
+        }
+
+    resultado = run_with_conn(scenario)
+
+    assert resultado['arquivadas'] == [f'{TABELA}_p202401', f'{TABELA}_p202402']
+    assert resultado['de_novo'] == []
+    assert f'{TABELA}_p202401' not in resultado['particoes']
+    assert f'{TABELA}_p202403' in resultado['particoes']
+    assert resultado['no_arquivo'] == 310
+    assert resultado['linhas'] == 901 - 310 - 290
+
+
+def test_add_months():
+    assert add_months(date(2025, 11, 20), 2) == date(2026, 1, 1)
+    assert add_months(date(2025, 1, 31), -1) == date(2024, 12, 1)
@@ -0,0 +1,89 @@
+import os
+
+import jwt
+import pytest
+from dotenv import load_dotenv
+
+from ..functions.report_cache import report_cache
+
+load_dotenv()
+
+MARCADOR = 'teste-report'
+PERMISSION_TOKEN = os.getenv('PERMISSION_TOKEN')
+MI4U_TESTE = jwt.encode({'sub': {'company_id': -1, 'user_id': 1}}, 'teste', algorithm='HS256')
+# Período sem dados reais, para o teste enxergar só as próprias linhas
+PERIODO = {'dt_start': '01-01-2031', 'dt_end': '31-03-2031'}
+
+RESPOSTAS = ['CONFIRMO', 'NÃOㅤCONFIRMO', ' NÃOㅤCONHEÇO ', None, 'OUTRA', 'confirmo']
+
+
+@pytest.fixture
+def cross_teste(client, run_sql):
+    run_sql('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', MARCADOR)
+    run_sql(
+        """
+        INSERT INTO cross_agendamentos (solicitante, paciente, telefone, data_agenda, resposta, nome_arquivo)
+        SELECT 'SOLICITANTE ' || (i % 4), 'PACIENTE ' || i, '169' || i,
+               DATE '2031-01-01' + (i % 80), ($2::text[])[i % 6 + 1], $1
+        FROM generate_series(1, 120) AS i
+        """,
+        MARCADOR, RESPOSTAS,
+    )
+    # O aviso do trigger (0008) chega de forma assíncrona; não depende dele
+    report_cache.clear()
+    yield
+    run_sql('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', MARCADOR)
+
+
+def expected_details(run_sql):
+    """Agrupamento feito em Python, como o endpoint fazia antes."""
+    rows = run_sql(
+        'SELECT paciente, telefone, solicitante, resposta FROM cross_agendamentos '
+        'WHERE nome_arquivo = $1 ORDER BY solicitante, id',
+        MARCADOR,
+    )
+    grupos = {'CONFIRMO': 'confirmados', 'NÃOㅤCONFIRMO': 'nao_confirmados', 'NÃOㅤCONHEÇO': 'nao_reconhecidos'}
+    resultado = {}
+    for row in rows:
+        item = resultado.setdefault(row['solicitante'], {
+            'solicitante': row['solicitante'],
+            'confirmados': [], 'nao_confirmados': [], 'nao_reconhecidos': [], 'nao_respondidos': [],
+        })
+        grupo = grupos.get((row['resposta'] or '').strip().upper(), 'nao_respondidos')
+        item[grupo].append({'cliente': row['paciente'], 'telefone': row['telefone']})
+    return list(resultado.values())
+
+
+def details(client, **params):
+    response = client.get(
+        '/report/details',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE, **PERIODO, **params},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_report_details_groups_in_sql(client, cross_teste, run_sql):
+    body = details(client)
+
+    assert body['success'] is True
+    obtido = [{k: v for k, v in item.items() if k != 'totais'} for item in body['data']]
+    assert obtido == expected_details(run_sql)
+    assert body['data'][0]['totais']['confirmados'] == len(body['data'][0]['confirmados'])
+
+
+def test_report_details_limit_and_pages(client, cross_teste, run_sql):
+    esperado = expected_details(run_sql)
+
+    solicitantes, cursor = [], None
+    while True:
+        body = details(client, limite=2, page_size=3, **({'cursor': cursor} if cursor else {}))
+        for item in body['data']:
+            assert all(len(item[grupo]) <= 2 for grupo in item['totais'])
+        solicitantes += [item['solicitante'] for item in body['data']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert solicitantes == [item['solicitante'] for item in esperado]
+    assert body['data'][-1]['totais']['nao_respondidos'] == len(esperado[-1]['nao_respondidos'])
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import date
+
+from ..functions.report_cache import ReportCache
+
+MARCO = (date(2025, 3, 1), date(2025, 3, 31))
+ABRIL = (date(2025, 4, 1), date(2025, 4, 30))
+
+
+def make_cache(**kwargs):
+    return ReportCache(**{'ttl': 60, 'max_bytes': 1024, 'max_item_bytes': 512, **kwargs})
+
+
+def counting(body=b'{"data": []}', delay=0.0):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return body
+
+    return compute, calls
+
+
+def test_hit_after_miss_and_coalesced_misses():
+    cache = make_cache()
+    compute, calls = counting(delay=0.02)
+
+    async def scenario():
+        bodies = await asyncio.gather(*[cache.get_or_compute('report', MARCO, compute) for _ in range(5)])
+        bodies.append(await cache.get_or_compute('report', MARCO, compute))
+        return bodies
+
+    bodies = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert set(bodies) == {b'{"data": []}'}
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['coalesced'] == 4
+    assert cache.stats()['hits'] == 1
+
+
+def test_invalidate_only_overlapping_periods():
+    cache = make_cache()
+    compute, calls = counting()
+
+    async def scenario():
+        await cache.get_or_compute('report', MARCO, compute)
+        await cache.get_or_compute('report', ABRIL, compute)
+        removed = cache.invalidate(date(2025, 4, 10), date(2025, 4, 10))
+        await cache.get_or_compute('report', MARCO, compute)
+        await cache.get_or_compute('report', ABRIL, compute)
+        return removed
+
+    assert asyncio.run(scenario()) == 1
+    assert len(calls) == 3
+
+
+def test_write_during_query_is_not_cached():
+    cache = make_cache()
+    compute, calls = counting(delay=0.02)
+
+    async def scenario():
+        pending = asyncio.create_task(cache.get_or_compute('report', MARCO, compute))
+        await asyncio.sleep(0)
+        cache.invalidate(date(2025, 3, 15), date(2025, 3, 15))
+        await pending
+        await cache.get_or_compute('report', MARCO, compute)
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 2
+
+
+def test_memory_bound_evicts_and_skips_large_items():
+    cache = make_cache(max_bytes=100, max_item_bytes=60)
+
+    async def scenario():
+        for i in range(4):
+            await cache.get_or_compute(i, MARCO, counting(b'x' * 40)[0])
+        await cache.get_or_compute('grande', MARCO, counting(b'x' * 80)[0])
+
+    asyncio.run(scenario())
+
+    assert cache.stats()['bytes'] <= 100
+    assert cache.stats()['entries'] == 2
+
+
+def test_stream_is_cached_and_coalesced():
+    cache = make_cache()
+    calls = []
+
+    async def chunks():
+        calls.append(1)
+        for part in ('[', '1', ',2', ']'):
+            await asyncio.sleep(0.005)
+            yield part
+
+    async def read():
+        return b''.join([part async for part in cache.stream('details', MARCO, chunks)])
+
+    async def scenario():
+        bodies = await asyncio.gather(read(), read())
+        bodies.append(await read())
+        return bodies
+
+    assert asyncio.run(scenario()) == [b'[1,2]'] * 3
+    assert len(calls) == 1
@@ -0,0 +1,116 @@
+from datetime import date
+
+import pytest
+from dotenv import load_dotenv
+
+from ..functions.report_rollup import fetch_report_rows, rebuild_report_rollup, split_period
+
+load_dotenv()
+
+MARCADOR = 'teste-rollup'
+
+# Consulta original do /report, usada como referência
+RAW_REPORT_QUERY = """
+    SELECT
+        solicitante,
+        TO_CHAR(date_trunc('month', data_agenda), 'MM-YYYY') AS periodo,
+        COUNT(*) FILTER (WHERE resposta = 'CONFIRMO')            AS confirmado,
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO')       AS nao_confirmado,
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO')        AS nao_conheco,
+        COUNT(*) FILTER (WHERE resposta IS NULL OR TRIM(resposta) = '') AS nao_respondido
+    FROM cross_agendamentos
+    WHERE data_agenda BETWEEN $1 AND $2
+      AND solicitante IS NOT NULL
+      AND solicitante <> ''
+      AND nome_arquivo = $3
+    GROUP BY solicitante, date_trunc('month', data_agenda)
+    ORDER BY solicitante, date_trunc('month', data_agenda)
+"""
+
+
+@pytest.fixture
+def cross_limpo(run_sql):
+    run_sql('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', MARCADOR)
+    yield
+    run_sql('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', MARCADOR)
+
+
+async def seed(conn):
+    await conn.execute(
+        """
+        INSERT INTO cross_agendamentos (solicitante, data_agenda, resposta, nome_arquivo)
+        SELECT 'ROLLUP TESTE ' || (i % 3),
+               DATE '2025-01-01' + (i % 120),
+               (ARRAY['CONFIRMO', 'NÃOㅤCONFIRMO', 'NÃOㅤCONHEÇO', NULL, ' ', 'OUTRA'])[i % 6 + 1],
+               $1
+        FROM generate_series(1, 600) AS i
+        """,
+        MARCADOR,
+    )
+
+
+async def compare(conn, dt_start, dt_end):
+    esperado = [tuple(row) for row in await conn.fetch(RAW_REPORT_QUERY, dt_start, dt_end, MARCADOR)]
+    obtido = [
+        (row['solicitante'], row['periodo'], row['confirmado'], row['nao_confirmado'],
+         row['nao_conheco'], row['nao_respondido'])
+        for row in await fetch_report_rows(conn, dt_start, dt_end)
+        if row['solicitante'].startswith('ROLLUP TESTE')
+    ]
+    assert obtido == esperado
+    return obtido
+
+
+PERIODOS = [
+    (date(2025, 1, 1), date(2025, 4, 30)),
+    (date(2025, 1, 15), date(2025, 3, 10)),
+    (date(2025, 2, 3), date(2025, 2, 20)),
+]
+
+
+def test_split_period():
+    vazio = (None, None)
+    assert split_period(date(2025, 1, 1), date(2025, 3, 31)) == (vazio, (date(2025, 1, 1), date(2025, 3, 1)), vazio)
+    assert split_period(date(2025, 1, 15), date(2025, 3, 10)) == (
+        (date(2025, 1, 15), date(2025, 1, 31)),
+        (date(2025, 2, 1), date(2025, 2, 1)),
+        (date(2025, 3, 1), date(2025, 3, 10)),
+    )
+    assert split_period(date(2025, 2, 3), date(2025, 2, 20)) == ((date(2025, 2, 3), date(2025, 2, 20)), vazio, vazio)
+
+
+def test_rollup_follows_inserts_updates_and_deletes(cross_limpo, run_with_conn):
+    async def scenario(conn):
+        await seed(conn)
+        for periodo in PERIODOS:
+            assert await compare(conn, *periodo)
+
+        await conn.execute(
+            """
+            UPDATE cross_agendamentos SET resposta = 'CONFIRMO'
+            WHERE nome_arquivo = $1 AND (resposta IS NULL OR resposta = 'OUTRA')
+            """,
+            MARCADOR,
+        )
+        await conn.execute(
+            "UPDATE cross_agendamentos SET data_agenda = data_agenda + 31 WHERE nome_arquivo = $1 AND id % 5 = 0",
+            MARCADOR,
+        )
+        await conn.execute("DELETE FROM cross_agendamentos WHERE nome_arquivo = $1 AND id % 7 = 0", MARCADOR)
+
+        for periodo in PERIODOS:
+            await compare(conn, *periodo)
+
+    run_with_conn(scenario)
+
+
+def test_rebuild_restores_counts(cross_limpo, run_with_conn):
+    async def scenario(conn):
+        await seed(conn)
+        await conn.execute("UPDATE cross_report_mensal SET confirmado = 0 WHERE solicitante LIKE 'ROLLUP TESTE%'")
+
+        await rebuild_report_rollup(conn, date(2025, 1, 1), date(2025, 12, 1))
+
+        await compare(conn, date(2025, 1, 1), date(2025, 4, 30))
+
+    run_with_conn(scenario)
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+from dotenv import load_dotenv
+
+from ..functions.schedule_search import escape_like, text_condition
+
+load_dotenv()
+
+EMPRESA_TESTE = -1
+LINHAS = 20000
+# Empresa com poucas linhas no meio das de EMPRESA_TESTE: sem o índice em
+# (empresa_id, id), a página dela exigiria varrer a chave primária inteira.
+EMPRESA_PEQUENA = -2
+LINHAS_PEQUENA = 300
+
+
+@pytest.fixture(scope='module')
+def agenda_grande(run_with_conn):
+    async def seed(conn):
+        await conn.execute(
+            'DELETE FROM lembrete_sertaozinho WHERE empresa_id = ANY($1::int[])', [EMPRESA_TESTE, EMPRESA_PEQUENA]
+        )
+        await conn.execute(
+            """
+            INSERT INTO lembrete_sertaozinho (
+                empresa_id, paciente, profissional, telefone, wa_message_id, resposta, nome_arquivo
+            )
+            SELECT $1, 'PACIENTE ' || i, 'PROFISSIONAL ' || (i % 80), '169' || (10000000 + i),
+                   'wamid.teste.' || i, (ARRAY['CONFIRMO', 'NÃOㅤCONFIRMO', NULL])[i % 3 + 1], 'teste-busca'
+            FROM generate_series(1, $2) AS i
+            """,
+            EMPRESA_TESTE, LINHAS,
+        )
+        await conn.execute(
+            """
+            INSERT INTO lembrete_sertaozinho (empresa_id, paciente, nome_arquivo)
+            SELECT $1, 'PACIENTE ' || i, 'teste-busca' FROM generate_series(1, $2) AS i
+            """,
+            EMPRESA_PEQUENA, LINHAS_PEQUENA,
+        )
+        await conn.execute('ANALYZE lembrete_sertaozinho')
+
+    async def clear(conn):
+        await conn.execute(
+            'DELETE FROM lembrete_sertaozinho WHERE empresa_id = ANY($1::int[])', [EMPRESA_TESTE, EMPRESA_PEQUENA]
+        )
+
+    run_with_conn(seed)
+    yield
+    run_with_conn(clear)
+
+
+async def plan_for(conn, field, value, mode='contem') -> str:
+    condition, param = text_condition(field, value, mode, 2)
+    query = f'SELECT * FROM lembrete_sertaozinho WHERE empresa_id = $1 AND {condition}'
+    return await explain(conn, query, EMPRESA_TESTE, param)
+
+
+async def explain(conn, query, *params) -> str:
+    plan = await conn.fetchval(f'EXPLAIN (FORMAT JSON) {query}', *params)
+    return json.dumps(json.loads(plan) if isinstance(plan, str) else plan)
+
+
+def plan_nodes(plan: str, node_key: str, node_type: str = None) -> set:
+    found = set()
+
+    def walk(node):
+        if node_key in node and node_type in (None, node['Node Type']):
+            found.add(node[node_key])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(json.loads(plan)[0]['Plan'])
+    return found
+
+
+async def indexes_used(conn, plan: str) -> set:
+    """
+    Índices do plano pelo nome do índice da tabela pai: com a tabela
+    particionada (migration 0007), o plano cita os índices de cada partição.
+    """
+    rows = await conn.fetch(
+        """
+        SELECT coalesce(pg_partition_root(to_regclass(nome)), to_regclass(nome))::text AS raiz
+        FROM unnest($1::text[]) AS nome
+        """,
+        list(plan_nodes(plan, 'Index Name')),
+    )
+    return {row['raiz'] for row in rows}
+
+
+async def seq_scanned_with_rows(conn, plan: str) -> set:
+    """Tabelas (ou partições) com as linhas do teste lidas por Seq Scan."""
+    rows = await conn.fetch(
+        'SELECT DISTINCT tableoid::regclass::text AS tabela FROM lembrete_sertaozinho WHERE empresa_id = $1',
+        EMPRESA_TESTE,
+    )
+    return plan_nodes(plan, 'Relation Name', 'Seq Scan') & {row['tabela'] for row in rows}
+
+
+def test_identifier_fields_are_exact():
+    assert text_condition('wa_message_id', 'wamid.1', 'contem', 3) == ('wa_message_id = $3', 'wamid.1')
+    assert text_condition('resposta', 'CONFIRMO', 'prefixo', 1) == ('resposta = $1', 'CONFIRMO')
+
+
+def test_text_modes_escape_wildcards():
+    assert escape_like('50%_a\\b') == '50\\%\\_a\\\\b'
+    assert text_condition('paciente', 'Maria_', 'prefixo', 1) == ('lower(paciente) LIKE $1', 'maria\\_%')
+    assert text_condition('paciente', 'Maria', 'contem', 1) == ('paciente ILIKE $1', '%Maria%')
+
+
+@pytest.mark.parametrize('field, value, mode, index', [
+    ('wa_message_id', 'wamid.teste.42', 'contem', 'lembrete_sertaozinho_wa_message_id_idx'),
+    ('telefone', '16910000042', 'contem', 'lembrete_sertaozinho_empresa_telefone_idx'),
+    ('paciente', 'paciente 1234', 'prefixo', 'lembrete_sertaozinho_paciente_prefixo_idx'),
+    ('profissional', 'Profissional 7', 'prefixo', 'lembrete_sertaozinho_profissional_prefixo_idx'),
+])
+def test_search_uses_index(agenda_grande, run_with_conn, field, value, mode, index):
+    async def scenario(conn):
+        plan = await plan_for(conn, field, value, mode)
+        return await indexes_used(conn, plan), await seq_scanned_with_rows(conn, plan)
+
+    usados, seq_scans = run_with_conn(scenario)
+
+    assert index in usados
+    # Partições vazias podem ser lidas por Seq Scan; a que tem as linhas, não
+    assert not seq_scans
+
+
+def test_keyset_page_uses_company_id_index(agenda_grande, run_with_conn):
+    async def scenario(conn):
+        plan = await explain(
+            conn,
+            'SELECT * FROM lembrete_sertaozinho WHERE empresa_id = $1 AND id > $2 ORDER BY id LIMIT 101',
+            EMPRESA_PEQUENA, 0,
+        )
+        return await indexes_used(conn, plan)
+
+    assert 'lembrete_sertaozinho_empresa_id_id_idx' in run_with_conn(scenario)
+
+
+def test_contains_search_uses_trigram_index(agenda_grande, run_sql, run_with_conn):
+    if not run_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"):
+        pytest.skip('pg_trgm não instalado neste Postgres')
+
+    async def scenario(conn):
+        return await indexes_used(conn, await plan_for(conn, 'paciente', 'ENTE 1234'))
+
+    assert 'lembrete_sertaozinho_paciente_trgm_idx' in run_with_conn(scenario)
@@ -1,11 +1,8 @@
+import json
 import os
 
+import jwt
 from dotenv import load_dotenv
-from fastapi.testclient import TestClient
-
-from ...main import app
-
-client = TestClient(app)
 
 load_dotenv()
 
@@ -13,7 +10,7 @@ SECURITY_TOKEN = os.getenv('SECURITY_TOKEN')
 USER_TEST_TOKEN = os.getenv('USER_TEST_TOKEN')
 
 
-def test_get_schedule_success():
+def test_get_schedule_success(client):
     response = client.get(
         '/schedule',
         params={
@@ -27,7 +24,7 @@ def test_get_schedule_success():
     assert isinstance(response.json(), list)
 
 
-def test_get_schedule_invalid_user_token():
+def test_get_schedule_invalid_user_token(client):
     response = client.get(
         '/schedule',
         params={
@@ -39,7 +36,7 @@ def test_get_schedule_invalid_user_token():
     assert response.status_code == 400
 
 
-def test_get_schedule_invalid_access_token():
+def test_get_schedule_invalid_access_token(client):
     response = client.get(
         '/schedule',
         params={
@@ -51,7 +48,7 @@ def test_get_schedule_invalid_access_token():
     assert response.status_code == 401
 
 
-def test_get_schedule_company_id():
+def test_get_schedule_company_id(client):
     response = client.get(
         'schedule',
         params={
@@ -61,3 +58,145 @@ def test_get_schedule_company_id():
         }
     )
     assert response.json()[0].get('empresa_id') == 1
+
+
+EMPRESA_TESTE = -1
+PERMISSION_TOKEN = os.getenv('PERMISSION_TOKEN')
+MI4U_TESTE = jwt.encode({'sub': {'company_id': EMPRESA_TESTE, 'user_id': 1}}, 'teste', algorithm='HS256')
+
+
+def _schedule(client, **params):
+    return client.get(
+        '/schedule',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE, **params}
+    )
+
+
+def test_get_schedule_keyset_pages(client, agenda_teste):
+    pacientes, cursor = [], None
+    for _ in range(4):
+        params = {'page_size': 3}
+        if cursor:
+            params['cursor'] = cursor
+        response = _schedule(client, **params)
+        assert response.status_code == 200
+        body = response.json()
+        pacientes += [row['paciente'] for row in body['data']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert pacientes == [f'PACIENTE {i}' for i in range(1, 8)]
+    assert cursor is None
+
+
+def test_get_schedule_stream_matches_list(client, agenda_teste):
+    listed = _schedule(client).json()
+    streamed = _schedule(client, stream='true')
+
+    assert streamed.status_code == 200
+    assert streamed.json() == listed
+    assert len(listed) == 7
+
+
+def test_get_schedule_invalid_cursor(client):
+    assert _schedule(client, cursor='nao-e-cursor').status_code == 400
+
+
+def test_get_schedule_fields_csv(client, agenda_teste):
+    response = client.get(
+        '/schedule',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE, 'fields': 'paciente,horario'},
+        headers={'Accept': 'text/csv'},
+    )
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    lines = response.text.splitlines()
+    assert lines[0] == 'paciente,horario'
+    assert lines[1] == 'PACIENTE 1,08:01:00'
+    assert len(lines) == 8
+
+
+def test_get_schedule_ndjson_and_fields_in_pages(client, agenda_teste):
+    ndjson = client.get(
+        '/schedule',
+        params={'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE, 'fields': 'telefone'},
+        headers={'Accept': 'application/x-ndjson'},
+    )
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == [{'telefone': None}] * 7
+
+    page = _schedule(client, fields='paciente', page_size=2).json()
+    assert set(page['data'][0]) == {'id', 'paciente'}
+
+
+def test_get_schedule_rejects_unknown_field(client):
+    assert _schedule(client, fields='paciente,senha').status_code == 400
+
+
+def test_set_response_batch(client, agenda_teste, run_sql):
+    run_sql(
+        "UPDATE lembrete_sertaozinho SET wa_message_id = 'wamid.lote.' || codigo WHERE empresa_id = $1",
+        EMPRESA_TESTE,
+    )
+
+    response = client.post(
+        '/schedule/set_response/batch',
+        params={'permission_token': PERMISSION_TOKEN},
+        json={'respostas': [
+            {'wa_message_id': 'wamid.lote.1', 'resposta': ' não  confirmo '},
+            {'wa_message_id': 'wamid.lote.2', 'resposta': 'Confirmo', 'dt_resposta': '2025-03-09T10:30:00'},
+            {'wa_message_id': 'wamid.lote.1', 'resposta': 'Não conheço'},
+            {'wa_message_id': 'wamid.inexistente', 'resposta': 'CONFIRMO'},
+        ]},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [r['status'] for r in body['resultados']] == ['duplicado', 'atualizado', 'atualizado', 'nao_encontrado']
+    assert [r['matched'] for r in body['resultados']] == [False, True, True, False]
+    assert body['linhas'] == 2
+
+    rows = _schedule(client, fields='wa_message_id,resposta,dt_resposta', wa_message_id='wamid.lote.2').json()
+    assert rows == [{'wa_message_id': 'wamid.lote.2', 'resposta': 'CONFIRMO', 'dt_resposta': '2025-03-09T10:30:00'}]
+    assert _schedule(client, wa_message_id='wamid.lote.1').json()[0]['resposta'] == 'NAOCONHECO'
+
+
+def test_set_response_batch_rejects_empty(client):
+    response = client.post(
+        '/schedule/set_response/batch',
+        params={'permission_token': PERMISSION_TOKEN},
+        json={'respostas': []},
+    )
+    assert response.status_code == 422
+
+
+def test_claim_and_mark_sent(client, agenda_teste, run_sql):
+    run_sql(
+        "UPDATE lembrete_sertaozinho SET data_hora_enviar = localtimestamp - interval '1 minute' WHERE empresa_id = $1",
+        EMPRESA_TESTE,
+    )
+    auth = {'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TESTE}
+
+    claimed = client.post('/schedule/due/claim', params={**auth, 'limit': 5}).json()
+    assert len(claimed['lembretes']) == 5
+
+    lembrete = claimed['lembretes'][0]
+    sent = client.post(
+        f"/schedule/{lembrete['id']}/sent",
+        params={**auth, 'claim_id': claimed['claim_id'], 'wa_message_id': 'wamid.enviado.1'},
+    )
+    assert sent.status_code == 200
+
+    again = client.post(
+        f"/schedule/{lembrete['id']}/sent",
+        params={**auth, 'claim_id': claimed['claim_id'], 'wa_message_id': 'wamid.enviado.1'},
+    )
+    assert again.status_code == 409
+
+    restantes = client.post('/schedule/due/claim', params={**auth, 'limit': 5}).json()['lembretes']
+    assert len(restantes) == 2
+
+    falhos = client.get('/schedule/due/failed', params=auth)
+    assert falhos.status_code == 200
+    assert falhos.json() == {'lembretes': []}
@@ -1,7 +1,12 @@
+import asyncio
+import json
 import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, Optional
 
 import asyncpg
-from asyncpg import Connection
+from asyncpg import Connection, Pool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,8 +17,318 @@ database = os.getenv('DATABASE')
 user = os.getenv('DB_USER')
 password = os.getenv('DB_PASSWORD')
 
+# Configuração do pool de conexões
+pool_min_size = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+pool_max_size = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+pool_acquire_timeout = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+pool_max_inactive_lifetime = float(os.getenv('DB_POOL_MAX_INACTIVE_LIFETIME', '300'))
+statement_cache_size = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))
+statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+
+# Réplica de leitura (opcional). Sem DB_REPLICA_HOST tudo vai para o primário;
+# os demais parâmetros, se omitidos, são os do primário.
+replica_host = os.getenv('DB_REPLICA_HOST')
+replica_port = os.getenv('DB_REPLICA_PORT') or port
+replica_database = os.getenv('DB_REPLICA_DATABASE') or database
+replica_user = os.getenv('DB_REPLICA_USER') or user
+replica_password = os.getenv('DB_REPLICA_PASSWORD') or password
+replica_max_lag_seconds = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '10'))
+replica_check_interval = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
+
+REPLICA_STATUS_QUERY = """
+    SELECT
+        pg_last_wal_replay_lsn()::text AS replay_lsn,
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity')
+        END AS lag
+"""
+
+_pool: Optional[Pool] = None
+
+
+async def _init_connection(conn: Connection) -> None:
+    """
+    Executado uma vez para cada conexão nova criada pelo pool.
+
+    Registra os codecs de json/jsonb (para que json_agg e afins voltem como
+    objetos Python) e aplica o statement_timeout, se configurado.
+    """
+    for typename in ('json', 'jsonb'):
+        await conn.set_type_codec(
+            typename,
+            encoder=json.dumps,
+            decoder=json.loads,
+            schema='pg_catalog',
+        )
+
+    if statement_timeout_ms > 0:
+        await conn.execute(f'SET statement_timeout = {statement_timeout_ms}')
+
+
+async def init_db_pool() -> Pool:
+    global _pool
+
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            user=user,
+            password=password,
+            host=host,
+            database=database,
+            port=port,
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            max_inactive_connection_lifetime=pool_max_inactive_lifetime,
+            statement_cache_size=statement_cache_size,
+            init=_init_connection,
+        )
+        print(f'Pool de conexões criado ({pool_min_size}-{pool_max_size} conexões)')
+        await init_replica()
+
+    return _pool
+
+
+async def close_db_pool() -> None:
+    global _pool
+
+    await close_replica()
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        print('Pool de conexões fechado.')
+
+
+def _parse_lsn(lsn: Optional[str]) -> Optional[int]:
+    """'16/B374D848' -> inteiro comparável."""
+    if lsn is None:
+        return None
+    hi, lo = lsn.split('/')
+    return (int(hi, 16) << 32) | int(lo, 16)
+
+
+class ReplicaRouter:
+    """
+    Decide se uma leitura pode ir para a réplica.
+
+    Um monitor consulta a réplica a cada check_interval: se ela não responde
+    ou o atraso passa de max_lag_seconds, as leituras voltam ao primário até
+    a próxima checagem boa.
+
+    Read-your-writes: depois de uma escrita da empresa (record_write), as
+    leituras dessa empresa ficam no primário até a réplica aplicar o LSN da
+    escrita, ou até passar o atraso máximo tolerado (quando a "réplica" não
+    informa LSN, como uma segunda instância independente). O controle é por
+    processo; escritas feitas em outro processo ficam cobertas só pelo limite
+    de atraso.
+    """
+
+    def __init__(
+        self,
+        max_lag_seconds: float = replica_max_lag_seconds,
+        check_interval: float = replica_check_interval,
+        **connect_kwargs,
+    ):
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self.pool: Optional[Pool] = None
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.replay_lsn: Optional[int] = None
+        # company_id -> (LSN da escrita no primário, instante em que expira)
+        self._writes = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.check()
+        self._task = asyncio.create_task(self._monitor(), name='replica-monitor')
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def check(self) -> None:
+        try:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(
+                    min_size=pool_min_size,
+                    max_size=pool_max_size,
+                    max_inactive_connection_lifetime=pool_max_inactive_lifetime,
+                    statement_cache_size=statement_cache_size,
+                    init=_init_connection,
+                    # Protege contra escrita roteada por engano para a réplica
+                    server_settings={'default_transaction_read_only': 'on'},
+                    timeout=pool_acquire_timeout,
+                    **self.connect_kwargs,
+                )
+            row = await self.pool.fetchrow(REPLICA_STATUS_QUERY, timeout=pool_acquire_timeout)
+        except Exception as e:
+            self.mark_down(e)
+            return
+
+        self.lag = row['lag']
+        self.replay_lsn = _parse_lsn(row['replay_lsn'])
+        if not self.healthy:
+            print(f'Réplica de leitura disponível (atraso {self.lag:.1f}s)')
+        self.healthy = True
+
+    def mark_down(self, error: Exception) -> None:
+        if self.healthy or self.lag is None:
+            print(f'Réplica de leitura indisponível, lendo do primário: {error}')
+        self.healthy = False
+        self.lag = None
+
+    def record_write(self, company_id, lsn: Optional[int]) -> None:
+        expira = time.monotonic() + self.max_lag_seconds + self.check_interval
+        self._writes[company_id] = (lsn, expira)
+
+    def usable(self, company_id=None) -> bool:
+        if not self.healthy or self.pool is None or self.lag > self.max_lag_seconds:
+            return False
+
+        write = self._writes.get(company_id)
+        if write is None:
+            return True
+
+        lsn, expira = write
+        if time.monotonic() >= expira or (
+            lsn is not None and self.replay_lsn is not None and self.replay_lsn >= lsn
+        ):
+            del self._writes[company_id]
+            return True
+        return False
+
+
+_replica: Optional[ReplicaRouter] = None
+
+
+async def init_replica() -> Optional[ReplicaRouter]:
+    global _replica
+
+    if replica_host and _replica is None:
+        _replica = ReplicaRouter(
+            user=replica_user,
+            password=replica_password,
+            host=replica_host,
+            database=replica_database,
+            port=replica_port,
+        )
+        await _replica.start()
+
+    return _replica
+
+
+async def close_replica() -> None:
+    global _replica
+
+    if _replica is not None:
+        await _replica.stop()
+        _replica = None
+        print('Pool da réplica fechado.')
+
+
+def get_db_pool() -> Pool:
+    if _pool is None:
+        raise RuntimeError('Pool de conexões não inicializado. Chame init_db_pool() no startup.')
+    return _pool
+
+
+@asynccontextmanager
+async def acquire_connection() -> AsyncIterator[Connection]:
+    """Empresta uma conexão do pool e a devolve ao final do bloco."""
+    async with get_db_pool().acquire(timeout=pool_acquire_timeout) as conn:
+        yield conn
+
+
+async def get_db() -> AsyncIterator[Connection]:
+    """Dependência do FastAPI: uma conexão do pool por request."""
+    async with acquire_connection() as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def acquire_read_connection(company_id=None) -> AsyncIterator[Connection]:
+    """
+    Conexão para consultas somente leitura: da réplica quando ela está
+    disponível, em dia e já tem as últimas escritas da empresa; do primário
+    caso contrário. Só a obtenção da conexão tem fallback; um erro durante a
+    consulta é propagado.
+    """
+    replica = _replica
+    if replica is not None and replica.usable(company_id):
+        try:
+            conn = await replica.pool.acquire(timeout=pool_acquire_timeout)
+        except Exception as e:
+            replica.mark_down(e)
+        else:
+            try:
+                yield conn
+            finally:
+                await replica.pool.release(conn)
+            return
+
+    async with acquire_connection() as conn:
+        yield conn
+
+
+async def record_write(company_ids: Iterable, conn: Optional[Connection] = None) -> None:
+    """
+    Registra escritas das empresas já commitadas no primário, para que as
+    próximas leituras delas vejam o dado. Chamar depois do commit: o LSN
+    atual do primário é então posterior ao da escrita.
+
+    Quem ainda segura uma conexão do pool deve passá-la em conn: o LSN é
+    lido nela, em vez de pedir uma segunda conexão ao pool (que pode estar
+    esgotado por requests fazendo o mesmo).
+    """
+    company_ids = set(company_ids)
+    if _replica is None or not company_ids:
+        return
+
+    if conn is None:
+        async with acquire_connection() as conn:
+            lsn = await conn.fetchval('SELECT pg_current_wal_lsn()::text')
+    else:
+        if conn.is_in_transaction():
+            raise RuntimeError('record_write deve ser chamado depois do commit da escrita')
+        lsn = await conn.fetchval('SELECT pg_current_wal_lsn()::text')
+
+    for company_id in company_ids:
+        _replica.record_write(company_id, _parse_lsn(lsn))
+
+
+async def connect_dedicated() -> Connection:
+    """
+    Conexão própria, fora do pool, para quem precisa dela por tempo
+    indeterminado (o LISTEN dos eventos). Erros de conexão são levantados.
+    """
+    return await asyncpg.connect(
+        user=user,
+        password=password,
+        host=host,
+        database=database,
+        port=port,
+    )
+
 
 async def get_db_connection() -> Connection:
+    """
+    Conexão avulsa, fora do pool. Usada apenas por scripts e notebooks;
+    a API deve usar get_db / acquire_connection.
+    """
     try:
         conn = await asyncpg.connect(
             user=user,
@@ -1,9 +1,45 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+
+from .db import acquire_connection, close_db_pool, init_db_pool
+from .migrations import RUN_MIGRATIONS_ON_STARTUP, run_migrations
+from .api.functions.etl_sertaozinho import etl_sertaozinho
+from .api.functions.events import start_event_listener, stop_event_listener
+from .api.functions.ingestion_jobs import start_ingestion_worker, stop_ingestion_worker
+from .api.functions.partitions import start_partition_maintenance, stop_partition_maintenance
+from .api.functions.parser_pool import init_parser_pool, shutdown_parser_pool
+from .api.functions.storage import delete_blob, download_blob_bytes
 from .api.endpoints.files import router as file_router
 from .api.endpoints.schedules import router as schedules_router
 from .api.endpoints.report import router as report_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db_pool()
+    if RUN_MIGRATIONS_ON_STARTUP:
+        async with acquire_connection() as conn:
+            await run_migrations(conn)
+    await start_partition_maintenance()
+    await start_event_listener()
+    await init_parser_pool()
+    await start_ingestion_worker(
+        fetch_blob=download_blob_bytes,
+        delete_blob=delete_blob,
+        etl=etl_sertaozinho,
+    )
+    try:
+        yield
+    finally:
+        await stop_ingestion_worker()
+        await shutdown_parser_pool()
+        await stop_event_listener()
+        await stop_partition_maintenance()
+        await close_db_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(file_router)
 app.include_router(schedules_router)
@@ -0,0 +1,159 @@
+"""
+Migrations do banco: arquivos SQL versionados em sql/ (NNNN_descricao.sql),
+aplicados em ordem, cada um na sua transação, e registrados na tabela
+schema_migrations.
+
+Rodam pela linha de comando ou, com DB_RUN_MIGRATIONS=true, no startup da
+API:
+
+    python -m app.migrations            # aplica as pendentes
+    python -m app.migrations --status   # lista aplicadas e pendentes
+
+Uma migration que depende de extensões declara isso na primeira linha:
+
+    -- requer: pg_trgm
+
+Enquanto alguma delas não estiver disponível no servidor, a migration é
+pulada sem ser registrada e tentada de novo na próxima execução; as
+seguintes são aplicadas normalmente.
+
+Os índices são criados sem CONCURRENTLY, de propósito: cada migration é
+atômica (se falhar no meio, nada fica pela metade nem é registrado), e
+CREATE INDEX CONCURRENTLY não roda em transação nem em tabela particionada,
+que lembrete_sertaozinho e cross_agendamentos passam a ser após a 0007. O
+CREATE INDEX bloqueia escritas na tabela enquanto roda. Em banco grande já
+em produção, crie o índice antes, à mão, com o mesmo nome:
+
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS <nome> ON ... ;   -- tabela comum
+    CREATE INDEX IF NOT EXISTS <nome> ON ONLY <pai> ...;       -- particionada,
+    -- seguido de CREATE INDEX CONCURRENTLY em cada partição e
+    -- ALTER INDEX <nome> ATTACH PARTITION <índice da partição>
+
+e o IF NOT EXISTS da migration não faz nada.
+
+Por isso DB_RUN_MIGRATIONS vem desligado: no primeiro deploy contra as
+tabelas de produção, os índices da 0004 e a reconstrução de
+cross_report_mensal da 0005 (com LOCK ... IN SHARE MODE) bloqueiam as
+escritas enquanto rodam. Aplique as migrations pela linha de comando,
+fora do horário de uso, e ligue a opção só onde o banco é pequeno (ex.:
+desenvolvimento).
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import List, NamedTuple
+
+from asyncpg import Connection
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MIGRATIONS_DIR = Path(__file__).parent / 'sql'
+RUN_MIGRATIONS_ON_STARTUP = os.getenv('DB_RUN_MIGRATIONS', 'false').lower() in ('1', 'true', 'yes')
+
+# Chave do advisory lock: vários processos subindo juntos aplicam uma vez só
+MIGRATIONS_LOCK_KEY = 7315420061
+
+MIGRATIONS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        versao      text PRIMARY KEY,
+        nome        text NOT NULL,
+        checksum    text NOT NULL,
+        aplicada_em timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+_REQUIRES = re.compile(r'^--\s*requer:\s*(.+)$')
+
+
+class Migration(NamedTuple):
+    versao: str
+    nome: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding='utf-8')
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    @property
+    def requires(self) -> List[str]:
+        """Extensões declaradas em '-- requer: ...' na primeira linha."""
+        first_line = self.sql.split('\n', 1)[0].strip()
+        match = _REQUIRES.match(first_line)
+        if not match:
+            return []
+        return [name.strip() for name in match.group(1).split(',') if name.strip()]
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = []
+    for path in sorted(Path(directory).glob('*.sql')):
+        match = _FILENAME.match(path.name)
+        if not match:
+            raise ValueError(f'Nome de migration inválido: {path.name} (esperado NNNN_descricao.sql)')
+        migrations.append(Migration(match.group(1), match.group(2), path))
+
+    versoes = [migration.versao for migration in migrations]
+    if len(set(versoes)) != len(versoes):
+        raise ValueError(f'Versões de migration repetidas em {directory}')
+    return migrations
+
+
+async def applied_migrations(conn: Connection) -> dict:
+    await conn.execute(MIGRATIONS_TABLE_DDL)
+    rows = await conn.fetch('SELECT versao, checksum FROM schema_migrations')
+    return {row['versao']: row['checksum'] for row in rows}
+
+
+async def missing_extensions(conn: Connection, names: List[str]) -> List[str]:
+    if not names:
+        return []
+    available = await conn.fetch('SELECT name FROM pg_available_extensions WHERE name = ANY($1::text[])', names)
+    available = {row['name'] for row in available}
+    return [name for name in names if name not in available]
+
+
+async def run_migrations(conn: Connection, directory: Path = MIGRATIONS_DIR) -> List[str]:
+    """Aplica as migrations pendentes e devolve as versões aplicadas."""
+    migrations = load_migrations(directory)
+
+    await conn.execute('SELECT pg_advisory_lock($1)', MIGRATIONS_LOCK_KEY)
+    try:
+        applied = await applied_migrations(conn)
+        executadas = []
+
+        for migration in migrations:
+            if migration.versao in applied:
+                if applied[migration.versao] != migration.checksum:
+                    print(f'AVISO: migration {migration.path.name} foi alterada depois de aplicada')
+                continue
+
+            faltando = await missing_extensions(conn, migration.requires)
+            if faltando:
+                print(
+                    f'AVISO: migration {migration.path.name} pulada; '
+                    f'extensão indisponível no servidor: {", ".join(faltando)}'
+                )
+                continue
+
+            async with conn.transaction():
+                # Criação de índice em tabela grande não pode cair no timeout da API
+                await conn.execute('SET LOCAL statement_timeout = 0')
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    'INSERT INTO schema_migrations (versao, nome, checksum) VALUES ($1, $2, $3)',
+                    migration.versao, migration.nome, migration.checksum,
+                )
+
+            print(f'Migration aplicada: {migration.path.name}')
+            executadas.append(migration.versao)
+
+        return executadas
+    finally:
+        await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_KEY)
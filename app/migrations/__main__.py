@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import sys
+
+from ..db import close_db_connection, get_db_connection
+from . import applied_migrations, load_migrations, missing_extensions, run_migrations
+
+
+async def main(status: bool) -> int:
+    conn = await get_db_connection()
+    try:
+        if not status:
+            executadas = await run_migrations(conn)
+            if not executadas:
+                print('Nenhuma migration pendente.')
+            return 0
+
+        applied = await applied_migrations(conn)
+        for migration in load_migrations():
+            situacao = 'aplicada' if migration.versao in applied else 'pendente'
+            faltando = [] if migration.versao in applied else await missing_extensions(conn, migration.requires)
+            if faltando:
+                situacao += f' (aguardando extensão {", ".join(faltando)})'
+            print(f'{migration.path.name}: {situacao}')
+        return 0
+    finally:
+        await close_db_connection(conn)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aplica as migrations do banco')
+    parser.add_argument('--status', action='store_true', help='Só lista as migrations aplicadas e pendentes')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.status)))
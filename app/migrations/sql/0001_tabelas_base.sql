@@ -0,0 +1,55 @@
+-- Tabelas que a API lê e escreve. Em bancos que já existiam antes das
+-- migrations o IF NOT EXISTS faz desta versão um marco inicial.
+
+CREATE TABLE IF NOT EXISTS usuarios (
+    id              integer PRIMARY KEY,
+    nomecompleto    text
+);
+
+CREATE TABLE IF NOT EXISTS lembrete_sertaozinho (
+    id                  bigserial PRIMARY KEY,
+    empresa_id          integer,
+    unidade_executante  text,
+    profissional        text,
+    data_agenda         date,
+    especialidade       text,
+    horario             time,
+    codigo              bigint,
+    paciente            text,
+    telefone            text,
+    data_hora_enviar    timestamp,
+    data_hora_upload    timestamp,
+    customer_service_id integer,
+    wa_message_id       text,
+    resposta            text,
+    dt_resposta         timestamp,
+    nome_arquivo        text,
+    id_usuario          integer,
+    nome_usuario        text
+);
+
+CREATE TABLE IF NOT EXISTS cross_agendamentos (
+    id                  bigserial PRIMARY KEY,
+    unidade_executante  text,
+    profissional        text,
+    data_agenda         date,
+    especialidade       text,
+    horario             time,
+    codigo              bigint,
+    paciente            text,
+    telefone            text,
+    data_hora_enviar    timestamp,
+    data_hora_upload    timestamp,
+    data_hora_envio     timestamp,
+    customer_service_id integer,
+    wa_message_id       text,
+    resposta            text,
+    dt_resposta         timestamp,
+    solicitante         text,
+    nome_arquivo        text,
+    id_usuario          integer,
+    nome_usuario        text,
+    template_id         integer,
+    tipo_envio          text,
+    exame               text
+);
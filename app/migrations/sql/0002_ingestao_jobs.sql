@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS ingestao_jobs (
+    id                uuid PRIMARY KEY,
+    empresa_id        integer NOT NULL,
+    id_usuario        integer NOT NULL,
+    nome_arquivo      text NOT NULL,
+    blob_name         text NOT NULL,
+    data_hora_enviar  timestamp NOT NULL,
+    data_hora_upload  timestamp NOT NULL,
+    status            text NOT NULL DEFAULT 'queued',
+    tentativas        integer NOT NULL DEFAULT 0,
+    linhas_extraidas  integer,
+    linhas_inseridas  integer,
+    linhas_atualizadas integer,
+    etapas            jsonb NOT NULL DEFAULT '{}'::jsonb,
+    erro              text,
+    lease_ate         timestamptz,
+    criado_em         timestamptz NOT NULL DEFAULT now(),
+    iniciado_em       timestamptz,
+    finalizado_em     timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS ingestao_jobs_pendentes_idx
+    ON ingestao_jobs (criado_em)
+    WHERE status IN ('queued', 'running');
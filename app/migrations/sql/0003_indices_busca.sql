@@ -0,0 +1,20 @@
+-- Filtros de /schedule (ver functions/schedule_search.py). wa_message_id
+-- sozinho também atende o UPDATE de /schedule/set_response.
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_wa_message_id_idx
+    ON lembrete_sertaozinho (wa_message_id);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_empresa_telefone_idx
+    ON lembrete_sertaozinho (empresa_id, telefone);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_empresa_resposta_idx
+    ON lembrete_sertaozinho (empresa_id, resposta);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_paciente_prefixo_idx
+    ON lembrete_sertaozinho (empresa_id, lower(paciente) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_profissional_prefixo_idx
+    ON lembrete_sertaozinho (empresa_id, lower(profissional) text_pattern_ops);
+
+-- Busca por trecho (ILIKE '%valor%'): índices de trigramas na 0011, que
+-- depende do pg_trgm.
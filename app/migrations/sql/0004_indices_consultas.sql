@@ -0,0 +1,15 @@
+-- /schedule: empresa_id sempre presente, data_hora_enviar no filtro por dia
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_empresa_enviar_idx
+    ON lembrete_sertaozinho (empresa_id, data_hora_enviar);
+
+-- Chave natural usada pelo merge da ingestão (etl_sertaozinho.MERGE_STAGING_QUERY).
+-- Não é UNIQUE porque bancos antigos podem ter duplicatas.
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_chave_natural_idx
+    ON lembrete_sertaozinho (empresa_id, codigo, data_agenda, horario);
+
+-- /report e /report/details: intervalo de data_agenda, só linhas com
+-- solicitante; solicitante e resposta no índice permitem index-only scan
+-- na contagem do /report.
+CREATE INDEX IF NOT EXISTS cross_agendamentos_data_agenda_solicitante_idx
+    ON cross_agendamentos (data_agenda) INCLUDE (solicitante, resposta)
+    WHERE solicitante IS NOT NULL;
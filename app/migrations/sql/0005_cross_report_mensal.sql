@@ -0,0 +1,127 @@
+-- Contagens mensais de /report por solicitante. Mantida por triggers em
+-- cross_agendamentos (a tabela também é escrita fora da API), que agregam
+-- por comando as linhas inseridas, alteradas e removidas. Reconstrução:
+-- python -m app.api.functions.report_rollup --rebuild
+
+CREATE TABLE IF NOT EXISTS cross_report_mensal (
+    solicitante     text NOT NULL,
+    mes             date NOT NULL,
+    total           bigint NOT NULL DEFAULT 0,
+    confirmado      bigint NOT NULL DEFAULT 0,
+    nao_confirmado  bigint NOT NULL DEFAULT 0,
+    nao_conheco     bigint NOT NULL DEFAULT 0,
+    nao_respondido  bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (mes, solicitante)
+);
+
+-- Soma (sinal = 1) ou subtrai (sinal = -1) as linhas informadas. Mesmas
+-- regras de classificação da consulta original do /report.
+CREATE OR REPLACE FUNCTION cross_report_mensal_somar(
+    p_solicitante text[], p_data_agenda date[], p_resposta text[], p_sinal integer[]
+) RETURNS void LANGUAGE sql AS $$
+    INSERT INTO cross_report_mensal AS r (
+        solicitante, mes, total, confirmado, nao_confirmado, nao_conheco, nao_respondido
+    )
+    SELECT
+        solicitante,
+        date_trunc('month', data_agenda)::date,
+        sum(sinal),
+        coalesce(sum(sinal) FILTER (WHERE resposta = 'CONFIRMO'), 0),
+        coalesce(sum(sinal) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO'), 0),
+        coalesce(sum(sinal) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO'), 0),
+        coalesce(sum(sinal) FILTER (WHERE resposta IS NULL OR TRIM(resposta) = ''), 0)
+    FROM unnest(p_solicitante, p_data_agenda, p_resposta, p_sinal)
+        AS d(solicitante, data_agenda, resposta, sinal)
+    WHERE solicitante IS NOT NULL AND solicitante <> '' AND data_agenda IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (mes, solicitante) DO UPDATE SET
+        total          = r.total + EXCLUDED.total,
+        confirmado     = r.confirmado + EXCLUDED.confirmado,
+        nao_confirmado = r.nao_confirmado + EXCLUDED.nao_confirmado,
+        nao_conheco    = r.nao_conheco + EXCLUDED.nao_conheco,
+        nao_respondido = r.nao_respondido + EXCLUDED.nao_respondido
+$$;
+
+CREATE OR REPLACE FUNCTION cross_report_mensal_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM cross_report_mensal_somar(
+            array_agg(solicitante), array_agg(data_agenda), array_agg(resposta), array_agg(1)
+        ) FROM novas;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM cross_report_mensal_somar(
+            array_agg(solicitante), array_agg(data_agenda), array_agg(resposta), array_agg(-1)
+        ) FROM antigas;
+    ELSE
+        -- Só as linhas em que algo que entra na contagem mudou
+        PERFORM cross_report_mensal_somar(
+            array_agg(d.solicitante), array_agg(d.data_agenda), array_agg(d.resposta), array_agg(d.sinal)
+        )
+        FROM antigas a
+        JOIN novas n ON n.id = a.id
+        CROSS JOIN LATERAL (VALUES
+            (a.solicitante, a.data_agenda, a.resposta, -1),
+            (n.solicitante, n.data_agenda, n.resposta, 1)
+        ) AS d(solicitante, data_agenda, resposta, sinal)
+        WHERE (a.solicitante, a.data_agenda, a.resposta)
+              IS DISTINCT FROM (n.solicitante, n.data_agenda, n.resposta);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS cross_report_mensal_insert ON cross_agendamentos;
+CREATE TRIGGER cross_report_mensal_insert
+    AFTER INSERT ON cross_agendamentos
+    REFERENCING NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION cross_report_mensal_trigger();
+
+DROP TRIGGER IF EXISTS cross_report_mensal_update ON cross_agendamentos;
+CREATE TRIGGER cross_report_mensal_update
+    AFTER UPDATE ON cross_agendamentos
+    REFERENCING OLD TABLE AS antigas NEW TABLE AS novas
+    FOR EACH STATEMENT EXECUTE FUNCTION cross_report_mensal_trigger();
+
+DROP TRIGGER IF EXISTS cross_report_mensal_delete ON cross_agendamentos;
+CREATE TRIGGER cross_report_mensal_delete
+    AFTER DELETE ON cross_agendamentos
+    REFERENCING OLD TABLE AS antigas
+    FOR EACH STATEMENT EXECUTE FUNCTION cross_report_mensal_trigger();
+
+-- Recalcula os meses entre p_inicio e p_fim (NULL = sem limite) a partir das
+-- linhas de cross_agendamentos. O LOCK segura as escritas enquanto isso.
+CREATE OR REPLACE FUNCTION cross_report_mensal_reconstruir(p_inicio date, p_fim date)
+RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio date := date_trunc('month', coalesce(p_inicio, '-infinity'::date));
+    v_fim    date := coalesce(p_fim, 'infinity'::date);
+    v_linhas bigint;
+BEGIN
+    LOCK TABLE cross_agendamentos IN SHARE MODE;
+
+    DELETE FROM cross_report_mensal WHERE mes BETWEEN v_inicio AND v_fim;
+
+    INSERT INTO cross_report_mensal (
+        solicitante, mes, total, confirmado, nao_confirmado, nao_conheco, nao_respondido
+    )
+    SELECT
+        solicitante,
+        date_trunc('month', data_agenda)::date,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE resposta = 'CONFIRMO'),
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO'),
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO'),
+        COUNT(*) FILTER (WHERE resposta IS NULL OR TRIM(resposta) = '')
+    FROM cross_agendamentos
+    WHERE solicitante IS NOT NULL AND solicitante <> ''
+      AND data_agenda >= v_inicio
+      AND date_trunc('month', data_agenda)::date <= v_fim
+    GROUP BY 1, 2;
+
+    GET DIAGNOSTICS v_linhas = ROW_COUNT;
+    RETURN v_linhas;
+END
+$$;
+
+-- Carga inicial com o histórico existente
+SELECT cross_report_mensal_reconstruir(NULL, NULL);
@@ -0,0 +1,12 @@
+-- Reserva de lembretes pelos workers de envio (/schedule/due/claim). Um
+-- lembrete está pendente enquanto não tem wa_message_id; envio_lease_ate
+-- impede que outro worker o pegue até o lease expirar.
+
+ALTER TABLE lembrete_sertaozinho
+    ADD COLUMN IF NOT EXISTS envio_claim      uuid,
+    ADD COLUMN IF NOT EXISTS envio_lease_ate  timestamptz,
+    ADD COLUMN IF NOT EXISTS envio_tentativas integer NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_envio_pendente_idx
+    ON lembrete_sertaozinho (empresa_id, data_hora_enviar, id)
+    WHERE wa_message_id IS NULL;
@@ -0,0 +1,167 @@
+-- Particionamento mensal por data_agenda (lembrete_sertaozinho e
+-- cross_agendamentos). Esta migration só instala as funções; a conversão de
+-- cada tabela é feita sob demanda, pois reescreve a tabela inteira:
+--
+--     python -m app.api.functions.partitions --converter
+--
+-- Partições: <tabela>_pAAAAMM, para [1º dia do mês, 1º dia do mês seguinte),
+-- e <tabela>_default para data_agenda nula ou meses sem partição. Partições
+-- arquivadas são desanexadas e movidas para o schema arquivo.
+
+CREATE SCHEMA IF NOT EXISTS arquivo;
+
+-- Cria a partição do mês de p_mes, se ainda não existir. Linhas desse mês
+-- que tenham caído no default são movidas para ela antes do ATTACH.
+CREATE OR REPLACE FUNCTION particao_mensal_criar(p_tabela text, p_mes date)
+RETURNS text LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio  date := date_trunc('month', p_mes);
+    v_fim     date := date_trunc('month', p_mes) + interval '1 month';
+    v_nome    text := format('%s_p%s', p_tabela, to_char(p_mes, 'YYYYMM'));
+    v_default text := p_tabela || '_default';
+BEGIN
+    IF to_regclass(quote_ident(v_nome)) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)',
+        v_nome, p_tabela
+    );
+
+    IF to_regclass(quote_ident(v_default)) IS NOT NULL THEN
+        -- DML direto na partição não dispara os triggers de statement da
+        -- tabela pai: as contagens do relatório não mudam, como deve ser.
+        EXECUTE format(
+            'WITH movidas AS (
+                DELETE FROM %I WHERE data_agenda >= $1 AND data_agenda < $2 RETURNING *
+            )
+            INSERT INTO %I SELECT * FROM movidas',
+            v_default, v_nome
+        ) USING v_inicio, v_fim;
+    END IF;
+
+    EXECUTE format(
+        'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        p_tabela, v_nome, v_inicio, v_fim
+    );
+
+    RETURN v_nome;
+END
+$$;
+
+-- Partições de todos os meses entre p_inicio e p_fim. Retorna as criadas.
+CREATE OR REPLACE FUNCTION particoes_mensais_criar(p_tabela text, p_inicio date, p_fim date)
+RETURNS SETOF text LANGUAGE plpgsql AS $$
+DECLARE
+    v_mes  date := date_trunc('month', p_inicio);
+    v_nome text;
+BEGIN
+    WHILE v_mes <= p_fim LOOP
+        v_nome := particao_mensal_criar(p_tabela, v_mes);
+        IF v_nome IS NOT NULL THEN
+            RETURN NEXT v_nome;
+        END IF;
+        v_mes := v_mes + interval '1 month';
+    END LOOP;
+END
+$$;
+
+-- Converte a tabela em particionada, numa única transação:
+--   * a chave primária (id) vira um índice comum em id, pois constraints
+--     UNIQUE de tabela particionada precisam incluir data_agenda, que pode
+--     ser nula; o id continua vindo da mesma sequence;
+--   * os demais índices e os triggers (ex.: os de cross_report_mensal) são
+--     recriados na tabela nova com as mesmas definições;
+--   * são criadas partições para cada mês com dados e para os próximos
+--     p_meses_futuros meses.
+-- Retorna false se a tabela já era particionada.
+CREATE OR REPLACE FUNCTION particionar_por_mes(p_tabela text, p_meses_futuros integer)
+RETURNS boolean LANGUAGE plpgsql AS $$
+DECLARE
+    v_tabela    regclass := p_tabela::regclass;
+    v_legado    text := p_tabela || '_legado';
+    v_indices   text[];
+    v_triggers  text[];
+    v_sequence  text;
+    v_definicao text;
+    v_mes       date;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = v_tabela) = 'p' THEN
+        RETURN false;
+    END IF;
+
+    EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', p_tabela);
+
+    -- Definições lidas antes do RENAME, ainda com o nome original da tabela
+    SELECT array_agg(pg_get_indexdef(indexrelid)) INTO v_indices
+    FROM pg_index
+    WHERE indrelid = v_tabela AND NOT indisprimary;
+
+    SELECT array_agg(pg_get_triggerdef(oid)) INTO v_triggers
+    FROM pg_trigger
+    WHERE tgrelid = v_tabela AND NOT tgisinternal;
+
+    v_sequence := pg_get_serial_sequence(p_tabela, 'id');
+
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', p_tabela, v_legado);
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS)
+         PARTITION BY RANGE (data_agenda)',
+        p_tabela, v_legado
+    );
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', p_tabela || '_default', p_tabela);
+
+    FOR v_mes IN EXECUTE format(
+        'SELECT DISTINCT date_trunc(''month'', data_agenda)::date FROM %I WHERE data_agenda IS NOT NULL',
+        v_legado
+    ) LOOP
+        PERFORM particao_mensal_criar(p_tabela, v_mes);
+    END LOOP;
+    PERFORM particoes_mensais_criar(
+        p_tabela, current_date, (current_date + make_interval(months => p_meses_futuros))::date
+    );
+
+    -- A tabela nova ainda não tem triggers: a cópia não altera as contagens
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', p_tabela, v_legado);
+
+    IF v_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', v_sequence, p_tabela);
+    END IF;
+    EXECUTE format('DROP TABLE %I', v_legado);
+
+    EXECUTE format('CREATE INDEX %I ON %I (id)', p_tabela || '_id_idx', p_tabela);
+    FOREACH v_definicao IN ARRAY coalesce(v_indices, '{}') LOOP
+        EXECUTE v_definicao;
+    END LOOP;
+    FOREACH v_definicao IN ARRAY coalesce(v_triggers, '{}') LOOP
+        EXECUTE v_definicao;
+    END LOOP;
+
+    EXECUTE format('ANALYZE %I', p_tabela);
+    RETURN true;
+END
+$$;
+
+-- Desanexa as partições mensais anteriores ao mês de p_antes e as move para
+-- o schema arquivo. Retorna os nomes arquivados.
+CREATE OR REPLACE FUNCTION particoes_mensais_arquivar(p_tabela text, p_antes date)
+RETURNS SETOF text LANGUAGE plpgsql AS $$
+DECLARE
+    v_nome text;
+BEGIN
+    FOR v_nome IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = p_tabela::regclass
+          AND c.relname ~ ('^' || p_tabela || '_p[0-9]{6}$')
+          AND to_date(right(c.relname, 6), 'YYYYMM') < date_trunc('month', p_antes)
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', p_tabela, v_nome);
+        EXECUTE format('ALTER TABLE %I SET SCHEMA arquivo', v_nome);
+        RETURN NEXT v_nome;
+    END LOOP;
+END
+$$;
@@ -0,0 +1,92 @@
+-- Avisa as instâncias da API quando as contagens do /report mudam. Os
+-- triggers de cross_report_mensal (0005) passam a enviar, no canal
+-- cross_relatorio, o intervalo de data_agenda das linhas afetadas pelo
+-- comando; o listener de eventos de cada processo invalida o report_cache
+-- desse intervalo. O NOTIFY só sai no commit, e avisos iguais na mesma
+-- transação são entregues uma vez só.
+--
+-- Payload: {"inicio": "AAAA-MM-DD", "fim": "AAAA-MM-DD"}; null = tudo.
+
+CREATE OR REPLACE FUNCTION cross_report_mensal_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio date;
+    v_fim    date;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM cross_report_mensal_somar(
+            array_agg(solicitante), array_agg(data_agenda), array_agg(resposta), array_agg(1)
+        ) FROM novas;
+        SELECT min(data_agenda), max(data_agenda) INTO v_inicio, v_fim FROM novas;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM cross_report_mensal_somar(
+            array_agg(solicitante), array_agg(data_agenda), array_agg(resposta), array_agg(-1)
+        ) FROM antigas;
+        SELECT min(data_agenda), max(data_agenda) INTO v_inicio, v_fim FROM antigas;
+    ELSE
+        -- Só as linhas em que algo que entra na contagem mudou
+        PERFORM cross_report_mensal_somar(
+            array_agg(d.solicitante), array_agg(d.data_agenda), array_agg(d.resposta), array_agg(d.sinal)
+        )
+        FROM antigas a
+        JOIN novas n ON n.id = a.id
+        CROSS JOIN LATERAL (VALUES
+            (a.solicitante, a.data_agenda, a.resposta, -1),
+            (n.solicitante, n.data_agenda, n.resposta, 1)
+        ) AS d(solicitante, data_agenda, resposta, sinal)
+        WHERE (a.solicitante, a.data_agenda, a.resposta)
+              IS DISTINCT FROM (n.solicitante, n.data_agenda, n.resposta);
+
+        SELECT min(least(a.data_agenda, n.data_agenda)), max(greatest(a.data_agenda, n.data_agenda))
+        INTO v_inicio, v_fim
+        FROM antigas a
+        JOIN novas n ON n.id = a.id
+        WHERE (a.solicitante, a.data_agenda, a.resposta)
+              IS DISTINCT FROM (n.solicitante, n.data_agenda, n.resposta);
+    END IF;
+
+    IF v_inicio IS NOT NULL THEN
+        PERFORM pg_notify(
+            'cross_relatorio', json_build_object('inicio', v_inicio, 'fim', v_fim)::text
+        );
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- A reconstrução também avisa, com o intervalo pedido
+CREATE OR REPLACE FUNCTION cross_report_mensal_reconstruir(p_inicio date, p_fim date)
+RETURNS bigint LANGUAGE plpgsql AS $$
+DECLARE
+    v_inicio date := date_trunc('month', coalesce(p_inicio, '-infinity'::date));
+    v_fim    date := coalesce(p_fim, 'infinity'::date);
+    v_linhas bigint;
+BEGIN
+    LOCK TABLE cross_agendamentos IN SHARE MODE;
+
+    DELETE FROM cross_report_mensal WHERE mes BETWEEN v_inicio AND v_fim;
+
+    INSERT INTO cross_report_mensal (
+        solicitante, mes, total, confirmado, nao_confirmado, nao_conheco, nao_respondido
+    )
+    SELECT
+        solicitante,
+        date_trunc('month', data_agenda)::date,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE resposta = 'CONFIRMO'),
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONFIRMO'),
+        COUNT(*) FILTER (WHERE resposta = 'NÃOㅤCONHEÇO'),
+        COUNT(*) FILTER (WHERE resposta IS NULL OR TRIM(resposta) = '')
+    FROM cross_agendamentos
+    WHERE solicitante IS NOT NULL AND solicitante <> ''
+      AND data_agenda >= v_inicio
+      AND date_trunc('month', data_agenda)::date <= v_fim
+    GROUP BY 1, 2;
+
+    GET DIAGNOSTICS v_linhas = ROW_COUNT;
+
+    PERFORM pg_notify(
+        'cross_relatorio', json_build_object('inicio', p_inicio, 'fim', p_fim)::text
+    );
+    RETURN v_linhas;
+END
+$$;
@@ -0,0 +1,6 @@
+-- Paginação por keyset do /schedule: WHERE empresa_id = $1 AND id > $n
+-- ORDER BY id LIMIT (e o ORDER BY id LIMIT do caminho sem cursor). O índice
+-- em (empresa_id, id) entrega as linhas da empresa já na ordem do cursor.
+-- particionar_por_mes (0007) recria os índices da tabela, este incluído.
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_empresa_id_id_idx
+    ON lembrete_sertaozinho (empresa_id, id);
@@ -0,0 +1,6 @@
+-- Lembretes reservados DISPATCH_MAX_ATTEMPTS vezes sem confirmação em
+-- /schedule/{id}/sent saem da fila de envio e ganham envio_falhou_em, como
+-- os jobs 'failed' de ingestao_jobs. Listagem: GET /schedule/due/failed.
+
+ALTER TABLE lembrete_sertaozinho
+    ADD COLUMN IF NOT EXISTS envio_falhou_em timestamptz;
@@ -0,0 +1,27 @@
+-- requer: pg_trgm
+-- Busca por trecho (modo 'contem' de /schedule, ILIKE '%valor%') em todos
+-- os campos de texto que aceitam esse modo (ver
+-- functions/schedule_search.py). Enquanto o pg_trgm não estiver disponível
+-- no servidor, esta migration é pulada e tentada de novo a cada execução
+-- (ver migrations/__init__.py); sem ela, a busca por trecho funciona, mas
+-- sem índice.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_paciente_trgm_idx
+    ON lembrete_sertaozinho USING gin (paciente gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_profissional_trgm_idx
+    ON lembrete_sertaozinho USING gin (profissional gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_unidade_executante_trgm_idx
+    ON lembrete_sertaozinho USING gin (unidade_executante gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_especialidade_trgm_idx
+    ON lembrete_sertaozinho USING gin (especialidade gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_nome_arquivo_trgm_idx
+    ON lembrete_sertaozinho USING gin (nome_arquivo gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS lembrete_sertaozinho_nome_usuario_trgm_idx
+    ON lembrete_sertaozinho USING gin (nome_usuario gin_trgm_ops);
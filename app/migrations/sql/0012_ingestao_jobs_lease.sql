@@ -0,0 +1,11 @@
+-- Cada reserva de um job de ingestão recebe um lease_id novo. finish_job,
+-- fail_job, requeue_job e a renovação do lease só valem para a reserva
+-- corrente: uma execução cujo lease expirou (e o job foi pego de novo) não
+-- sobrescreve o resultado da execução atual.
+ALTER TABLE ingestao_jobs ADD COLUMN IF NOT EXISTS lease_id uuid;
+
+-- claim_next_job também procura jobs em 'uploading' com lease expirado
+DROP INDEX IF EXISTS ingestao_jobs_pendentes_idx;
+CREATE INDEX ingestao_jobs_pendentes_idx
+    ON ingestao_jobs (criado_em)
+    WHERE status IN ('uploading', 'queued', 'running');
@@ -0,0 +1,99 @@
+"""
+Gerador de agendas sintéticas no formato do PDF de Sertãozinho: o mesmo
+cabeçalho que parse_header procura e a tabela de 11 colunas que
+parse_patients_rows espera, com o CNS quebrado em duas linhas na célula.
+"""
+import random
+from datetime import date, datetime, timedelta
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+COLUNAS = [
+    "Prontuario", "Nome Paciente", "Idade", "CNS", "Tel.Cell",
+    "Data/Hora Agendamento", "Data/Hora Recepção",
+    "Data/Hora Atendimento", "Data/Hora Encerramento",
+    "Status", "Assinatura"
+]
+
+NOMES = ["MARIA", "JOSE", "ANA", "JOAO", "ANTONIO", "FRANCISCA", "CARLOS", "PAULO", "LUCIA", "PEDRO"]
+SOBRENOMES = ["SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA", "LIMA", "GOMES"]
+
+TABLE_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("FONTSIZE", (0, 0), (-1, -1), 6),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+])
+
+
+def agenda_rows(pages: int, rows_per_page: int, data_atendimento: date, seed: int = 0):
+    """Linhas da tabela de pacientes, página a página (sem o cabeçalho da tabela)."""
+    rnd = random.Random(seed)
+    prontuario = 100000
+
+    for _ in range(pages):
+        linhas = []
+        for _ in range(rows_per_page):
+            prontuario += 1
+            cns = f"7{rnd.randrange(10 ** 13, 10 ** 14):014d}"
+            atendimento = datetime.combine(data_atendimento, datetime.min.time()) + timedelta(
+                hours=rnd.randint(7, 17), minutes=rnd.choice([0, 15, 30, 45])
+            )
+            agendamento = atendimento - timedelta(days=rnd.randint(1, 60))
+            linhas.append([
+                str(prontuario),
+                f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}",
+                str(rnd.randint(1, 95)),
+                f"{cns[:8]}\n{cns[8:]}",
+                f"169{rnd.randrange(10 ** 7, 10 ** 8)}",
+                agendamento.strftime("%d/%m/%Y %H:%M"),
+                "",
+                atendimento.strftime("%d/%m/%Y %H:%M"),
+                "",
+                "AGENDADO",
+                "",
+            ])
+        yield linhas
+
+
+def generate_agenda_pdf(
+    pages: int,
+    rows_per_page: int,
+    data_atendimento: date = date(2025, 3, 10),
+    seed: int = 0,
+) -> bytes:
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4))
+    style = getSampleStyleSheet()["Normal"]
+
+    elementos = [
+        Paragraph("Unidade de Saúde UBS CENTRO SERTAOZINHO", style),
+        Paragraph(f"Data Atendimento {data_atendimento.strftime('%d/%m/%Y')}", style),
+        Paragraph("Profissional: JOAO DA SILVA CRM: 123456", style),
+        Paragraph("Especialidade: CARDIOLOGIA", style),
+    ]
+
+    for linhas in agenda_rows(pages, rows_per_page, data_atendimento, seed):
+        tabela = Table([COLUNAS] + linhas)
+        tabela.setStyle(TABLE_STYLE)
+        elementos.extend([tabela, PageBreak()])
+
+    doc.build(elementos)
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera uma agenda sintética em PDF")
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--rows-per-page", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as f:
+        f.write(generate_agenda_pdf(args.pages, args.rows_per_page, seed=args.seed))
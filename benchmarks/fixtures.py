@@ -0,0 +1,125 @@
+"""
+Massa de dados para os benchmarks: popula lembrete_sertaozinho e
+cross_agendamentos com N linhas sintéticas (via COPY, em lotes), marcadas
+com nome_arquivo = 'benchmark' para que possam ser removidas depois.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+from asyncpg import Connection
+
+FIXTURE_MARKER = 'benchmark'
+BENCH_COMPANY_ID = -999
+
+RESPOSTAS = ['CONFIRMO', 'NÃOㅤCONFIRMO', 'NÃOㅤCONHEÇO', None, None]
+UNIDADES = [f'UBS {i:02d}' for i in range(1, 16)]
+PROFISSIONAIS = [f'PROFISSIONAL {i:03d}' for i in range(1, 81)]
+ESPECIALIDADES = ['CARDIOLOGIA', 'CLINICA GERAL', 'DERMATOLOGIA', 'ORTOPEDIA', 'PEDIATRIA', 'GINECOLOGIA']
+SOLICITANTES = [f'SOLICITANTE {i:02d}' for i in range(1, 31)]
+
+LEMBRETE_COLUMNS = [
+    'empresa_id', 'unidade_executante', 'profissional', 'especialidade',
+    'data_agenda', 'horario', 'codigo', 'paciente', 'telefone',
+    'data_hora_enviar', 'data_hora_upload', 'wa_message_id', 'resposta',
+    'dt_resposta', 'nome_arquivo', 'id_usuario', 'nome_usuario',
+]
+
+CROSS_COLUMNS = [
+    'unidade_executante', 'profissional', 'data_agenda', 'especialidade',
+    'horario', 'codigo', 'paciente', 'telefone', 'wa_message_id', 'resposta',
+    'solicitante', 'nome_arquivo', 'id_usuario', 'nome_usuario',
+]
+
+BATCH_SIZE = 50_000
+
+
+def _agenda(rnd: random.Random, inicio: date, dias: int):
+    data_agenda = inicio + timedelta(days=rnd.randrange(dias))
+    horario = time(rnd.randint(7, 17), rnd.choice([0, 15, 30, 45]))
+    resposta = rnd.choice(RESPOSTAS)
+    return data_agenda, horario, resposta
+
+
+def lembrete_records(rows: int, seed: int, inicio: date, dias: int):
+    rnd = random.Random(seed)
+    for i in range(rows):
+        data_agenda, horario, resposta = _agenda(rnd, inicio, dias)
+        enviar = datetime.combine(data_agenda - timedelta(days=1), time(8, 0))
+        yield (
+            BENCH_COMPANY_ID,
+            rnd.choice(UNIDADES),
+            rnd.choice(PROFISSIONAIS),
+            rnd.choice(ESPECIALIDADES),
+            data_agenda,
+            horario,
+            700000000000000 + i,
+            f'PACIENTE BENCHMARK {i}',
+            f'169{rnd.randrange(10 ** 7, 10 ** 8)}',
+            enviar,
+            enviar - timedelta(days=2),
+            f'wamid.bench.{seed}.{i}',
+            resposta,
+            enviar + timedelta(hours=2) if resposta else None,
+            FIXTURE_MARKER,
+            1,
+            'Usuario Benchmark',
+        )
+
+
+def cross_records(rows: int, seed: int, inicio: date, dias: int):
+    rnd = random.Random(seed + 1)
+    for i in range(rows):
+        data_agenda, horario, resposta = _agenda(rnd, inicio, dias)
+        yield (
+            rnd.choice(UNIDADES),
+            rnd.choice(PROFISSIONAIS),
+            data_agenda,
+            rnd.choice(ESPECIALIDADES),
+            horario,
+            rnd.randrange(100000, 999999),
+            f'PACIENTE BENCHMARK {i}',
+            f'119{rnd.randrange(10 ** 7, 10 ** 8)}',
+            f'wamid.cross.{seed}.{i}',
+            resposta,
+            rnd.choice(SOLICITANTES),
+            FIXTURE_MARKER,
+            1,
+            'Usuario Benchmark',
+        )
+
+
+async def _copy_in_batches(conn: Connection, table: str, columns, records) -> None:
+    lote = []
+    for record in records:
+        lote.append(record)
+        if len(lote) >= BATCH_SIZE:
+            await conn.copy_records_to_table(table, records=lote, columns=columns)
+            lote = []
+    if lote:
+        await conn.copy_records_to_table(table, records=lote, columns=columns)
+
+
+async def clear_fixtures(conn: Connection) -> None:
+    await conn.execute('DELETE FROM lembrete_sertaozinho WHERE nome_arquivo = $1', FIXTURE_MARKER)
+    await conn.execute('DELETE FROM cross_agendamentos WHERE nome_arquivo = $1', FIXTURE_MARKER)
+
+
+async def seed_fixtures(
+    conn: Connection,
+    rows: int,
+    seed: int = 0,
+    inicio: date = date(2025, 1, 1),
+    dias: int = 365,
+) -> None:
+    """Substitui a massa de benchmark por `rows` linhas em cada tabela."""
+    await clear_fixtures(conn)
+    await _copy_in_batches(
+        conn, 'lembrete_sertaozinho', LEMBRETE_COLUMNS,
+        lembrete_records(rows, seed, inicio, dias),
+    )
+    await _copy_in_batches(
+        conn, 'cross_agendamentos', CROSS_COLUMNS,
+        cross_records(rows, seed, inicio, dias),
+    )
+    await conn.execute('ANALYZE lembrete_sertaozinho')
+    await conn.execute('ANALYZE cross_agendamentos')
@@ -0,0 +1,230 @@
+"""
+Benchmark reprodutível do ETL e da API contra um Postgres local.
+
+Mede o tempo de cada etapa do ETL sobre uma agenda sintética, a memória de
+pico do parsing e os percentis de latência de /schedule e /report com a
+massa de dados em cada tamanho pedido. O resultado sai em JSON; com
+--baseline, compara com uma execução anterior e sai com código 1 se alguma
+métrica piorou além da tolerância.
+
+    python -m benchmarks.run --sizes 10000 100000 --output bench.json
+    python -m benchmarks.run --sizes 10000 --baseline bench.json
+
+Usa as mesmas variáveis DB_* da API. ATENÇÃO: grava e apaga linhas
+marcadas com nome_arquivo = 'benchmark' no banco configurado.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from io import BytesIO
+
+os.environ.setdefault('PERMISSION_TOKEN', 'benchmark')
+# Mede as consultas, não o cache de relatórios
+os.environ.setdefault('REPORT_CACHE_TTL', '0')
+
+import jwt  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db import close_db_connection, close_db_pool, get_db_connection, init_db_pool  # noqa: E402
+from app.api.functions import parser_pool  # noqa: E402
+from app.api.functions.etl_sertaozinho import etl_sertaozinho, parse_pdf  # noqa: E402
+from app.api.functions.utils import PERMISSION_TOKEN  # noqa: E402
+from app.main import app  # noqa: E402
+
+from .agenda_pdf import generate_agenda_pdf  # noqa: E402
+from .fixtures import BENCH_COMPANY_ID, clear_fixtures, seed_fixtures  # noqa: E402
+
+MI4U_TOKEN = jwt.encode(
+    {'sub': {'company_id': BENCH_COMPANY_ID, 'user_id': 1}}, 'benchmark', algorithm='HS256'
+)
+
+API_CASES = {
+    'schedule_empresa': ('/schedule', {}),
+    'schedule_paciente': ('/schedule', {'paciente': 'BENCHMARK 12'}),
+    'schedule_wa_message_id': ('/schedule', {'wa_message_id': 'wamid.bench.0.42'}),
+    'report_mes': ('/report', {'dt_start': '01-03-2025', 'dt_end': '31-03-2025'}),
+    'report_ano': ('/report', {'dt_start': '01-01-2025', 'dt_end': '31-12-2025'}),
+    'report_details_mes': ('/report/details', {'dt_start': '01-03-2025', 'dt_end': '31-03-2025'}),
+}
+
+
+def max_rss_mb(who: int) -> float:
+    # ru_maxrss é em KB no Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def percentiles(amostras):
+    amostras = sorted(amostras)
+    cortes = statistics.quantiles(amostras, n=100, method='inclusive')
+    return {
+        'n': len(amostras),
+        'p50_ms': round(cortes[49] * 1000, 2),
+        'p90_ms': round(cortes[89] * 1000, 2),
+        'p99_ms': round(cortes[98] * 1000, 2),
+        'max_ms': round(amostras[-1] * 1000, 2),
+    }
+
+
+def bench_parse(pdf_bytes: bytes) -> dict:
+    inicio = time.perf_counter()
+    header, pacientes = parse_pdf(BytesIO(pdf_bytes))
+    segundos = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    parse_pdf(BytesIO(pdf_bytes))
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'linhas': len(pacientes),
+        'segundos': round(segundos, 3),
+        'pico_python_mb': round(pico / 1024 / 1024, 1),
+    }
+
+
+async def bench_etl(pdf_bytes: bytes) -> dict:
+    await init_db_pool()
+    await parser_pool.init_parser_pool()
+    try:
+        inicio = time.perf_counter()
+        result = await etl_sertaozinho(
+            company_id=BENCH_COMPANY_ID,
+            filename='benchmark',
+            user_id=1,
+            data_hora_enviar=datetime.now(),
+            data_hora_upload=datetime.now(),
+            file_bytes=pdf_bytes,
+        )
+        result['total'] = round(time.perf_counter() - inicio, 3)
+        return result
+    finally:
+        await parser_pool.shutdown_parser_pool()
+        await close_db_pool()
+
+
+async def with_connection(coro_fn, *args):
+    conn = await get_db_connection()
+    try:
+        return await coro_fn(conn, *args)
+    finally:
+        await close_db_connection(conn)
+
+
+def bench_api(client: TestClient, requests: int) -> dict:
+    resultados = {}
+    for nome, (path, params) in API_CASES.items():
+        params = {'permission_token': PERMISSION_TOKEN, 'mi4u_access_token': MI4U_TOKEN, **params}
+        client.get(path, params=params)  # aquecimento
+
+        amostras = []
+        for _ in range(requests):
+            inicio = time.perf_counter()
+            response = client.get(path, params=params)
+            amostras.append(time.perf_counter() - inicio)
+            response.raise_for_status()
+
+        resultados[nome] = percentiles(amostras)
+    return resultados
+
+
+def compare(atual: dict, baseline: dict, tolerancia: float, prefixo: str = ''):
+    """Lista as métricas (tempos e memória) que pioraram além da tolerância."""
+    regressoes = []
+    for chave, valor in atual.items():
+        base = baseline.get(chave) if isinstance(baseline, dict) else None
+        nome = f'{prefixo}{chave}'
+        if isinstance(valor, dict):
+            regressoes += compare(valor, base or {}, tolerancia, f'{nome}.')
+        elif (
+            isinstance(valor, (int, float)) and isinstance(base, (int, float)) and base > 0
+            and (chave.endswith('_ms') or chave.endswith('_mb') or chave in ('segundos', 'total', 'parse', 'insert'))
+            and valor > base * (1 + tolerancia)
+        ):
+            regressoes.append(f'{nome}: {base} -> {valor} (+{(valor / base - 1) * 100:.0f}%)')
+    return regressoes
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'desconhecida'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Tamanhos da massa de dados (linhas por tabela)')
+    parser.add_argument('--pages', type=int, default=50, help='Páginas da agenda sintética')
+    parser.add_argument('--rows-per-page', type=int, default=25, help='Pacientes por página')
+    parser.add_argument('--requests', type=int, default=50, help='Requests por endpoint e tamanho')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: stdout)')
+    parser.add_argument('--baseline', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Piora relativa aceita antes de acusar regressão (padrão 0.2)')
+    parser.add_argument('--keep-fixtures', action='store_true', help='Não apaga a massa ao final')
+    args = parser.parse_args()
+
+    if args.requests < 2:
+        parser.error('--requests precisa ser pelo menos 2 para calcular percentis')
+
+    pdf_bytes = generate_agenda_pdf(args.pages, args.rows_per_page, seed=args.seed)
+
+    resultado = {
+        'meta': {
+            'revisao': git_revision(),
+            'executado_em': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'parametros': vars(args),
+            'pdf_bytes': len(pdf_bytes),
+        },
+        'parse': bench_parse(pdf_bytes),
+        'etl': asyncio.run(bench_etl(pdf_bytes)),
+        'api': {},
+    }
+
+    try:
+        for rows in args.sizes:
+            inicio = time.perf_counter()
+            asyncio.run(with_connection(seed_fixtures, rows, args.seed, date(2025, 1, 1)))
+            print(f'Massa de {rows} linhas criada em {time.perf_counter() - inicio:.1f}s', file=sys.stderr)
+
+            with TestClient(app) as client:
+                resultado['api'][str(rows)] = bench_api(client, args.requests)
+    finally:
+        if not args.keep_fixtures:
+            asyncio.run(with_connection(clear_fixtures))
+
+    resultado['memoria'] = {
+        'pico_rss_mb': max_rss_mb(resource.RUSAGE_SELF),
+        'pico_rss_workers_mb': max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+    saida = json.dumps(resultado, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressoes = compare(resultado, json.load(f), args.tolerance)
+        for regressao in regressoes:
+            print(f'REGRESSÃO {regressao}', file=sys.stderr)
+        return 1 if regressoes else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())